@@ -0,0 +1,66 @@
+"""
+Benchmark of the cross-chapter, length-bucketed encoding against encoding each chapter on its own,
+as bertalign does, with a stub encoder whose cost grows with the padded batch size.
+
+Usage (from the repository root):
+    python -m benchmarks.batched_encoding [--chapters 40] [--max-align-size 8] [--batch-size 256]
+
+Requires bertalign to be importable, for its overlap windows.
+"""
+import time
+import random
+import argparse
+from typing import *
+
+import numpy as np
+
+from data_process.encoding import EncodingScheduler
+
+from .synth import JA_CHARS, ZH_CHARS, random_sentence
+from .stub_encoder import StubEncoder
+
+
+def synthetic_chapters(num_chapters=40, seed=0) -> List[List[str]]:
+    rng = random.Random(seed)
+    ret = []
+    for idx in range(num_chapters):
+        chars = JA_CHARS if idx % 2 == 0 else ZH_CHARS
+        # chapters of very different sizes, as in real volumes
+        ret.append([random_sentence(rng, chars, 2, 80) for _ in range(rng.randint(5, 400))])
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched encoding of many chapters.")
+    parser.add_argument("--chapters", type=int, default=40, help="Number of synthetic chapters.")
+    parser.add_argument("--max-align-size", type=int, default=8, help="Maximum alignment size.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Encoder batch size of the scheduler.")
+    parser.add_argument("--max-batch-tokens", type=int, default=32768, help="Padded token budget of a batch.")
+    args = parser.parse_args()
+
+    chapters = synthetic_chapters(args.chapters)
+    num_overlaps = args.max_align_size - 1
+    num_windows = sum(len(sents) for sents in chapters) * num_overlaps
+    print(f"{len(chapters)} chapters, {num_windows} sentences and overlap windows")
+
+    encoder = StubEncoder()
+    start = time.perf_counter()
+    per_chapter = [encoder.transform(sents, num_overlaps) for sents in chapters]
+    elapsed = time.perf_counter() - start
+    print(f"per chapter {elapsed:.3f}s {num_windows / elapsed:,.0f} sentences/s {encoder.model.padded_tokens} tokens")
+
+    encoder.model.padded_tokens = 0
+    scheduler = EncodingScheduler(encoder, batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens)
+    start = time.perf_counter()
+    bucketed = scheduler.transform_many(chapters, num_overlaps)
+    elapsed = time.perf_counter() - start
+    print(f"bucketed    {elapsed:.3f}s {num_windows / elapsed:,.0f} sentences/s {encoder.model.padded_tokens} tokens")
+
+    for (vecs, lens), (ref_vecs, ref_lens) in zip(bucketed, per_chapter):
+        assert np.array_equal(lens, ref_lens)
+        assert np.allclose(vecs, ref_vecs, atol=1e-5)
+    print("embeddings match")
+
+
+if __name__ == "__main__":
+    main()
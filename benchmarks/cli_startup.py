@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark of `cli.py`.
+
+Usage (from the repository root):
+    python -m benchmarks.cli_startup [--repeat 5] [--max-seconds 1.0]
+
+Exits with non-zero status if any checked subcommand starts slower than `--max-seconds`,
+or if parsing its arguments imports one of the heavy backends.
+"""
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["torch", "trankit", "bertalign", "sentence_transformers"]
+
+# subcommand -> a typical command line of it, which must start fast
+CASES = {
+    "report": ["report", "-t", "tmx", "input.json"],
+    "extract": ["extract", "-t", "epub", "-i", "input.epub", "-o", "output"],
+}
+
+# parse (but do not run) a real command line, then list the heavy modules that got imported
+IMPORT_CHECK_CODE = """
+import sys
+import cli
+cli.parser.parse_args(sys.argv[1:])
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_command(argv, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "cli.py", *argv],
+            cwd=REPO_DIR,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def heavy_imports(argv) -> list:
+    proc = subprocess.run(
+        [sys.executable, "-c", IMPORT_CHECK_CODE.format(heavy=HEAVY_MODULES), *argv],
+        cwd=REPO_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [m for m in proc.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of cli.py.")
+    parser.add_argument("--repeat", type=int, metavar="INT", default=5, help="Runs per subcommand. Default: 5.")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        metavar="FLOAT",
+        default=1.0,
+        help="Maximum allowed median startup time. Default: 1.0.",
+    )
+    args = parser.parse_args()
+
+    ok = True
+    for name, argv in CASES.items():
+        median = time_command([name, "--help"], args.repeat)
+        loaded = heavy_imports(argv)
+        status = "OK" if median <= args.max_seconds and not loaded else "FAIL"
+        ok &= status == "OK"
+        print(f"{name:<10} median={median:.3f}s heavy_imports={loaded or '-'} {status}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the deduplicated encoding of `EncodingScheduler` against encoding every sentence and overlap window,
+on synthetic chapters with the short lines that light novels repeat, and check that both give the same
+embeddings and the same alignments.
+
+Usage (from the repository root):
+    python -m benchmarks.dedup_encoding [--pairs 20] [--sentences 300] [--repeat-rate 0.15]
+
+Requires bertalign, for its overlap windows and the alignment.
+"""
+import time
+import random
+import argparse
+from typing import *
+
+import numpy as np
+
+from data_process.process import align_grid
+from data_process.encoding import EncodingScheduler, PrecomputedEncoder
+
+from .synth import sentence_pair
+from .stub_encoder import StubEncoder
+
+# lines repeated across chapters, and their translations
+REPEATED_LINES = [("「……」", "「……」"), ("「え？」", "「诶？」"), ("「はい」", "「是」"), ("「うん」", "「嗯」"), ("＊", "＊")]
+
+
+def synthetic_pairs(num_pairs: int, sentences: int, repeat_rate: float, seed=0) -> List[Tuple[List[str], List[str]]]:
+    rng = random.Random(seed)
+    ret = []
+    for _ in range(num_pairs):
+        src_lines, tgt_lines = [], []
+        for _ in range(sentences):
+            src, tgt = rng.choice(REPEATED_LINES) if rng.random() < repeat_rate else sentence_pair(rng)
+            src_lines.append(src)
+            tgt_lines.append(tgt)
+        ret.append((src_lines, tgt_lines))
+    return ret
+
+
+def encode_pairs(scheduler: EncodingScheduler, pairs, num_overlaps: int) -> Tuple[float, List[PrecomputedEncoder]]:
+    start = time.perf_counter()
+    embeddings = scheduler.transform_many([lines for pair in pairs for lines in pair], num_overlaps)
+    elapsed = time.perf_counter() - start
+    ret = []
+    for pair_idx, (src_lines, tgt_lines) in enumerate(pairs):
+        precomputed = PrecomputedEncoder()
+        precomputed.add(src_lines, *embeddings[2 * pair_idx])
+        precomputed.add(tgt_lines, *embeddings[2 * pair_idx + 1])
+        ret.append(precomputed)
+    return elapsed, ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deduplicated encoding.")
+    parser.add_argument("--pairs", type=int, default=20, help="Number of synthetic pairs of chapters.")
+    parser.add_argument("--sentences", type=int, default=300, help="Number of sentences of each chapter.")
+    parser.add_argument("--repeat-rate", type=float, default=0.15, help="Share of repeated short lines.")
+    parser.add_argument("--max-align-size", type=int, default=8, help="Maximum alignment size.")
+    args = parser.parse_args()
+
+    pairs = synthetic_pairs(args.pairs, args.sentences, args.repeat_rate)
+    num_overlaps = args.max_align_size - 1
+    results = {}
+    for dedup in [False, True]:
+        encoder = StubEncoder()
+        elapsed, precomputed = encode_pairs(EncodingScheduler(encoder, dedup=dedup), pairs, num_overlaps)
+        results[dedup] = precomputed
+        name = "dedup" if dedup else "all"
+        print(f"{name:<6} {elapsed:.3f}s {encoder.model.padded_tokens} padded tokens")
+
+    grid = [{"max_alignment_size": args.max_align_size, "top_k": 5, "win": 5}]
+    for (src_lines, tgt_lines), ref, dedup in zip(pairs, results[False], results[True]):
+        for lines in [src_lines, tgt_lines]:
+            assert np.array_equal(ref.get(lines)[1], dedup.get(lines)[1])
+            assert np.allclose(ref.get(lines)[0], dedup.get(lines)[0], atol=1e-5)
+        ref_aligns = align_grid(ref, src_lines, tgt_lines, grid, cpu_only=True)
+        assert align_grid(dedup, src_lines, tgt_lines, grid, cpu_only=True) == ref_aligns
+    print("embeddings and alignments match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark of the encoder backends of `data_process.encoders` on CPU: encoding speed in sentences per second,
+and accuracy against the full-precision `torch` backend, as the cosine similarity of the embeddings and
+the share of its alignment blocks that each backend finds too.
+
+Usage (from the repository root):
+    python -m benchmarks.encoder_backends --model-dir models/LaBSE [--backends torch int8 onnx onnx-int8]
+        [--threads 8] [-s ja/*.txt -t zh/*.txt] [--min-agreement 0.95]
+
+Without `-s` and `-t`, pairs of synthetic sentence files are used, whose alignments say little about accuracy:
+pass real chapters for the accuracy check. Exits with 1 if a backend agrees with `torch` on fewer blocks
+than `--min-agreement`.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import *
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from data_process.encoders import BACKENDS
+
+from .synth import make_segmented_pair
+
+
+def block_agreement(ref_pairs: List[List[Dict[str, Any]]], pairs: List[List[Dict[str, Any]]]) -> float:
+    """
+    Share of the blocks of the reference alignments that are in the alignments too, over all pairs of files.
+    """
+    found = total = 0
+    for ref_blocks, blocks in zip(ref_pairs, pairs):
+        keys = {(tuple(block["src_numbers"]), tuple(block["tgt_numbers"])) for block in blocks}
+        found += sum((tuple(block["src_numbers"]), tuple(block["tgt_numbers"])) in keys for block in ref_blocks)
+        total += len(ref_blocks)
+    return found / max(total, 1)
+
+
+def run_backend(
+    backend: str, model_dir: Optional[str], num_threads: Optional[int], texts: List[str], src_files, tgt_files, repeat
+) -> Tuple[Dict[str, Any], np.ndarray, List[List[Dict[str, Any]]]]:
+    """
+    :return: (timings, embeddings of the texts, text pairs of each pair of files)
+    """
+    from data_process.process import load_encoder, generate_text_pairs
+    from data_process.encoding import bucketed_encode
+
+    start = time.perf_counter()
+    encoder = load_encoder(cpu_only=True, backend=backend, model_dir=model_dir, num_threads=num_threads)
+    load_time = time.perf_counter() - start
+    # warm-up, e.g. for the lazy initialization of ONNX Runtime
+    bucketed_encode(encoder.model, texts[:64])
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vecs = bucketed_encode(encoder.model, texts)
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    pairs = generate_text_pairs(src_files, tgt_files, cpu_only=True, encoder=encoder)
+    align_time = time.perf_counter() - start
+    timings = {
+        "load": load_time,
+        "encode": min(times),
+        "sentences/s": len(texts) / min(times),
+        "align": align_time,
+    }
+    return timings, vecs, pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", type=str, default=None, help="Local directory of the model.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS, help="Backends to compare.")
+    parser.add_argument("--threads", type=int, default=None, help="Number of intra-op threads.")
+    parser.add_argument("-s", "--source", nargs="+", default=[], help="Source sentence files.")
+    parser.add_argument("-t", "--target", nargs="+", default=[], help="Target sentence files.")
+    parser.add_argument("--sentences", type=int, default=2000, help="Number of sentences of the speed benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed encodings of each backend.")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Minimum share of matching blocks.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="JSON file of the results.")
+    args = parser.parse_args()
+    assert len(args.source) == len(args.target), "-s and -t must have the same number of files"
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    with TemporaryDirectory() as work_dir:
+        src_files, tgt_files = list(args.source), list(args.target)
+        if len(src_files) == 0:
+            for idx in range(2):
+                src_files.append(Path(work_dir) / f"ja_{idx}.txt")
+                tgt_files.append(Path(work_dir) / f"zh_{idx}.txt")
+                make_segmented_pair(src_files[-1], tgt_files[-1], sentences=300, seed=idx)
+        texts = []
+        for file in src_files + tgt_files:
+            texts.extend(line.strip() for line in Path(file).read_text("utf-8").splitlines() if line.strip() != "")
+        texts = (texts * (args.sentences // max(len(texts), 1) + 1))[: args.sentences]
+
+        results = {}
+        ref_vecs = ref_pairs = None
+        for backend in backends:
+            timings, vecs, pairs = run_backend(
+                backend, args.model_dir, args.threads, texts, src_files, tgt_files, args.repeat
+            )
+            if ref_vecs is None:
+                ref_vecs, ref_pairs = vecs, pairs
+            cosines = np.einsum("ij,ij->i", vecs, ref_vecs) / np.maximum(
+                np.linalg.norm(vecs, axis=1) * np.linalg.norm(ref_vecs, axis=1), 1e-12
+            )
+            results[backend] = {
+                **timings,
+                "speedup": results["torch"]["encode"] / timings["encode"] if "torch" in results else 1.0,
+                "mean_cosine": float(cosines.mean()),
+                "min_cosine": float(cosines.min()),
+                "block_agreement": block_agreement(ref_pairs, pairs),
+            }
+            result = results[backend]
+            print(
+                f"{backend:<10} {result['sentences/s']:9.1f} sentences/s  x{result['speedup']:4.2f}  "
+                f"cosine mean {result['mean_cosine']:.4f} min {result['min_cosine']:.4f}  "
+                f"blocks {result['block_agreement']:.2%}"
+            )
+
+    if args.output is not None:
+        meta = {"model_dir": args.model_dir, "threads": args.threads, "sentences": len(texts)}
+        Path(args.output).write_text(json.dumps({"meta": meta, "results": results}, indent=4), "utf-8")
+    failed = [backend for backend, result in results.items() if result["block_agreement"] < args.min_agreement]
+    if len(failed) > 0:
+        print(f"Below {args.min_agreement:.0%} of matching blocks: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of the epub parsing engines on a synthetic large EPUB.
+
+Usage (from the repository root):
+    python -m benchmarks.epub_engines [--chapters 200] [--paragraphs 400] [--repeat 3]
+"""
+import time
+import argparse
+import tempfile
+import warnings
+from pathlib import Path
+
+from data_extract import epub
+
+from .synth import make_epub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the epub parsing engines.")
+    parser.add_argument("--chapters", type=int, metavar="INT", default=200, help="Default: 200.")
+    parser.add_argument(
+        "--paragraphs", type=int, metavar="INT", default=400, help="Paragraphs per chapter. Default: 400."
+    )
+    parser.add_argument("--repeat", type=int, metavar="INT", default=3, help="Default: 3.")
+    args = parser.parse_args()
+    # bs4 complains about parsing XHTML with its HTML parser
+    warnings.filterwarnings("ignore", message="It looks like you're using an HTML parser to parse an XML document")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "synthetic.epub"
+        # the toc is flat, since the `bs4` engine cannot handle nested toc sections
+        make_epub(file_path, chapters=args.chapters, paragraphs=args.paragraphs, nested_toc=False)
+        print(f"{file_path.stat().st_size / 2**20:.1f} MiB, {args.chapters} chapters x {args.paragraphs} paragraphs")
+        results = {}
+        for engine in epub.ENGINES:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                docs = epub.read_docs_from_epub(file_path, engine=engine)
+                best = min(best, time.perf_counter() - start)
+            results[engine] = docs
+            print(f"{engine:<6} best={best:.3f}s chapters={len(docs)} chars={sum(len(doc) for doc in docs)}")
+        titles = {engine: [doc.title for doc in docs] for engine, docs in results.items()}
+        print(f"titles identical: {titles['bs4'] == titles['lxml']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of `filter_docs_by_threshold`, and a randomized check that it keeps the semantics
+of the original quadratic implementation.
+
+Usage (from the repository root):
+    python -m benchmarks.filter_docs [--docs 1000 4000 16000] [--cases 2000]
+"""
+import time
+import random
+import argparse
+from typing import *
+
+from data_extract.common import DocumentEpub, filter_docs_by_threshold, filter_corpus_by_threshold
+
+
+def reference_filter_docs_by_threshold(
+    docs: List[DocumentEpub], threshold: float = 0.05, min_keep_len: int = 1000
+) -> List[DocumentEpub]:
+    """
+    The original implementation of `filter_docs_by_threshold`.
+    """
+    assert 0.0 <= threshold <= 1.0
+    assert len(docs) > 0
+    asc_docs = sorted(docs, key=lambda doc: len(doc))
+    all_len = sum(len(doc) for doc in docs)
+    filtered_docs = []
+    for doc in asc_docs:
+        if len(doc) > min_keep_len:
+            break
+        filtered_docs_len = sum(len(doc) for doc in filtered_docs)
+        if (filtered_docs_len + len(doc)) / all_len < threshold:
+            filtered_docs.append(doc)
+    return [doc for doc in docs if doc not in filtered_docs]
+
+
+def random_docs(rng: random.Random, num_docs: int) -> List[DocumentEpub]:
+    max_len = rng.choice([5, 50, 2000, 20000])
+    # plenty of equal lengths, to exercise the tie breaking
+    return [DocumentEpub("x" * rng.randint(1, max_len)) for _ in range(num_docs)]
+
+
+def check_semantics(num_cases: int, seed=0) -> None:
+    rng = random.Random(seed)
+    for case in range(num_cases):
+        threshold = rng.choice([0.0, 0.05, 0.3, 1.0, rng.random()])
+        min_keep_len = rng.choice([0, 10, 1000, rng.randint(0, 20000)])
+        volumes = [random_docs(rng, rng.randint(1, 30)) for _ in range(rng.randint(1, 5))]
+        expected = [reference_filter_docs_by_threshold(docs, threshold, min_keep_len) for docs in volumes]
+        actual = filter_corpus_by_threshold(volumes, threshold, min_keep_len, scope="volume")
+        assert all(list(map(id, a)) == list(map(id, e)) for a, e in zip(actual, expected)), f"case {case}"
+        assert [filter_docs_by_threshold(docs, threshold, min_keep_len) for docs in volumes] == actual, f"case {case}"
+        # a global threshold over the corpus is the same as over the concatenated volumes
+        expected = reference_filter_docs_by_threshold(sum(volumes, []), threshold, min_keep_len)
+        actual = filter_corpus_by_threshold(volumes, threshold, min_keep_len, scope="global")
+        assert list(map(id, sum(actual, []))) == list(map(id, expected)), f"case {case}"
+    print(f"semantics: {num_cases} random cases identical to the reference implementation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filter_docs_by_threshold.")
+    parser.add_argument("--docs", type=int, nargs="+", metavar="INT", default=[1000, 4000, 16000])
+    parser.add_argument("--cases", type=int, metavar="INT", default=2000, help="Random semantic checks. Default: 2000.")
+    parser.add_argument("--reference-max-docs", type=int, metavar="INT", default=4000)
+    args = parser.parse_args()
+
+    check_semantics(args.cases)
+    rng = random.Random(1)
+    for num_docs in args.docs:
+        # a high threshold keeps the reference loop running over many documents
+        docs = [DocumentEpub("x" * rng.randint(1, 3000)) for _ in range(num_docs)]
+        start = time.perf_counter()
+        filter_docs_by_threshold(docs, threshold=0.5, min_keep_len=3000)
+        elapsed = time.perf_counter() - start
+        line = f"docs={num_docs:<7} vectorized={elapsed:.4f}s"
+        if num_docs <= args.reference_max_docs:
+            start = time.perf_counter()
+            reference_filter_docs_by_threshold(docs, threshold=0.5, min_keep_len=3000)
+            line += f" reference={time.perf_counter() - start:.4f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
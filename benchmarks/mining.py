@@ -0,0 +1,112 @@
+"""
+Benchmark of the nearest neighbour search of `data_process.mining` as the volume grows: time and recall of the
+approximate indexes (`ivf`, and `faiss` if it is installed) against the brute-force `exact` search,
+and precision of the pairs they mine.
+
+The embeddings are synthetic: source sentences are drawn around topics, like the sentences of a volume,
+and their translations are noisy copies, shuffled among as many unrelated target sentences.
+
+Usage (from the repository root):
+    python -m benchmarks.mining [--sizes 5000 20000 50000] [--dim 256] [--nprobe 16] [--min-recall 0.9]
+
+Exits with 1 if an index finds fewer of the exact neighbours than `--min-recall` at some size.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+from data_process.mining import mine, select_pairs
+
+
+def synthetic_embeddings(
+    size: int, dim: int, noise=0.8, topic_weight=0.5, seed=0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: (source embeddings, target embeddings, index of the translation of each source sentence)
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(1, size // 100), dim)).astype(np.float32)
+
+    def sentences(num):
+        topic_vecs = topic_weight * topics[rng.integers(len(topics), size=num)]
+        return topic_vecs + rng.standard_normal((num, dim)).astype(np.float32)
+
+    src_vecs = sentences(size)
+    translations = src_vecs + noise * rng.standard_normal((size, dim)).astype(np.float32)
+    tgt_vecs = np.concatenate([translations, sentences(size)])
+    order = rng.permutation(len(tgt_vecs))
+    truth = np.argsort(order)[:size]
+    return src_vecs, tgt_vecs[order], truth
+
+
+def neighbour_recall(ref_idxs: np.ndarray, idxs: np.ndarray) -> float:
+    """
+    Share of the reference neighbours of each query that were found, over all queries.
+    """
+    found = sum(len(np.intersect1d(ref, row[row >= 0])) for ref, row in zip(ref_idxs, idxs))
+    return found / max(ref_idxs.size, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nearest neighbour search of the mining mode.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000], help="Source sentences.")
+    parser.add_argument("--dim", type=int, default=256, help="Dimension of the embeddings.")
+    parser.add_argument("--k", type=int, default=4, help="Number of neighbours.")
+    parser.add_argument("--nprobe", type=int, default=16, help="Clusters searched by each query.")
+    parser.add_argument("--min-margin", type=float, default=1.06, help="Minimum margin of the mined pairs.")
+    parser.add_argument("--min-recall", type=float, default=0.0, help="Minimum recall of the approximate indexes.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    methods = ["exact", "ivf"]
+    try:
+        import faiss  # noqa: F401
+
+        methods.append("faiss")
+    except ImportError:
+        print("faiss is not installed, only timing `ivf`")
+
+    results = []
+    failed = []
+    for size in args.sizes:
+        src_vecs, tgt_vecs, truth = synthetic_embeddings(size, args.dim)
+        ref = None
+        for method in methods:
+            start = time.perf_counter()
+            candidates = mine(src_vecs, tgt_vecs, k=args.k, method=method, nprobe=args.nprobe)
+            elapsed = time.perf_counter() - start
+            pairs = select_pairs(candidates, min_margin=args.min_margin)
+            if ref is None:
+                ref = {"time": elapsed, "tgt": candidates["tgt"]}
+            result = {
+                "size": size,
+                "method": method,
+                "time": elapsed,
+                "speedup": ref["time"] / elapsed,
+                "recall": neighbour_recall(ref["tgt"], candidates["tgt"]),
+                "pairs": len(pairs),
+                "precision": float((truth[pairs[:, 0]] == pairs[:, 1]).mean()) if len(pairs) > 0 else 0.0,
+            }
+            results.append(result)
+            print(
+                f"{size:>8} {method:<6} {elapsed:8.3f}s  x{result['speedup']:5.2f}  recall@{args.k} "
+                f"{result['recall']:.2%}  {result['pairs']} pairs, precision {result['precision']:.2%}"
+            )
+            if result["recall"] < args.min_recall:
+                failed.append(f"{method} at {size}")
+
+    if args.output is not None:
+        meta = {"dim": args.dim, "k": args.k, "nprobe": args.nprobe, "min_margin": args.min_margin}
+        Path(args.output).write_text(json.dumps({"meta": meta, "results": results}, indent=4), "utf-8")
+    if len(failed) > 0:
+        print(f"Below {args.min_recall:.0%} of the exact neighbours: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
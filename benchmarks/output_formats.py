@@ -0,0 +1,77 @@
+"""
+Benchmark of the output formats of `process`: size, write time and reload time of a synthetic corpus of text pairs.
+
+Usage (from the repository root):
+    python -m benchmarks.output_formats [--files 200] [--blocks 500]
+
+The parquet format is skipped without pyarrow.
+"""
+import time
+import random
+import argparse
+import tempfile
+from typing import *
+from pathlib import Path
+
+from data_process.formats import FORMATS, iter_blocks, write_blocks
+
+from .synth import JA_CHARS, ZH_CHARS, random_sentence
+
+
+def synthetic_text_pairs(num_blocks=500, seed=0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    ret = []
+    src_idx = tgt_idx = 0
+    for _ in range(num_blocks):
+        num_src, num_tgt = rng.choice([(1, 1)] * 8 + [(2, 1), (1, 2), (0, 1), (1, 0)])
+        ret.append(
+            {
+                "src_numbers": list(range(src_idx, src_idx + num_src)),
+                "tgt_numbers": list(range(tgt_idx, tgt_idx + num_tgt)),
+                "src_texts": [random_sentence(rng, JA_CHARS) for _ in range(num_src)],
+                "tgt_texts": [random_sentence(rng, ZH_CHARS) for _ in range(num_tgt)],
+            }
+        )
+        src_idx += num_src
+        tgt_idx += num_tgt
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the output formats of text pairs.")
+    parser.add_argument("--files", type=int, default=200, help="Number of pairs of files.")
+    parser.add_argument("--blocks", type=int, default=500, help="Number of alignment blocks per pair of files.")
+    args = parser.parse_args()
+
+    corpus = [synthetic_text_pairs(args.blocks, seed=idx) for idx in range(args.files)]
+    print(f"{args.files} files, {args.files * args.blocks} blocks")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt, suffix in FORMATS.items():
+            paths = [Path(tmp_dir) / f"{idx}{suffix}" for idx in range(len(corpus))]
+            try:
+                start = time.perf_counter()
+                for path, pairs in zip(paths, corpus):
+                    with path.open("wb") as f:
+                        write_blocks(f, pairs, fmt=fmt)
+                write_time = time.perf_counter() - start
+            except ImportError as e:
+                print(f"{fmt:<8} skipped: {e}")
+                continue
+            start = time.perf_counter()
+            reloaded = [list(iter_blocks(path)) for path in paths]
+            read_time = time.perf_counter() - start
+            assert reloaded == corpus, f"{fmt} does not round-trip"
+            size = sum(path.stat().st_size for path in paths)
+            results[fmt] = (size, write_time, read_time)
+    base_size, base_write, base_read = results["json"]
+    for fmt, (size, write_time, read_time) in results.items():
+        print(
+            f"{fmt:<8} {size / 2**20:8.2f} MiB ({size / base_size:.2f}x) "
+            f"write {write_time:.3f}s ({write_time / base_write:.2f}x) "
+            f"read {read_time:.3f}s ({read_time / base_read:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of the sentence segmentation engines, and an agreement report of the rule-based engine
+against trankit.
+
+Usage (from the repository root):
+    python -m benchmarks.segmentation_engines [-i "chapters/*.txt" ...] [--report agreement.json] [--cpu]
+
+Without `-i`, a synthetic corpus is used. Without trankit installed, only the rule-based engine is timed.
+Exits with 1 if the rule-based engine splits one of `RULE_CASES` differently than expected.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from glob import glob
+from typing import *
+from pathlib import Path
+
+from data_preprocess.rule_segmentation import split_sentences_rule
+
+from .synth import JA_CHARS, ZH_CHARS, random_sentence
+
+# text -> expected sentences of the rule-based engine, which are NFKC-normalized
+RULE_CASES = {
+    "「え？」「はい」": ["「え?」", "「はい」"],
+    "そうか… 行こう。": ["そうか...", "行こう。"],
+    "そうか... 行こう。": ["そうか...", "行こう。"],
+    # `‥` after NFKC
+    "そうか.. 行こう。": ["そうか..", "行こう。"],
+    "そうか..「行こう」": ["そうか..", "「行こう」"],
+    "1..2です。": ["1..2です。"],
+}
+
+
+def check_rule_cases() -> List[str]:
+    """
+    :return: the cases of `RULE_CASES` that the rule-based engine splits differently
+    """
+    failed = []
+    for text, expected in RULE_CASES.items():
+        sents = split_sentences_rule(text)
+        if sents != expected:
+            failed.append(f"{text!r}: {sents} instead of {expected}")
+    return failed
+
+
+def synthetic_corpus(num_chapters=20, paragraphs=200, seed=0) -> Dict[str, str]:
+    rng = random.Random(seed)
+    ret = {}
+    for idx in range(num_chapters):
+        chars = JA_CHARS if idx % 2 == 0 else ZH_CHARS
+        lines = ["".join(random_sentence(rng, chars) for _ in range(rng.randint(1, 4))) for _ in range(paragraphs)]
+        ret[f"synthetic_{idx}"] = "\n".join(lines)
+    return ret
+
+
+def boundaries(sents: List[str]) -> Set[int]:
+    """
+    Sentence end offsets, in the text without whitespace.
+    """
+    ret = set()
+    offset = 0
+    for sent in sents:
+        offset += len(re.sub(r"\s+", "", sent))
+        ret.add(offset)
+    return ret
+
+
+def agreement(rule_sents: List[str], ref_sents: List[str]) -> Dict[str, float]:
+    rule_bounds, ref_bounds = boundaries(rule_sents), boundaries(ref_sents)
+    common = len(rule_bounds & ref_bounds)
+    precision = common / len(rule_bounds) if rule_bounds else 1.0
+    recall = common / len(ref_bounds) if ref_bounds else 1.0
+    return {
+        "rule_sentences": len(rule_sents),
+        "trankit_sentences": len(ref_sents),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0,
+        "identical_sentences": len(set(rule_sents) & set(ref_sents)) / max(len(ref_sents), 1),
+    }
+
+
+def time_engine(split: Callable[[str], List[str]], corpus: Dict[str, str]) -> Tuple[Dict[str, List[str]], float]:
+    start = time.perf_counter()
+    ret = {name: split(text) for name, text in corpus.items()}
+    return ret, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sentence segmentation engines.")
+    parser.add_argument("-i", "--input", type=str, nargs="+", metavar="FILE", help="Sample chapters. Glob supported.")
+    parser.add_argument("--report", type=str, metavar="FILE", help="Write the per-chapter agreement report as JSON.")
+    parser.add_argument("--cpu", action="store_true", default=False, help="Run trankit on CPU.")
+    args = parser.parse_args()
+
+    failed = check_rule_cases()
+    for case in failed:
+        print(f"rule     {case}")
+    if len(failed) > 0:
+        sys.exit(1)
+
+    if args.input:
+        paths = [Path(path) for pattern in args.input for path in sorted(glob(pattern))]
+        corpus = {path.name: path.read_text("utf-8") for path in paths}
+    else:
+        corpus = synthetic_corpus()
+    num_chars = sum(len(text) for text in corpus.values())
+    print(f"{len(corpus)} chapters, {num_chars} characters")
+
+    rule_results, elapsed = time_engine(split_sentences_rule, corpus)
+    print(f"rule     {elapsed:.3f}s {num_chars / elapsed:,.0f} chars/s")
+
+    try:
+        from data_preprocess import sentence_segmentation as ss
+
+        start = time.perf_counter()
+        pipeline = ss.get_default_pipeline(cpu_only=args.cpu)
+        print(f"trankit  pipeline loaded in {time.perf_counter() - start:.3f}s")
+    except ImportError as e:
+        print(f"trankit  skipped: {e}")
+        return
+    trankit_results, elapsed = time_engine(lambda text: ss.split_sentences(pipeline, text), corpus)
+    print(f"trankit  {elapsed:.3f}s {num_chars / elapsed:,.0f} chars/s")
+
+    report = {name: agreement(rule_results[name], trankit_results[name]) for name in corpus}
+    for key in ["precision", "recall", "f1", "identical_sentences"]:
+        # weighted by the number of trankit sentences
+        total = sum(r[key] * r["trankit_sentences"] for r in report.values())
+        print(f"agreement {key:<20} {total / max(sum(r['trankit_sentences'] for r in report.values()), 1):.4f}")
+    if args.report:
+        with Path(args.report).open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
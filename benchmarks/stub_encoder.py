@@ -0,0 +1,72 @@
+"""
+Stand-in for the bertalign encoder, whose cost grows with the padded size of its batches like a transformer,
+so that the encoding and alignment benchmarks run without a GPU or the model weights.
+"""
+import time
+from typing import *
+
+import numpy as np
+
+__all__ = ["StubEncoder", "StubModel"]
+
+
+class StubModel:
+    """
+    Mimics `SentenceTransformer.encode`: texts are sorted by length and encoded in batches padded to their longest
+    text. The embedding of a text only depends on its characters, not on its batch.
+    Each batch also costs `batch_overhead` seconds, like the kernel launches and transfers of a forward pass.
+    """
+
+    def __init__(self, dim=32, max_seq_length=500, batch_overhead=0.005, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.device = "cpu"
+        self.tokenizer = None
+        self.batch_overhead = batch_overhead
+        self.char_table = rng.standard_normal((4096, dim)).astype(np.float32)
+        self.weight = rng.standard_normal((dim, dim)).astype(np.float32) / np.sqrt(dim)
+        self.padded_tokens = 0
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        max_len = max(1, max(min(len(text), self.max_seq_length) for text in texts))
+        ids = np.zeros((len(texts), max_len), dtype=np.int64)
+        mask = np.zeros((len(texts), max_len, 1), dtype=np.float32)
+        for row, text in enumerate(texts):
+            chars = [ord(ch) % len(self.char_table) for ch in text[:max_len]]
+            ids[row, : len(chars)] = chars
+            mask[row, : len(chars)] = 1
+        self.padded_tokens += ids.size
+        time.sleep(self.batch_overhead)
+        # a few dense layers over every padded position, like a transformer
+        hidden = self.char_table[ids]
+        for _ in range(2):
+            hidden = np.tanh(hidden @ self.weight)
+        vecs = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-9)
+
+    def encode(self, texts: List[str], batch_size=32, **kwargs) -> np.ndarray:
+        ret = np.zeros((len(texts), self.dim), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda idx: len(texts[idx]), reverse=True)
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            ret[batch] = self._encode_batch([texts[idx] for idx in batch])
+        return ret
+
+
+class StubEncoder:
+    """
+    Mimics the bertalign `Encoder`.
+    """
+
+    def __init__(self, model: Optional[StubModel] = None, model_name="stub"):
+        self.model = model or StubModel()
+        self.model_name = model_name
+
+    def transform(self, sents: List[str], num_overlaps: int) -> Tuple[np.ndarray, np.ndarray]:
+        from bertalign.utils import yield_overlaps
+
+        overlaps = list(yield_overlaps(sents, num_overlaps))
+        sent_vecs = self.model.encode(overlaps).reshape(num_overlaps, len(sents), -1)
+        len_vecs = np.array([len(line.encode("utf-8")) for line in overlaps]).reshape(num_overlaps, len(sents))
+        return sent_vecs, len_vecs
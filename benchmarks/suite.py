@@ -0,0 +1,186 @@
+"""
+Benchmark suite of the main function of each stage, over deterministic synthetic corpora of growing size.
+Results are stored as JSON, so that a run can be compared with a previous one to find regressions.
+
+Usage (from the repository root):
+    python -m benchmarks.suite [--sizes small medium] [--repeat 3] [-o results.json] [--compare baseline.json]
+
+By default, results are written to `benchmarks/results/<date>_<commit>.json`.
+Alignment uses the stub encoder, so that it runs offline, but it requires bertalign.
+`split_sentences` (trankit) is only timed with `--trankit`, since it downloads its model;
+the rule-based splitter is always timed.
+"""
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from typing import *
+from pathlib import Path
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+
+from .synth import JA_CHARS, make_epub, make_segmented_pair
+from .stub_encoder import StubModel, StubEncoder
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# chapters and paragraphs of the EPUB, and source sentences of each pair of segmented chapters
+SIZES = {
+    "small": {"chapters": 5, "paragraphs": 50, "sentences": 200, "pairs": 2},
+    "medium": {"chapters": 20, "paragraphs": 200, "sentences": 1000, "pairs": 4},
+    "large": {"chapters": 50, "paragraphs": 500, "sentences": 4000, "pairs": 8},
+}
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "times": times}
+
+
+def run_size(size: Dict[str, int], work_dir: Path, repeat: int, trankit=False) -> Dict[str, Dict[str, Any]]:
+    """
+    Time each benchmark of the suite on a corpus of the given size.
+
+    :return: {benchmark: {"median", "min", "times"}}
+    """
+    from data_report.tmx import make_tmx_file
+    from data_report.html import make_html_report
+    from data_extract.epub import read_docs_from_epub
+    from data_extract.common import filter_docs_by_threshold
+    from data_process.formats import write_blocks
+    from data_process.process import generate_text_pairs
+    from data_preprocess.rule_segmentation import split_sentences_rule
+
+    ret = {}
+    # bs4 does not handle nested tocs, so that both engines read the same book
+    epub_path = work_dir / "book.epub"
+    make_epub(epub_path, chapters=size["chapters"], paragraphs=size["paragraphs"], chars=JA_CHARS, nested_toc=False)
+    for engine in ["bs4", "lxml"]:
+        ret[f"read_docs_from_epub[{engine}]"] = time_call(lambda: read_docs_from_epub(epub_path, engine=engine), repeat)
+    docs = read_docs_from_epub(epub_path, engine="lxml")
+    ret["filter_docs_by_threshold"] = time_call(lambda: filter_docs_by_threshold(docs, 0.05, 1000), repeat)
+
+    texts = [str(doc) for doc in docs]
+    ret["split_sentences_rule"] = time_call(lambda: [split_sentences_rule(text) for text in texts], repeat)
+    if trankit:
+        from data_preprocess import sentence_segmentation as ss
+
+        pipeline = ss.get_default_pipeline(cpu_only=True)
+        ret["split_sentences"] = time_call(lambda: [ss.split_sentences(pipeline, text) for text in texts], repeat)
+
+    src_files, tgt_files = [], []
+    for idx in range(size["pairs"]):
+        src_files.append(work_dir / f"ja_{idx}.txt")
+        tgt_files.append(work_dir / f"zh_{idx}.txt")
+        make_segmented_pair(src_files[-1], tgt_files[-1], sentences=size["sentences"] // size["pairs"], seed=idx)
+    # a new encoder for each call, so that no call benefits from a cache
+    ret["generate_text_pairs"] = time_call(
+        lambda: generate_text_pairs(src_files, tgt_files, encoder=StubEncoder(StubModel())), repeat
+    )
+
+    pairs = generate_text_pairs(src_files[:1], tgt_files[:1], encoder=StubEncoder(StubModel()))[0]
+    pair_path = work_dir / "pair.json"
+    with pair_path.open("wb") as f:
+        write_blocks(f, pairs, fmt="json")
+    ret["make_html_report"] = time_call(lambda: make_html_report(pair_path, work_dir / "pair.html"), repeat)
+    ret["make_tmx_file"] = time_call(
+        lambda: make_tmx_file(pair_path, work_dir / "pair.tmx", src_lang="ja", tgt_lang="zh"), repeat
+    )
+    return ret
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Print the ratio of the best times of the results to the ones of the baseline, which are less noisy than medians.
+
+    :param tolerance: relative slowdown above which a benchmark is a regression
+    :return: names of the regressions, as `size/benchmark`
+    """
+    ret = []
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('created')}):")
+    for size_name, benchmarks in results["results"].items():
+        for name, result in benchmarks.items():
+            base = baseline["results"].get(size_name, {}).get(name)
+            if base is None:
+                continue
+            ratio = result["min"] / max(base["min"], 1e-9)
+            status = ""
+            if ratio > 1 + tolerance:
+                status = "REGRESSION"
+                ret.append(f"{size_name}/{name}")
+            elif ratio < 1 / (1 + tolerance):
+                status = "faster"
+            print(f"{size_name:>8} {name:<30} {base['min']:9.4f}s -> {result['min']:9.4f}s  x{ratio:5.2f}  {status}")
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"], help="Corpus sizes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed calls of each benchmark.")
+    parser.add_argument("--trankit", action="store_true", help="Also time trankit's `split_sentences`.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Results file.")
+    parser.add_argument("--compare", type=str, default=None, help="Results file of a previous run to compare with.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Relative slowdown counted as a regression. Default: 0.2."
+    )
+    args = parser.parse_args()
+
+    commit = git_commit()
+    created = datetime.now(timezone.utc)
+    results = {
+        "meta": {
+            "created": created.isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "repeat": args.repeat,
+        },
+        "sizes": {name: SIZES[name] for name in args.sizes},
+        "results": {},
+    }
+    for size_name in args.sizes:
+        with TemporaryDirectory() as work_dir:
+            results["results"][size_name] = run_size(SIZES[size_name], Path(work_dir), args.repeat, args.trankit)
+        for name, result in results["results"][size_name].items():
+            print(f"{size_name:>8} {name:<30} median {result['median']:9.4f}s  min {result['min']:9.4f}s")
+
+    output = Path(args.output or RESULTS_DIR / f"{created:%Y%m%dT%H%M%S}_{commit or 'unknown'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4), "utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text("utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Deterministic synthetic data for the benchmarks.
+"""
+import os
+import random
+from typing import *
+
+from ebooklib import epub
+
+__all__ = ["JA_CHARS", "ZH_CHARS", "make_epub", "make_segmented_pair", "random_sentence", "sentence_pair"]
+
+JA_CHARS = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん俺彼女学校魔法世界"
+ZH_CHARS = "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持音跑"
+
+
+# characters written the same in Japanese and Chinese, which carry the meaning of the synthetic sentence pairs
+SHARED_CHARS = "学校魔法世界人大日月山川水火木金土天生年手心目口名前後中上下左右東西南北花雨風雪王子女力工石田村森林空海"
+JA_PARTICLES = ["の", "は", "が", "を", "に", "で", "と", "も", "から", "まで"]
+ZH_PARTICLES = ["的", "了", "是", "在", "和", "也", "把", "被"]
+
+
+def random_sentence(rng: random.Random, chars: str = JA_CHARS, min_len=5, max_len=40) -> str:
+    text = "".join(rng.choice(chars) for _ in range(rng.randint(min_len, max_len)))
+    return rng.choice(["「{}」", "{}。", "{}！", "{}……", "『{}』"]).format(text)
+
+
+def make_epub(
+    file_path: Union[str, os.PathLike],
+    chapters=20,
+    paragraphs=100,
+    chars: str = JA_CHARS,
+    lang="ja",
+    seed=0,
+    nested_toc=True,
+) -> None:
+    """
+    Write a synthetic EPUB with a spine and a toc. Chapters are grouped into nested toc sections,
+    and paragraphs contain ruby annotations and `<br>`.
+    """
+    rng = random.Random(seed)
+    book = epub.EpubBook()
+    book.set_identifier(f"synthetic-{lang}-{seed}")
+    book.set_title(f"synthetic {lang} {seed}")
+    book.set_language(lang)
+    items = []
+    for chapter_idx in range(chapters):
+        item = epub.EpubHtml(title=f"第{chapter_idx + 1}章", file_name=f"text/ch{chapter_idx:04d}.xhtml", lang=lang)
+        body = [f"<h1>第{chapter_idx + 1}章</h1>"]
+        for _ in range(paragraphs):
+            sentence = random_sentence(rng, chars)
+            if rng.random() < 0.2:
+                sentence = f"<ruby>{sentence[:2]}<rt>{random_sentence(rng, chars, 1, 3)}</rt></ruby>{sentence[2:]}"
+            if rng.random() < 0.1:
+                sentence += "<br/>" + random_sentence(rng, chars)
+            body.append(f"<p>{sentence}</p>")
+        item.content = f"<html><head><title>{item.title}</title></head><body>{''.join(body)}</body></html>"
+        book.add_item(item)
+        items.append(item)
+    if nested_toc:
+        book.toc = [
+            (epub.Section(f"第{part + 1}部"), items[part * 10 : (part + 1) * 10]) for part in range((chapters + 9) // 10)
+        ]
+    else:
+        book.toc = items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ["nav"] + items
+    epub.write_epub(str(file_path), book)
+
+
+def sentence_pair(rng: random.Random, min_words=3, max_words=20) -> Tuple[str, str]:
+    """
+    A Japanese sentence and its "translation": the same content characters, with the function words of each language.
+    """
+    words = [rng.choice(SHARED_CHARS) for _ in range(rng.randint(min_words, max_words))]
+    ja = "".join(word + (rng.choice(JA_PARTICLES) if rng.random() < 0.5 else "") for word in words)
+    zh = "".join((rng.choice(ZH_PARTICLES) if rng.random() < 0.3 else "") + word for word in words)
+    return ja + "。", zh + "。"
+
+
+def make_segmented_pair(
+    src_path: Union[str, os.PathLike],
+    tgt_path: Union[str, os.PathLike],
+    sentences=500,
+    seed=0,
+    split_rate=0.05,
+    drop_rate=0.02,
+) -> None:
+    """
+    Write a pair of segmented chapters, one sentence per line, Japanese in `src_path` and Chinese in `tgt_path`.
+    Some target sentences are split in two (1-2 alignments), and some source sentences are not translated
+    (1-0 alignments).
+
+    :param sentences: number of source sentences
+    """
+    rng = random.Random(seed)
+    src_lines, tgt_lines = [], []
+    for _ in range(sentences):
+        ja, zh = sentence_pair(rng)
+        src_lines.append(ja)
+        if rng.random() < drop_rate:
+            continue
+        if rng.random() < split_rate and len(zh) > 4:
+            middle = len(zh) // 2
+            tgt_lines.extend([zh[:middle] + "，", zh[middle:]])
+        else:
+            tgt_lines.append(zh)
+    for path, lines in [(src_path, src_lines), (tgt_path, tgt_lines)]:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
@@ -0,0 +1,80 @@
+"""
+Benchmark of the streaming TMX writer against the translate-toolkit document tree, which is also used to check
+that both outputs hold the same translation units.
+
+Usage (from the repository root):
+    python -m benchmarks.tmx_export [--files 50] [--blocks 500]
+"""
+import time
+import argparse
+import tempfile
+from typing import *
+from pathlib import Path
+
+from translate.storage import tmx as tt_tmx
+
+from data_report import tmx
+from data_process.formats import write_blocks
+
+from .output_formats import synthetic_text_pairs
+
+
+def unit_texts(file_path: Path) -> List[Dict[str, str]]:
+    """
+    Texts of each unit by language, as parsed by translate-toolkit.
+    """
+    store = tt_tmx.tmxfile(file_path.read_bytes())
+    return [
+        {tuv.get(tmx.XML_LANG): "".join(tuv.find("seg").itertext()) for tuv in unit.xmlelement.iter("tuv")}
+        for unit in store.units
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TMX export.")
+    parser.add_argument("--files", type=int, default=50, help="Number of text pair files.")
+    parser.add_argument("--blocks", type=int, default=500, help="Number of alignment blocks per file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        inputs = []
+        for idx in range(args.files):
+            inputs.append(tmp_dir / f"{idx}.jsonl")
+            with inputs[-1].open("wb") as f:
+                write_blocks(f, synthetic_text_pairs(args.blocks, seed=idx), fmt="jsonl")
+        print(f"{args.files} files, {args.files * args.blocks} blocks")
+
+        def toolkit():
+            for input_path in inputs:
+                tmx.json2tmx(tmx.iter_blocks(input_path), "ja", "zh").savefile(
+                    str(tmp_dir / f"{input_path.stem}.tt.tmx")
+                )
+
+        def streaming():
+            for input_path in inputs:
+                tmx.make_tmx_file(input_path, tmp_dir / f"{input_path.stem}.tmx", "ja", "zh")
+
+        def merged():
+            tmx.merge_tmx_files(inputs, tmp_dir / "merged.tmx", "ja", "zh")
+
+        for name, func in [("toolkit", toolkit), ("streaming", streaming), ("merged", merged)]:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<10} {elapsed:.3f}s {args.files * args.blocks / elapsed:,.0f} units/s")
+
+        merged_units = unit_texts(tmp_dir / "merged.tmx")
+        offset = 0
+        for input_path in inputs:
+            ref_units = unit_texts(tmp_dir / f"{input_path.stem}.tt.tmx")
+            units = unit_texts(tmp_dir / f"{input_path.stem}.tmx")
+            # the toolkit path also writes the target text with the `xx` language
+            assert all(unit.items() <= ref.items() for unit, ref in zip(units, ref_units)), input_path
+            assert len(units) == len(ref_units) and merged_units[offset : offset + len(units)] == units, input_path
+            offset += len(units)
+        print("outputs are equivalent")
+
+
+if __name__ == "__main__":
+    main()
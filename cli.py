@@ -1,29 +1,50 @@
 import logging
 import argparse
-
-import data_report.cli
-import data_extract.cli
-import data_process.cli
-import data_preprocess.cli
+import importlib
 
 logging.basicConfig(level=logging.INFO)
 
+# Subcommand registry: (name, module declaring the arguments, help).
+# The modules listed here only depend on argparse at import time. Their heavy backends
+# (torch, trankit, bertalign, ...) are imported inside `main`, i.e. when `func` actually runs.
+SUBCOMMANDS = [
+    ("extract", "data_extract.cli", "extract the textual data."),
+    ("preprocess", "data_preprocess.cli", "Preprocess the data."),
+    ("process", "data_process.cli", "Process the data."),
+    ("report", "data_report.cli", "Report the data."),
+    ("pipeline", "data_pipeline.cli", "Run the stale stages of a project, from extraction to report."),
+    ("serve", "data_server.cli", "Serve segment and align jobs with resident models."),
+]
+
 
 parser = argparse.ArgumentParser(description="CLI for ACG dataset building.")
+parser.add_argument(
+    "--profile",
+    type=str,
+    metavar="FILE",
+    default=None,
+    help="Record the wall time, CPU time, peak RSS and throughput of each stage and file of the subcommand "
+    "into this report: CSV if it ends with `.csv`, JSON otherwise.",
+)
+parser.add_argument(
+    "--profile-cprofile",
+    type=str,
+    metavar="FILE",
+    default=None,
+    help="Dump cProfile stats of the main process into this file, e.g. for `python -m pstats FILE`.",
+)
 subparsers = parser.add_subparsers(help="Subcommand to run.")
-# data_extract subcommand
-data_extract.cli.register_subparser(subparsers.add_parser("extract", help="extract the textual data."))
-# data_preprocess subcommand
-data_preprocess.cli.register_subparser(subparsers.add_parser("preprocess", help="Preprocess the data."))
-# data_process subcommand
-data_process.cli.register_subparser(subparsers.add_parser("process", help="Process the data."))
-# data_report subcommand
-data_report.cli.register_subparser(subparsers.add_parser("report", help="Report the data."))
+for name, module_name, help_msg in SUBCOMMANDS:
+    importlib.import_module(module_name).register_subparser(subparsers.add_parser(name, help=help_msg))
 
 
 if __name__ == "__main__":
     args = parser.parse_args()
-    if hasattr(args, "func"):
+    if hasattr(args, "func") and (args.profile is not None or args.profile_cprofile is not None):
+        from data_profile import profile_command
+
+        profile_command(args.func, args, report_file=args.profile, cprofile_file=args.profile_cprofile)
+    elif hasattr(args, "func"):
         args.func(args)
     else:
         parser.print_help()
@@ -1,2 +1,10 @@
-from . import epub
+import importlib
+
 from .common import *
+
+
+def __getattr__(name):
+    # `epub` pulls in ebooklib and BeautifulSoup, only load it on first access
+    if name == "epub":
+        return importlib.import_module(f"{__name__}.epub")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
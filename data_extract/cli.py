@@ -1,11 +1,22 @@
+import sys
+import json
+import logging
 import argparse
+from glob import glob
+from typing import *
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from tqdm import tqdm
 from pathvalidate import sanitize_filename
 
 from data_process import Document
+from data_profile import add_counts, profile_stage, worker_result, worker_function
 
-from . import epub, common
+from . import common
+from .dedup import MinHasher, MinHashIndex
+
+MANIFEST_FILENAME = "extract_manifest.json"
 
 
 def register_subparser(parser: argparse.ArgumentParser):
@@ -21,9 +32,10 @@ def register_subparser(parser: argparse.ArgumentParser):
         "-i",
         "--input",
         type=str,
-        metavar="FILE",
+        nargs="+",
+        metavar="FILE/DIR",
         required=True,
-        help="Path to input file.",
+        help="Path to input files or directories of input files. Glob pattern is supported.",
     )
     parser.add_argument(
         "-o",
@@ -31,10 +43,26 @@ def register_subparser(parser: argparse.ArgumentParser):
         type=str,
         metavar="DIR",
         required=True,
-        help="Path to output file. Should be a directory.",
+        help="Path to output file. Should be a directory. "
+        "If multiple inputs are given, each of them is extracted into its own subdirectory.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="Number of worker processes. Default: 1.",
     )
 
     group_epub = parser.add_argument_group("epub", "Additional arguments for epub manipulation.")
+    group_epub.add_argument(
+        "--engine",
+        type=str,
+        choices=["bs4", "lxml"],
+        default="bs4",
+        help="Parsing engine. `lxml` is faster on large volumes and skips ruby readings. Default: bs4.",
+    )
     group_epub.add_argument(
         "--threshold",
         type=float,
@@ -49,14 +77,84 @@ def register_subparser(parser: argparse.ArgumentParser):
         default=1000,
         help="If the length of a document is greater than this value, it will be kept. Default: 1000.",
     )
+    group_epub.add_argument(
+        "--threshold-scope",
+        type=str,
+        choices=["volume", "global"],
+        default="volume",
+        help="Apply `--threshold` to each volume, or to all input volumes as a whole. Default: volume.",
+    )
+
+    group_dedup = parser.add_argument_group("dedup", "Additional arguments for duplicate chapter detection.")
+    group_dedup.add_argument(
+        "--dedup-index",
+        type=str,
+        metavar="FILE",
+        default=None,
+        help="Path to the persistent MinHash index of the chapters extracted so far. "
+        "It is created if missing, and updated after extraction. If not specified, no deduplication is performed.",
+    )
+    group_dedup.add_argument(
+        "--dedup-threshold",
+        type=float,
+        metavar="FLOAT",
+        default=0.8,
+        help="Chapters whose estimated Jaccard similarity to an indexed chapter is at least this value "
+        "are duplicates. Default: 0.8.",
+    )
+    group_dedup.add_argument(
+        "--dedup-action",
+        type=str,
+        choices=["mark", "skip"],
+        default="mark",
+        help="`mark` only records duplicates in the manifest. `skip` also removes their output files. Default: mark.",
+    )
 
     parser.set_defaults(func=main)
 
 
-def epub_extract(input_filepath: Path, output_dir: Path, threshold=0.05, min_keep_len=1000):
-    epub_docs = epub.read_docs_from_epub(input_filepath)
-    epub_docs = common.filter_docs_by_threshold(epub_docs, threshold, min_keep_len)
+def epub_extract(
+    input_filepath: Path,
+    output_dir: Path,
+    threshold=0.05,
+    min_keep_len=1000,
+    engine="bs4",
+    hasher: Optional[MinHasher] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Extract the chapters of an epub file into `output_dir`, one file per chapter.
+
+    :param hasher: if specified, the digest and MinHash signature of each chapter are also returned
+    :return: list of dict: {
+            "file": str,
+            "title": str or None,
+            "chapter_id": str or None,
+            "sentences": int,
+            "digest": str, (only if `hasher` is specified)
+            "signature": np.ndarray, (only if `hasher` is specified)
+        }
+    """
+    from . import epub
+
+    with profile_stage("extract", item=input_filepath):
+        epub_docs = epub.read_docs_from_epub(input_filepath, engine=engine)
+        epub_docs = common.filter_docs_by_threshold(epub_docs, threshold, min_keep_len)
+        ret = save_docs(epub_docs, output_dir, hasher=hasher)
+        add_counts(chapters=len(ret))
+    return ret
+
+
+def save_docs(
+    epub_docs: List[common.DocumentEpub], output_dir: Path, hasher: Optional[MinHasher] = None
+) -> List[Dict[str, Any]]:
+    """
+    Save the documents of a volume into `output_dir`, one file per chapter.
+
+    :return: see `epub_extract`
+    """
     docs = [Document.from_epub(doc) for doc in epub_docs]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ret = []
     for idx, doc in enumerate(docs):
         filename = f"{idx}"
         filename += f"__{doc.chapter_id}" if doc.chapter_id else ""
@@ -64,20 +162,191 @@ def epub_extract(input_filepath: Path, output_dir: Path, threshold=0.05, min_kee
         filename += ".stage1"
         filename = sanitize_filename(filename)
         doc.save(output_dir / filename)
+        ret.append({"file": filename, "title": doc.title, "chapter_id": doc.chapter_id, "sentences": len(doc)})
+        if hasher is not None:
+            ret[-1]["digest"] = hasher.digest(str(doc))
+            ret[-1]["signature"] = hasher.signature(str(doc))
+    return ret
+
+
+def _read_docs(input_filepath: Path, engine: str) -> List[common.DocumentEpub]:
+    from . import epub
+
+    with profile_stage("extract", item=input_filepath):
+        ret = epub.read_docs_from_epub(input_filepath, engine=engine)
+        add_counts(chapters=len(ret))
+    return ret
+
+
+def _try_call(func: Callable, *args) -> Tuple[Any, Optional[str]]:
+    """
+    Runs in the worker processes, so errors are returned instead of raised, and do not stop the batch.
+
+    :return: (result or None, error message or None)
+    """
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def map_volumes(func: Callable, jobs: List[Tuple], num_workers=1) -> List[Tuple[Any, Optional[str]]]:
+    """
+    Call `func(*job)` for each job, over a process pool if `num_workers` > 1.
+
+    :return: `_try_call` results, in the order of jobs
+    """
+    ret = [None] * len(jobs)
+    if num_workers <= 1 or len(jobs) <= 1:
+        for idx, job in enumerate(tqdm(jobs)):
+            ret[idx] = _try_call(func, *job)
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = {executor.submit(worker_function(_try_call), func, *job): idx for idx, job in enumerate(jobs)}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                ret[futures[future]] = worker_result(future.result())
+    return ret
+
+
+def dedup_documents(records: List[Dict[str, Any]], index: MinHashIndex, threshold=0.8, skip=False) -> int:
+    """
+    Match the extracted chapters against the index in input order, and add the non-duplicate ones to it.
+    Duplicates are annotated with `duplicate_of`. Every chapter is annotated with the `similarity` of its best match.
+
+    :param records: records of the volumes, whose documents carry digests and signatures
+    :param index: MinHash index of the chapters extracted so far
+    :param threshold: minimum estimated Jaccard similarity of duplicates
+    :param skip: if True, the output files of duplicates are removed
+    :return: number of duplicates
+    """
+    ret = 0
+    for record in records:
+        if record["status"] != "ok":
+            continue
+        # the chapters of a volume extracted again replace the previous ones
+        volume_key = str(Path(record["input"]).resolve())
+        index.remove_prefix(f"{volume_key}/")
+        for doc in record["documents"]:
+            signature = doc.pop("signature")
+            match, similarity = index.query(signature, doc["digest"])
+            doc["similarity"] = similarity
+            if match is not None and similarity >= threshold:
+                doc["duplicate_of"] = match
+                ret += 1
+                if skip:
+                    (Path(record["output"]) / doc["file"]).unlink()
+                    doc["skipped"] = True
+            else:
+                index.add(f"{volume_key}/{doc['file']}", signature, doc["digest"])
+    return ret
+
+
+def expand_input_paths(inputs: List[str], suffix: str) -> List[Path]:
+    """
+    Expand glob patterns and directories (non-recursively, by `suffix`) into a sorted list of files.
+    """
+    ret = []
+    for input_path in inputs:
+        for path in sorted(glob(input_path)) or [input_path]:
+            path = Path(path)
+            if path.is_dir():
+                ret.extend(sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() == suffix))
+            else:
+                ret.append(path)
+    return ret
+
+
+def volume_output_dirs(input_paths: List[Path], output_dir: Path) -> List[Path]:
+    """
+    One subdirectory per volume, named after the input file. Only a single volume is extracted in place.
+    """
+    if len(input_paths) == 1:
+        return [output_dir]
+    ret = []
+    used = set()
+    for path in input_paths:
+        base_name = name = sanitize_filename(path.stem) or "volume"
+        suffix = 1
+        while name in used:
+            name = f"{base_name}__{suffix}"
+            suffix += 1
+        used.add(name)
+        ret.append(output_dir / name)
+    return ret
 
 
 def main(args):
-    input_path = Path(args.input)
-    assert input_path.exists(), f"Input file does not exist: {input_path}"
+    input_paths = expand_input_paths(args.input, suffix=f".{args.type}")
+    assert len(input_paths) > 0, f"No input file found: {args.input}"
+    for path in input_paths:
+        assert path.exists(), f"Input file does not exist: {path}"
     output_path = Path(args.output)
     assert not output_path.exists() or output_path.is_dir(), f"Output path is not a directory: {output_path}"
     output_path.mkdir(parents=True, exist_ok=True)
-    if args.type == "epub":
-        epub_extract(
-            input_path,
-            output_path,
-            threshold=args.threshold,
-            min_keep_len=args.min_keep_len,
+    if args.type != "epub":
+        raise NotImplementedError(f"{args.type} is not supported.")
+
+    dedup_index = None
+    if args.dedup_index is not None:
+        dedup_index_path = Path(args.dedup_index)
+        dedup_index = MinHashIndex.load(dedup_index_path) if dedup_index_path.exists() else MinHashIndex()
+    hasher = dedup_index.hasher if dedup_index is not None else None
+
+    output_dirs = volume_output_dirs(input_paths, output_path)
+    if args.threshold_scope == "volume":
+        results = map_volumes(
+            epub_extract,
+            [
+                (input_filepath, output_dir, args.threshold, args.min_keep_len, args.engine, hasher)
+                for input_filepath, output_dir in zip(input_paths, output_dirs)
+            ],
+            num_workers=args.jobs,
         )
     else:
-        raise NotImplementedError(f"{args.type} is not supported.")
+        # the threshold is over all volumes, so every volume is read before any of them is filtered and saved
+        results = map_volumes(_read_docs, [(input_filepath, args.engine) for input_filepath in input_paths], args.jobs)
+        read_idxs = [idx for idx, (_, error) in enumerate(results) if error is None]
+        kept_docs = [results[idx][0] for idx in read_idxs]
+        # nothing to filter if no volume could be read, or none has a chapter
+        if any(len(docs) > 0 for docs in kept_docs):
+            kept_docs = common.filter_corpus_by_threshold(kept_docs, args.threshold, args.min_keep_len, scope="global")
+        saved = map_volumes(
+            save_docs, [(docs, output_dirs[idx], hasher) for idx, docs in zip(read_idxs, kept_docs)], args.jobs
+        )
+        for idx, result in zip(read_idxs, saved):
+            results[idx] = result
+
+    records = []
+    for input_filepath, output_dir, (documents, error) in zip(input_paths, output_dirs, results):
+        record = {"input": str(input_filepath), "output": str(output_dir), "status": "ok"}
+        if error is None:
+            record["documents"] = documents
+        else:
+            record["status"] = "error"
+            record["error"] = error
+        records.append(record)
+
+    failed = [record for record in records if record["status"] != "ok"]
+    for record in failed:
+        logging.error(f"Failed to extract {record['input']}: {record['error']}")
+    if dedup_index is not None:
+        num_duplicates = dedup_documents(
+            records, dedup_index, threshold=args.dedup_threshold, skip=args.dedup_action == "skip"
+        )
+        dedup_index.save(dedup_index_path)
+        logging.info(f"Found {num_duplicates} duplicate chapters, {len(dedup_index)} chapters indexed.")
+    manifest = {
+        "type": args.type,
+        "engine": args.engine,
+        "threshold": args.threshold,
+        "min_keep_len": args.min_keep_len,
+        "threshold_scope": args.threshold_scope,
+        "dedup_threshold": args.dedup_threshold if dedup_index is not None else None,
+        "volumes": records,
+    }
+    with (output_path / MANIFEST_FILENAME).open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    logging.info(f"Extracted {len(records) - len(failed)}/{len(records)} volumes into {output_path}.")
+    if len(failed) > 0:
+        # after the manifest, so that the volumes that were extracted can still be used
+        sys.exit(f"Failed to extract {len(failed)}/{len(records)} volumes, see {output_path / MANIFEST_FILENAME}.")
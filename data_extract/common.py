@@ -1,6 +1,8 @@
 from typing import *
 
-__all__ = ["DocumentEpub", "filter_docs_by_threshold"]
+import numpy as np
+
+__all__ = ["DocumentEpub", "filter_docs_by_threshold", "filter_corpus_by_threshold"]
 
 
 class DocumentEpub:
@@ -35,15 +37,59 @@ def filter_docs_by_threshold(
     :param min_keep_len: if the length of a document is greater than this value, it will be kept.
     :return:
     """
+    return filter_corpus_by_threshold([docs], threshold, min_keep_len)[0]
+
+
+def filter_corpus_by_threshold(
+    volumes: List[List[DocumentEpub]],
+    threshold: float = 0.05,
+    min_keep_len: int = 1000,
+    scope: str = "volume",
+) -> List[List[DocumentEpub]]:
+    """
+    Filter the documents of many volumes by the ratio of length, like `filter_docs_by_threshold`.
+
+    The shortest documents are dropped as long as their total length stays below `threshold` of the total length,
+    and none of them is longer than `min_keep_len`. This is computed with running sums over the documents
+    sorted by length, in O(n log n) for the whole corpus.
+
+    :param volumes: documents of each volume
+    :param threshold: the percentage of documents that are dropped.
+    :param min_keep_len: if the length of a document is greater than this value, it will be kept.
+    :param scope: `volume` applies the threshold to each volume separately, `global` to the whole corpus.
+    :return: kept documents of each volume, in their original order
+    """
     assert 0.0 <= threshold <= 1.0
-    assert len(docs) > 0
-    asc_docs = sorted(docs, key=lambda doc: len(doc))
-    all_len = sum(len(doc) for doc in docs)
-    filtered_docs = []
-    for doc in asc_docs:
-        if len(doc) > min_keep_len:
-            break
-        filtered_docs_len = sum(len(doc) for doc in filtered_docs)
-        if (filtered_docs_len + len(doc)) / all_len < threshold:
-            filtered_docs.append(doc)
-    return [doc for doc in docs if doc not in filtered_docs]
+    assert scope in ("volume", "global"), f"Unknown scope: {scope}"
+    if scope == "volume":
+        assert all(len(docs) > 0 for docs in volumes)
+    else:
+        assert any(len(docs) > 0 for docs in volumes)
+    counts = np.array([len(docs) for docs in volumes], dtype=np.int64)
+    lens = np.fromiter((len(doc) for docs in volumes for doc in docs), dtype=np.int64, count=int(counts.sum()))
+    if scope == "volume":
+        groups = np.repeat(np.arange(len(volumes)), counts)
+    else:
+        groups = np.zeros(len(lens), dtype=np.int64)
+    # stable sort by (group, length)
+    order = np.lexsort((lens, groups))
+    sorted_lens = lens[order]
+    sorted_groups = groups[order]
+    # running sums restart at each group
+    running_lens = np.cumsum(sorted_lens)
+    group_starts = np.searchsorted(sorted_groups, sorted_groups, side="left")
+    running_lens -= np.where(group_starts > 0, running_lens[group_starts - 1], 0)
+    group_lens = np.zeros(groups.max() + 1 if len(groups) > 0 else 0, dtype=np.int64)
+    np.add.at(group_lens, groups, lens)
+    # both conditions only hold for a prefix of each group, since lengths are ascending
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dropped_sorted = (sorted_lens <= min_keep_len) & (running_lens / group_lens[sorted_groups] < threshold)
+    dropped = np.empty_like(dropped_sorted)
+    dropped[order] = dropped_sorted
+    # select by position, not by comparing documents
+    ret = []
+    offset = 0
+    for docs in volumes:
+        ret.append([doc for doc, drop in zip(docs, dropped[offset : offset + len(docs)].tolist()) if not drop])
+        offset += len(docs)
+    return ret
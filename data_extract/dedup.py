@@ -0,0 +1,153 @@
+import os
+import hashlib
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["MinHasher", "MinHashIndex"]
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHasher:
+    """
+    MinHash signatures of texts, over their character shingles.
+    Picklable, so that signatures can be computed in worker processes.
+    """
+
+    # shingles hashed against all permutations at once
+    __CHUNK_SIZE__ = 8192
+
+    def __init__(self, num_perm=128, shingle_size=5, seed=1):
+        assert num_perm > 0 and shingle_size > 0
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        # a * h + b stays below 2**64 with 32-bit h
+        self._a = rng.randint(1, 1 << 31, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+
+    @staticmethod
+    def digest(text: str) -> str:
+        """
+        Digest of the text, for exact duplicates.
+        """
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """
+        Distinct 32-bit hashes of the character shingles of the text.
+        """
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if len(codes) < self.shingle_size:
+            codes = np.concatenate([codes, np.zeros(self.shingle_size - len(codes), dtype=np.uint64)])
+        windows = np.lib.stride_tricks.sliding_window_view(codes, self.shingle_size)
+        # polynomial rolling hash, wrapping around 2**64
+        powers = np.uint64(1000003) ** np.arange(self.shingle_size - 1, -1, -1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            hashes = (windows * powers).sum(axis=1, dtype=np.uint64)
+        return np.unique((hashes ^ (hashes >> np.uint64(32))) & _MAX_HASH)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        MinHash signature of the text, of shape (num_perm,) and dtype uint32.
+        """
+        hashes = self.shingle_hashes(text)
+        ret = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), self.__CHUNK_SIZE__):
+            chunk = hashes[None, start : start + self.__CHUNK_SIZE__]
+            permuted = ((self._a * chunk + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+            ret = np.minimum(ret, permuted.min(axis=1))
+        return ret.astype(np.uint32)
+
+
+class MinHashIndex:
+    """
+    Persistent MinHash/LSH index of documents, to find exact and near duplicates.
+
+    Signatures are split into `bands` bands. Documents sharing any band are candidates,
+    and the candidates are ranked by their estimated Jaccard similarity.
+    """
+
+    def __init__(self, hasher: Optional[MinHasher] = None, bands=32):
+        self.hasher = hasher or MinHasher()
+        assert self.hasher.num_perm % bands == 0, "num_perm must be divisible by bands"
+        self.bands = bands
+        self.keys: List[str] = []
+        self.digests: List[str] = []
+        self.signatures: List[np.ndarray] = []
+        self._digest_index: Dict[str, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._removed: Set[int] = set()
+
+    def __len__(self):
+        return len(self.keys) - len(self._removed)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in signature.reshape(self.bands, -1)]
+
+    def add(self, key: str, signature: np.ndarray, digest: str) -> None:
+        idx = len(self.keys)
+        self.keys.append(key)
+        self.digests.append(digest)
+        self.signatures.append(signature)
+        self._digest_index.setdefault(digest, idx)
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(idx)
+
+    def remove_prefix(self, prefix: str) -> int:
+        """
+        Remove documents whose key starts with `prefix`, e.g. before a volume is extracted again.
+
+        :return: number of removed documents
+        """
+        removed = {idx for idx, key in enumerate(self.keys) if key.startswith(prefix)} - self._removed
+        self._removed |= removed
+        for digest, idx in list(self._digest_index.items()):
+            if idx in removed:
+                del self._digest_index[digest]
+        return len(removed)
+
+    def query(self, signature: np.ndarray, digest: str) -> Tuple[Optional[str], float]:
+        """
+        Find the most similar document in the index.
+
+        :return: (key of the most similar document or None, estimated Jaccard similarity)
+        """
+        idx = self._digest_index.get(digest)
+        if idx is not None:
+            return self.keys[idx], 1.0
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        candidates = sorted(candidates - self._removed)
+        if len(candidates) == 0:
+            return None, 0.0
+        similarities = (np.stack([self.signatures[idx] for idx in candidates]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        return self.keys[candidates[best]], float(similarities[best])
+
+    def save(self, file_path: Union[str, bytes, os.PathLike]) -> None:
+        alive = [idx for idx in range(len(self.keys)) if idx not in self._removed]
+        with Path(file_path).open("wb") as f:
+            np.savez_compressed(
+                f,
+                keys=np.array([self.keys[idx] for idx in alive], dtype=str),
+                digests=np.array([self.digests[idx] for idx in alive], dtype=str),
+                signatures=np.array([self.signatures[idx] for idx in alive], dtype=np.uint32).reshape(
+                    len(alive), self.hasher.num_perm
+                ),
+                params=np.array([self.hasher.num_perm, self.hasher.shingle_size, self.hasher.seed, self.bands]),
+            )
+
+    @classmethod
+    def load(cls, file_path: Union[str, bytes, os.PathLike]) -> "MinHashIndex":
+        with np.load(Path(file_path)) as data:
+            num_perm, shingle_size, seed, bands = (int(x) for x in data["params"])
+            ret = cls(MinHasher(num_perm=num_perm, shingle_size=shingle_size, seed=seed), bands=bands)
+            for key, digest, signature in zip(data["keys"], data["digests"], data["signatures"]):
+                ret.add(str(key), signature, str(digest))
+        return ret
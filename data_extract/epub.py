@@ -1,27 +1,50 @@
 import os
 import re
+import codecs
 import unicodedata
 from typing import *
 from pathlib import Path
+from urllib.parse import unquote, urldefrag
 
 import ebooklib
 from bs4 import BeautifulSoup
+from lxml import etree
 from ebooklib import epub
 
 from .common import DocumentEpub
 
-__all__ = ["read_docs_from_epub"]
+__all__ = ["ENGINES", "read_docs_from_epub"]
 
+# `bs4`: BeautifulSoup tree + `get_text()`, and a scan of the top-level toc for every chapter.
+# `lxml`: toc index built once (nested sections included) + streaming text extraction,
+#         which keeps paragraph/`<br>` boundaries and skips ruby readings.
+ENGINES = ["bs4", "lxml"]
 
-def read_docs_from_epub(file_path: Union[str, bytes, os.PathLike]) -> List[DocumentEpub]:
+# elements whose boundaries are line breaks in the extracted text
+_BLOCK_TAGS = frozenset(
+    "address article aside blockquote br dd div dl dt figcaption figure footer h1 h2 h3 h4 h5 h6 header hr li nav "
+    "ol p pre section table td th tr ul".split()
+)
+# elements whose text is dropped, including ruby readings
+_SKIP_TAGS = frozenset(["head", "noscript", "rp", "rt", "script", "style", "template", "title"])
+
+
+def read_docs_from_epub(file_path: Union[str, bytes, os.PathLike], engine: str = "bs4") -> List[DocumentEpub]:
     """
     Read epub file and return a list of documents. Each document corresponds to a chapter.
 
     :param file_path: path to epub file
+    :param engine: parsing engine, one of `ENGINES`
     :return:
     """
+    if engine == "bs4":
+        docs = _read_epub_to_text(file_path)
+    elif engine == "lxml":
+        docs = _read_epub_to_text_fast(file_path)
+    else:
+        raise NotImplementedError(f"Engine {engine} is not supported.")
     ret = []
-    for doc in _read_epub_to_text(file_path):
+    for doc in docs:
         ret.append(
             DocumentEpub(
                 text=doc["text"],
@@ -68,6 +91,108 @@ def _read_epub_to_text(file_path: Union[str, bytes, os.PathLike]) -> List[Dict[s
     return ret
 
 
+def _read_epub_to_text_fast(file_path: Union[str, bytes, os.PathLike]) -> List[Dict[str, Any]]:
+    """
+    Same as `_read_epub_to_text`, but looks titles up in a toc index and extracts the text in a streaming way.
+
+    :param file_path: path to epub file
+    :return: see `_read_epub_to_text`
+    """
+    ebook = epub.read_epub(file_path)
+    toc_index = _build_toc_index(ebook.toc)
+    ret = []
+    for uid, _ in ebook.spine:
+        uid: str
+        doc: epub.EpubItem = ebook.get_item_with_id(uid)
+        if doc is None or doc.get_type() != ebooklib.ITEM_DOCUMENT:
+            continue
+        file_stem = Path(doc.get_name()).stem
+        title = _normalize_epub_text(toc_index.get(file_stem))
+        ret.append(
+            {
+                "title": title if len(title) > 0 else None,
+                "file_stem": file_stem if file_stem is not None and len(file_stem) > 0 else None,
+                "text": _normalize_epub_text(_extract_html_text(doc.get_content())),
+            }
+        )
+    return ret
+
+
+def _build_toc_index(toc: Iterable[Any]) -> Dict[str, str]:
+    """
+    Map the file stem of each toc entry to its title. Nested sections are walked in document order,
+    and the first entry of a file wins.
+
+    :param toc: `ebook.toc`, whose entries are `epub.Link`, `epub.Section` or `(section, children)` tuples
+    :return:
+    """
+    ret = {}
+    stack = list(reversed(list(toc)))
+    while len(stack) > 0:
+        entry = stack.pop()
+        if isinstance(entry, (tuple, list)):
+            section, children = entry
+            stack.extend(reversed(list(children)))
+            entry = section
+        href = getattr(entry, "href", None)
+        if not href:
+            continue
+        file_stem = Path(unquote(urldefrag(href)[0])).stem
+        if file_stem and file_stem not in ret:
+            ret[file_stem] = entry.title
+    return ret
+
+
+class _TextCollector:
+    """
+    Target of the lxml parser, which collects the text in a streaming way.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.skip_depth = 0
+
+    def start(self, tag, attrib):
+        tag = _local_name(tag)
+        if tag in _SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def end(self, tag):
+        tag = _local_name(tag)
+        if tag in _SKIP_TAGS:
+            self.skip_depth -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def data(self, data):
+        if self.skip_depth == 0:
+            self.parts.append(data)
+
+    def close(self) -> str:
+        return "".join(self.parts)
+
+
+def _local_name(tag: str) -> str:
+    # drop `{namespace}` and `prefix:`
+    return tag.rsplit("}", 1)[-1].rsplit(":", 1)[-1].lower()
+
+
+def _extract_html_text(content: bytes) -> str:
+    """
+    Extract the text of a (X)HTML document, with block elements and `<br>` as line breaks.
+
+    :param content: raw content of the document
+    :return:
+    """
+    encoding = "utf-16" if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) else "utf-8"
+    parser = etree.HTMLParser(target=_TextCollector(), encoding=encoding, remove_comments=True, remove_pis=True)
+    parser.feed(content)
+    # whitespace around line breaks only comes from the markup layout
+    return re.sub(r"\s*\n\s*", "\n", parser.close())
+
+
 def _normalize_epub_text(text: Optional[str]) -> str:
     """
     Normalize epub text.
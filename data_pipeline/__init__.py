@@ -0,0 +1,3 @@
+from .config import *
+from .runner import *
+from .manifest import *
@@ -0,0 +1,39 @@
+import argparse
+
+
+def register_subparser(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        metavar="FILE",
+        required=True,
+        help="Path to the JSON project config: the volumes to align, and the parameters of each stage. "
+        "Only the tasks whose inputs, parameters or code changed since the last run are rerun.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Number of worker processes of each stage. Default: `jobs` of the config.",
+    )
+    parser.add_argument(
+        "--force",
+        type=str,
+        nargs="+",
+        metavar="STAGE",
+        default=[],
+        choices=["extract", "segment", "process", "report"],
+        help="Rerun every task of these stages, even if up to date.",
+    )
+
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    from .config import load_config
+    from .runner import Pipeline
+
+    Pipeline(load_config(args.config), num_workers=args.jobs, force=args.force).run()
@@ -0,0 +1,90 @@
+import os
+import json
+from typing import *
+from pathlib import Path
+
+__all__ = ["DEFAULT_CONFIG", "load_config"]
+
+# Sections of a project config, with their defaults. Relative paths are relative to the config file.
+DEFAULT_CONFIG = {
+    # directory of all the outputs and of the manifest
+    "output": "pipeline_output",
+    # number of worker processes of each stage
+    "jobs": 1,
+    # list of dict: {"name": str (default: stem of `src`), "src": epub path, "tgt": epub path}
+    "volumes": [],
+    "extract": {"engine": "bs4", "threshold": 0.05, "min_keep_len": 1000},
+    "segment": {"engine": "rule", "cpu": False, "batch_bytes": 0},
+    "process": {
+        "max_alignment_size": 8,
+        "top_k": 5,
+        "win": 5,
+        "format": "json",
+        "score": False,
+        "cpu": False,
+        "cache_dir": None,
+        "cache_max_entries": 1_000_000,
+        "backend": "torch",
+        "model_dir": None,
+        "threads": None,
+        "batch_size": 256,
+        "max_batch_tokens": 32768,
+        "max_group_windows": 200_000,
+        "chunk_size": None,
+        "embedding_store": None,
+        "store_dtype": "float32",
+    },
+    # `min_score`, `min_len_ratio`, `drop_blank` and `max_block_size` filter the blocks, see `make_block_filter`
+    "report": {
+        "types": ["html"],
+        "src_lang": "ja",
+        "tgt_lang": "zh",
+        "min_score": None,
+        "min_len_ratio": None,
+        "drop_blank": False,
+        "max_block_size": None,
+    },
+}
+
+
+def load_config(file_path: Union[str, os.PathLike]) -> Dict[str, Any]:
+    """
+    Read a JSON project config, fill in the defaults and resolve its paths.
+    """
+    file_path = Path(file_path)
+    with file_path.open(encoding="utf-8") as f:
+        user_config = json.load(f)
+    unknown = set(user_config) - set(DEFAULT_CONFIG)
+    assert len(unknown) == 0, f"Unknown config keys: {sorted(unknown)}"
+    ret = {}
+    for key, default in DEFAULT_CONFIG.items():
+        value = user_config.get(key, default)
+        if isinstance(default, dict):
+            unknown = set(value) - set(default)
+            assert len(unknown) == 0, f"Unknown `{key}` config keys: {sorted(unknown)}"
+            value = {**default, **value}
+        ret[key] = value
+
+    base_dir = file_path.parent
+    ret["output"] = base_dir / ret["output"]
+    if ret["process"]["cache_dir"] is not None:
+        ret["process"]["cache_dir"] = base_dir / ret["process"]["cache_dir"]
+    if ret["process"]["embedding_store"] is not None:
+        ret["process"]["embedding_store"] = base_dir / ret["process"]["embedding_store"]
+    if ret["process"]["model_dir"] is not None:
+        # a string, since it is part of the signature of the alignments
+        ret["process"]["model_dir"] = str(base_dir / ret["process"]["model_dir"])
+    volumes = []
+    for volume in ret["volumes"]:
+        assert "src" in volume and "tgt" in volume, f"Volumes need both `src` and `tgt`: {volume}"
+        volumes.append(
+            {
+                "name": volume.get("name", Path(volume["src"]).stem),
+                "src": base_dir / volume["src"],
+                "tgt": base_dir / volume["tgt"],
+            }
+        )
+    names = [volume["name"] for volume in volumes]
+    assert len(names) == len(set(names)), f"Volume names must be unique: {names}"
+    ret["volumes"] = volumes
+    return ret
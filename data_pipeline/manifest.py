@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+from typing import *
+from pathlib import Path
+
+__all__ = ["Manifest", "code_version", "hash_file", "hash_json"]
+
+
+def hash_file(file_path: Union[str, os.PathLike], chunk_size=1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with Path(file_path).open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_json(obj: Any) -> str:
+    data = json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def code_version(paths: List[Union[str, os.PathLike]]) -> str:
+    """
+    Hash of the source files of the given files and package directories, so that editing the code of a stage
+    makes its outputs stale.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for path in map(Path, paths):
+        files = sorted(p for p in path.rglob("*") if p.suffix in {".py", ".html"}) if path.is_dir() else [path]
+        for file in files:
+            h.update(str(file.relative_to(path.parent)).encode("utf-8"))
+            h.update(hash_file(file).encode("utf-8"))
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Record of the tasks of the pipeline: the signature (hash of inputs, parameters and code version) each task
+    was run with, and the outputs it produced. Output paths are relative to the directory of the manifest.
+    """
+
+    def __init__(self, file_path: Union[str, os.PathLike]):
+        self.file_path = Path(file_path)
+        self.base_dir = self.file_path.parent
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        if self.file_path.exists():
+            with self.file_path.open(encoding="utf-8") as f:
+                self.tasks = json.load(f)["tasks"]
+
+    def is_up_to_date(self, key: str, signature: str) -> bool:
+        task = self.tasks.get(key)
+        return (
+            task is not None
+            and task["signature"] == signature
+            and all((self.base_dir / output).exists() for output in task["outputs"])
+        )
+
+    def outputs(self, key: str) -> List[Path]:
+        return [self.base_dir / output for output in self.tasks[key]["outputs"]]
+
+    def record(self, key: str, signature: str, outputs: List[Path]) -> None:
+        self.tasks[key] = {
+            "signature": signature,
+            "outputs": [Path(os.path.relpath(output, self.base_dir)).as_posix() for output in outputs],
+        }
+
+    def forget(self, key: str) -> None:
+        self.tasks.pop(key, None)
+
+    def save(self) -> None:
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.file_path.with_name(self.file_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"tasks": self.tasks}, f, indent=4, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.file_path)
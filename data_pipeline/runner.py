@@ -0,0 +1,314 @@
+import shutil
+import logging
+from typing import *
+from pathlib import Path
+from collections import Counter
+
+from data_profile import profile_stage
+
+from .manifest import Manifest, hash_file, hash_json, code_version
+
+__all__ = ["MANIFEST_FILENAME", "STAGES", "Pipeline"]
+
+MANIFEST_FILENAME = "pipeline_manifest.json"
+
+STAGES = ["extract", "segment", "process", "report"]
+
+SIDES = ["src", "tgt"]
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# source files each stage depends on, see `code_version`
+STAGE_CODE = {
+    "extract": ["data_extract", "data_process/defs.py"],
+    "segment": ["data_preprocess"],
+    "process": ["data_process"],
+    "report": ["data_report"],
+}
+
+# parameters of each stage that change its outputs. The others (workers, encoder batch sizes, cache) do not.
+# `batch_bytes` does, since trankit splits a packed batch of chapters as a single text.
+STAGE_PARAMS = {
+    "extract": ["engine", "threshold", "min_keep_len"],
+    "segment": ["engine", "batch_bytes"],
+    "process": ["max_alignment_size", "top_k", "win", "score", "chunk_size", "backend", "model_dir", "store_dtype"],
+    "report": ["src_lang", "tgt_lang", "min_score", "min_len_ratio", "drop_blank", "max_block_size"],
+}
+
+
+def _make_report(report_type: str, input_path: Path, output_path: Path, params: Dict[str, Any]) -> None:
+    from data_report import tmx, html
+    from data_process.scoring import make_block_filter
+
+    block_filter = make_block_filter(
+        min_score=params["min_score"],
+        min_len_ratio=params["min_len_ratio"],
+        drop_blank=params["drop_blank"],
+        max_block_size=params["max_block_size"],
+    )
+    if report_type == "html":
+        html.make_html_report(input_path, output_path, block_filter=block_filter)
+    elif report_type == "tmx":
+        tmx.make_tmx_file(
+            input_path,
+            output_path,
+            src_lang=params["src_lang"],
+            tgt_lang=params["tgt_lang"],
+            block_filter=block_filter,
+        )
+    else:
+        raise NotImplementedError(f"{report_type} is not supported.")
+
+
+class Pipeline:
+    """
+    Runs extract -> segment -> process -> report over the volumes of a project config, like a small build system.
+
+    Every task (a volume side to extract, a chapter to segment, a pair of chapters to align, a report to write)
+    has a signature: the hash of its input files, of the stage parameters that affect its outputs,
+    and of the code of the stage. A task only runs if its signature differs from the one in the manifest,
+    or if its outputs are missing. Since the signatures hash the content of the inputs, a rerun upstream task
+    whose outputs did not change does not make the downstream tasks stale.
+    """
+
+    def __init__(self, config: Dict[str, Any], num_workers: Optional[int] = None, force: Iterable[str] = ()):
+        """
+        :param config: see `load_config`
+        :param num_workers: number of worker processes. Default: `jobs` of the config.
+        :param force: stages whose tasks are rerun even if up to date
+        """
+        self.config = config
+        self.output_dir = Path(config["output"])
+        self.num_workers = num_workers or config["jobs"]
+        self.force = set(force)
+        self.manifest = Manifest(self.output_dir / MANIFEST_FILENAME)
+        self.code_versions = {
+            stage: code_version([REPO_DIR / path for path in paths]) for stage, paths in STAGE_CODE.items()
+        }
+        # keys of the tasks of the current config, and volumes with a failed task
+        self.planned: Set[str] = set()
+        self.failed_volumes: Set[str] = set()
+        self.stats = {stage: Counter() for stage in STAGES}
+
+    def signature(self, stage: str, inputs: List[Path], params: Dict[str, Any]) -> str:
+        return hash_json(
+            {
+                "inputs": [hash_file(path) for path in inputs],
+                "params": {key: params[key] for key in STAGE_PARAMS[stage]},
+                "code": self.code_versions[stage],
+            }
+        )
+
+    def is_stale(self, stage: str, key: str, signature: str) -> bool:
+        self.planned.add(key)
+        if stage not in self.force and self.manifest.is_up_to_date(key, signature):
+            self.stats[stage]["up to date"] += 1
+            return False
+        return True
+
+    def fail(self, stage: str, key: str, volume_name: str, error: str) -> None:
+        logging.error(f"{key} failed: {error}")
+        self.manifest.forget(key)
+        self.failed_volumes.add(volume_name)
+        self.stats[stage]["failed"] += 1
+
+    def done(self, stage: str, key: str, signature: str, outputs: List[Path]) -> None:
+        self.manifest.record(key, signature, outputs)
+        self.stats[stage]["run"] += 1
+
+    def run(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: number of tasks of each stage that were run, up to date or failed
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            with profile_stage("extract"):
+                chapters = self.extract()
+            with profile_stage("segment"):
+                segmented = self.segment(chapters)
+            with profile_stage("process"):
+                aligned = self.process(segmented)
+            with profile_stage("report"):
+                self.report(aligned)
+            self.prune()
+        finally:
+            self.manifest.save()
+        for stage in STAGES:
+            logging.info(f"{stage}: " + ", ".join(f"{count} {name}" for name, count in self.stats[stage].items()))
+        return {stage: dict(self.stats[stage]) for stage in STAGES}
+
+    def extract(self) -> Dict[str, Dict[str, List[Path]]]:
+        """
+        :return: {volume name: {side: chapter files}}
+        """
+        from data_extract.cli import map_volumes, epub_extract
+
+        params = self.config["extract"]
+        tasks = []
+        for volume in self.config["volumes"]:
+            for side in SIDES:
+                key = f"extract/{volume['name']}/{side}"
+                signature = self.signature("extract", [volume[side]], params)
+                if self.is_stale("extract", key, signature):
+                    tasks.append((volume["name"], key, signature, volume[side]))
+        jobs = []
+        for _, key, _, input_path in tasks:
+            output_dir = self.output_dir / key
+            # chapters may be renamed or dropped, so none of the previous ones is kept
+            shutil.rmtree(output_dir, ignore_errors=True)
+            jobs.append((input_path, output_dir, params["threshold"], params["min_keep_len"], params["engine"]))
+        for (volume_name, key, signature, _), (docs, error) in zip(
+            tasks, map_volumes(epub_extract, jobs, self.num_workers)
+        ):
+            if error is None:
+                self.done("extract", key, signature, [self.output_dir / key / doc["file"] for doc in docs])
+            else:
+                self.fail("extract", key, volume_name, error)
+
+        ret = {}
+        for volume in self.config["volumes"]:
+            keys = [f"extract/{volume['name']}/{side}" for side in SIDES]
+            if all(key in self.manifest.tasks for key in keys):
+                ret[volume["name"]] = {side: self.manifest.outputs(key) for side, key in zip(SIDES, keys)}
+        return ret
+
+    def segment(self, chapters: Dict[str, Dict[str, List[Path]]]) -> Dict[str, Dict[str, List[Path]]]:
+        """
+        :return: {volume name: {side: segmented chapter files}}
+        """
+        from data_preprocess import batch_segmentation as bs
+
+        params = self.config["segment"]
+        ret = {}
+        tasks = []
+        for volume_name, sides in chapters.items():
+            ret[volume_name] = {}
+            for side, files in sides.items():
+                ret[volume_name][side] = []
+                for file in files:
+                    key = f"segment/{volume_name}/{side}/{file.stem}.txt"
+                    signature = self.signature("segment", [file], params)
+                    if self.is_stale("segment", key, signature):
+                        tasks.append((key, signature, file))
+                    ret[volume_name][side].append(self.output_dir / key)
+        if len(tasks) > 0:
+            for key, _, _ in tasks:
+                (self.output_dir / key).parent.mkdir(parents=True, exist_ok=True)
+            bs.segment_files(
+                [(file, self.output_dir / key) for key, _, file in tasks],
+                engine=params["engine"],
+                cpu_only=params["cpu"],
+                num_workers=self.num_workers,
+                batch_size=params["batch_bytes"],
+            )
+            for key, signature, _ in tasks:
+                self.done("segment", key, signature, [self.output_dir / key])
+        return ret
+
+    def process(self, segmented: Dict[str, Dict[str, List[Path]]]) -> Dict[str, List[Path]]:
+        """
+        Align the i-th chapter of the source volume with the i-th chapter of the target volume.
+
+        :return: {volume name: text pair files}
+        """
+        from data_process import process
+        from data_process.cli import output_path, write_text_pair
+
+        params = self.config["process"]
+        ret = {}
+        tasks = []
+        for volume_name, sides in segmented.items():
+            src_files, tgt_files = sides["src"], sides["tgt"]
+            if len(src_files) != len(tgt_files):
+                self.fail(
+                    "process",
+                    f"process/{volume_name}",
+                    volume_name,
+                    f"{len(src_files)} source chapters but {len(tgt_files)} target chapters, "
+                    "tune the `extract` threshold so that the chapters match.",
+                )
+                continue
+            ret[volume_name] = []
+            for src_file, tgt_file in zip(src_files, tgt_files):
+                output = output_path(self.output_dir / "process" / volume_name, src_file, tgt_file, params["format"])
+                key = output.relative_to(self.output_dir).as_posix()
+                signature = self.signature("process", [src_file, tgt_file], params)
+                if self.is_stale("process", key, signature):
+                    tasks.append((key, signature, src_file, tgt_file))
+                ret[volume_name].append(output)
+        if len(tasks) > 0:
+            for key, _, _, _ in tasks:
+                (self.output_dir / key).parent.mkdir(parents=True, exist_ok=True)
+            multi_pairs = process.iter_text_pairs(
+                [src_file for _, _, src_file, _ in tasks],
+                [tgt_file for _, _, _, tgt_file in tasks],
+                max_alignment_size=params["max_alignment_size"],
+                top_k=params["top_k"],
+                win=params["win"],
+                cpu_only=params["cpu"],
+                cache_dir=params["cache_dir"],
+                cache_max_entries=params["cache_max_entries"],
+                backend=params["backend"],
+                model_dir=params["model_dir"],
+                num_threads=params["threads"],
+                num_workers=self.num_workers,
+                batch_size=params["batch_size"],
+                max_batch_tokens=params["max_batch_tokens"],
+                max_group_windows=params["max_group_windows"],
+                chunk_size=params["chunk_size"],
+                score=params["score"],
+                embedding_store=params["embedding_store"],
+                store_dtype=params["store_dtype"],
+            )
+            # recorded one by one, so that an interrupted run keeps the pairs aligned so far
+            for (key, signature, _, _), pair in zip(tasks, multi_pairs):
+                write_text_pair(self.output_dir / key, pair, params["format"])
+                self.done("process", key, signature, [self.output_dir / key])
+        return ret
+
+    def report(self, aligned: Dict[str, List[Path]]) -> None:
+        from data_extract.cli import map_volumes
+
+        params = self.config["report"]
+        tasks = []
+        for volume_name, files in aligned.items():
+            for file in files:
+                for report_type in params["types"]:
+                    key = f"report/{volume_name}/{file.stem}.{report_type}"
+                    signature = self.signature("report", [file], {**params, "type": report_type})
+                    if self.is_stale("report", key, signature):
+                        tasks.append((volume_name, key, signature, report_type, file))
+        jobs = []
+        for _, key, _, report_type, file in tasks:
+            (self.output_dir / key).parent.mkdir(parents=True, exist_ok=True)
+            jobs.append((report_type, file, self.output_dir / key, params))
+        for (volume_name, key, signature, _, _), (_, error) in zip(
+            tasks, map_volumes(_make_report, jobs, self.num_workers)
+        ):
+            if error is None:
+                self.done("report", key, signature, [self.output_dir / key])
+            else:
+                self.fail("report", key, volume_name, error)
+
+    def prune(self) -> None:
+        """
+        Remove the outputs of the tasks that are no longer part of the config, e.g. of a removed volume or chapter.
+        The tasks of volumes with a failure are kept, so that a transient error does not discard their outputs.
+        """
+        removed = [
+            key
+            for key in self.manifest.tasks
+            if key not in self.planned and key.split("/")[1] not in self.failed_volumes
+        ]
+        for key in removed:
+            for output in self.manifest.outputs(key):
+                if output.is_file():
+                    output.unlink()
+                # remove the directories left empty, up to the output directory
+                parent = output.parent
+                while parent != self.output_dir and parent.is_dir() and not any(parent.iterdir()):
+                    parent.rmdir()
+                    parent = parent.parent
+            self.manifest.forget(key)
+        if len(removed) > 0:
+            logging.info(f"Removed the outputs of {len(removed)} tasks that are no longer in the config.")
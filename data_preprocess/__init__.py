@@ -1 +1,13 @@
-from .sentence_segmentation import *
+import importlib
+
+# `sentence_segmentation` imports trankit (and thus torch), only load it on first access
+_SEGMENTATION_NAMES = ["get_default_pipeline", "split_sentences", "split_sentences_batch"]
+
+__all__ = _SEGMENTATION_NAMES
+
+
+def __getattr__(name):
+    if name == "sentence_segmentation" or name in _SEGMENTATION_NAMES:
+        ss = importlib.import_module(f"{__name__}.sentence_segmentation")
+        return ss if name == "sentence_segmentation" else getattr(ss, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
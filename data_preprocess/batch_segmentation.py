@@ -0,0 +1,121 @@
+import multiprocessing
+from typing import *
+from pathlib import Path
+
+from tqdm import tqdm
+
+from data_profile import add_counts, profile_stage, worker_result, worker_function
+
+__all__ = ["ENGINES", "plan_batches", "segment_texts", "segment_files"]
+
+ENGINES = ["rule", "trankit"]
+
+# engine and trankit pipeline of the current worker process, set up once by `_init_worker`
+_engine = None
+_pipeline = None
+
+
+def plan_batches(sizes: List[int], batch_size: int = 0) -> List[List[int]]:
+    """
+    Pack chapters into batches, longest chapters first, so that the workers stay balanced until the end.
+
+    :param sizes: size of each chapter
+    :param batch_size: maximum total size of a batch. A chapter larger than it, or any chapter if it is <= 0,
+        makes a batch on its own.
+    :return: indices of the chapters in each batch
+    """
+    order = sorted(range(len(sizes)), key=lambda idx: sizes[idx], reverse=True)
+    if batch_size <= 0:
+        return [[idx] for idx in order]
+    ret = []
+    current, current_size = [], 0
+    for idx in order:
+        if len(current) > 0 and current_size + sizes[idx] > batch_size:
+            ret.append(current)
+            current, current_size = [], 0
+        current.append(idx)
+        current_size += sizes[idx]
+    if len(current) > 0:
+        ret.append(current)
+    return ret
+
+
+def segment_texts(engine: str, pipeline, texts: List[str]) -> List[List[str]]:
+    """
+    Segment a batch of texts, e.g. one planned by `plan_batches`, in a single `ssplit` call for trankit.
+
+    :param engine: `rule` or `trankit`
+    :param pipeline: trankit pipeline, unused (and may be None) for `rule`
+    :return: sentences of each text
+    """
+    from . import rule_segmentation as rs
+    from . import sentence_segmentation as ss
+
+    if engine == "rule":
+        return [rs.split_sentences_rule(text) for text in texts]
+    elif len(texts) == 1:
+        return [ss.split_sentences(pipeline, texts[0])]
+    else:
+        return ss.split_sentences_batch(pipeline, texts)
+
+
+def _init_worker(engine: str, cpu_only: bool):
+    global _engine, _pipeline
+    assert engine in ENGINES, f"Engine {engine} is not supported."
+    _engine = engine
+    if engine == "trankit":
+        from . import sentence_segmentation as ss
+
+        _pipeline = ss.get_default_pipeline(cpu_only=cpu_only)
+
+
+def _segment_batch(batch: List[Tuple[Path, Path]]) -> int:
+    """
+    Segment a batch of chapters with the pipeline of the worker, and write their outputs.
+
+    :param batch: list of (input path, output path)
+    :return: number of chapters
+    """
+    # a packed batch is recorded under its first chapter
+    with profile_stage("segment", item=batch[0][0]):
+        texts = [input_path.read_text("utf-8") for input_path, _ in batch]
+        multi_sents = segment_texts(_engine, _pipeline, texts)
+        for (_, output_path), sents in zip(batch, multi_sents):
+            output_path.write_text("\n".join(sents), "utf-8")
+        add_counts(
+            chapters=len(batch),
+            characters=sum(len(text) for text in texts),
+            sentences=sum(len(sents) for sents in multi_sents),
+        )
+    return len(batch)
+
+
+def segment_files(
+    jobs: List[Tuple[Path, Path]],
+    engine="rule",
+    cpu_only=False,
+    num_workers=1,
+    batch_size=0,
+) -> None:
+    """
+    Segment chapter files into sentence files, over `num_workers` processes that each set up the engine once.
+
+    :param jobs: list of (input path, output path)
+    :param engine: `rule` for the rule-based splitter, `trankit` for the trankit pipeline
+    :param cpu_only: use CPU instead of GPU (trankit only)
+    :param num_workers: number of worker processes. If <= 1, the chapters are segmented in the current process.
+    :param batch_size: chapters are packed into `ssplit` calls of up to this many bytes. If <= 0, no packing.
+    """
+    sizes = [input_path.stat().st_size for input_path, _ in jobs]
+    batches = [[jobs[idx] for idx in batch] for batch in plan_batches(sizes, batch_size)]
+    with tqdm(total=len(jobs)) as pbar:
+        if num_workers <= 1:
+            _init_worker(engine, cpu_only)
+            for batch in batches:
+                pbar.update(_segment_batch(batch))
+        else:
+            # spawn, since torch does not survive fork well
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(num_workers, initializer=_init_worker, initargs=(engine, cpu_only)) as pool:
+                for result in pool.imap_unordered(worker_function(_segment_batch), batches):
+                    pbar.update(worker_result(result))
@@ -2,10 +2,6 @@ import argparse
 from glob import glob
 from pathlib import Path
 
-from tqdm import tqdm
-
-from . import sentence_segmentation as ss
-
 
 def register_subparser(parser: argparse.ArgumentParser):
     parser.add_argument(
@@ -33,17 +29,52 @@ def register_subparser(parser: argparse.ArgumentParser):
         required=True,
         help="Path to output file. Should be a directory.",
     )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        type=str,
+        choices=["rule", "trankit"],
+        default="rule",
+        help="Segmentation engine. `rule` is a rule-based splitter for Japanese/Chinese, which needs no model. "
+        "`trankit` uses the trankit pipeline. Default: rule.",
+    )
     parser.add_argument(
         "--cpu",
         action="store_true",
         default=False,
-        help="Use CPU instead of GPU. Default: False.",
+        help="Use CPU instead of GPU (trankit only). Default: False.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="Number of worker processes, each of which loads its own pipeline. Default: 1.",
+    )
+    parser.add_argument(
+        "--batch-bytes",
+        type=int,
+        metavar="INT",
+        default=0,
+        help="Pack small input files into trankit `ssplit` calls of up to this many bytes. "
+        "Only pack inputs of the same language. Default: 0, i.e. no packing.",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        metavar="URL",
+        default=None,
+        help="Segment with the models of a running `serve` server at this URL, e.g. http://127.0.0.1:8765, "
+        "instead of loading them. `--cpu` and `--jobs` are then the server's.",
     )
 
     parser.set_defaults(func=main)
 
 
 def main(args):
+    from . import batch_segmentation as bs
+
     # expand glob
     input_paths = []
     for input_path in args.input:
@@ -55,8 +86,15 @@ def main(args):
     assert not output_path.exists() or output_path.is_dir(), f"Output path is not a directory: {output_path}"
     output_path.mkdir(parents=True, exist_ok=True)
     if args.type == "segment":
-        pipeline = ss.get_default_pipeline(cpu_only=args.cpu)
-        for path in tqdm(input_paths):
-            output_file_path = output_path / f"{path.stem}_segmented.txt"
-            sents = ss.split_sentences(pipeline, path.read_text("utf-8"))
-            output_file_path.write_text("\n".join(sents), "utf-8")
+        jobs = [(path, output_path / f"{path.stem}_segmented.txt") for path in input_paths]
+        if args.server is not None:
+            from data_server import ServerClient
+
+            texts = [input_path.read_text("utf-8") for input_path, _ in jobs]
+            client = ServerClient(args.server)
+            for idx, sents in client.segment(texts, engine=args.engine, batch_bytes=args.batch_bytes):
+                jobs[idx][1].write_text("\n".join(sents), "utf-8")
+            return
+        bs.segment_files(
+            jobs, engine=args.engine, cpu_only=args.cpu, num_workers=args.jobs, batch_size=args.batch_bytes
+        )
@@ -0,0 +1,72 @@
+from typing import *
+
+from .sentence_segmentation import _clean_sentences
+
+__all__ = ["split_sentences_rule"]
+
+_OPENERS = frozenset("「『“‘（(《〈【〔［[｛{")
+_CLOSERS = frozenset("」』”’）)》〉】〕］]｝}")
+# always end a sentence, outside of quotes
+_TERMINATORS = frozenset("。！？!?．")
+# only end a sentence before a line end, a space or a new quote
+_ELLIPSES = frozenset("…‥")
+
+
+def split_sentences_rule(text: str) -> List[str]:
+    """
+    Split Japanese/Chinese text into sentences by punctuation rules, without any model.
+
+    * Each line is a paragraph, so sentences never cross lines.
+    * `。！？` (full-width or not) end a sentence, together with the punctuation and closing quotes right after them.
+    * Ellipses (`…`, `‥`, `...`, and `..`, i.e. `‥` after NFKC) only end a sentence before a line end, a space or an opening quote.
+    * Nothing inside quotes/brackets ends a sentence, but consecutive quotes (e.g. `「え？」「はい」`) are split.
+
+    :param text: text to be split
+    :return: same normalization as `split_sentences`
+    """
+    sents = []
+    for line in text.splitlines():
+        sents.extend(_split_line(line))
+    return _clean_sentences(sents)
+
+
+def _is_terminal(line: str, idx: int) -> bool:
+    c = line[idx]
+    return c in _TERMINATORS or c in _ELLIPSES or line.startswith("..", idx)
+
+
+def _split_line(line: str) -> List[str]:
+    ret = []
+    start = idx = depth = 0
+    while idx < len(line):
+        c = line[idx]
+        if c in _OPENERS:
+            depth += 1
+            idx += 1
+        elif c in _CLOSERS:
+            depth = max(depth - 1, 0)
+            idx += 1
+            if depth == 0:
+                # a quote followed by another quote or nothing is a sentence on its own
+                next_idx = idx
+                while next_idx < len(line) and line[next_idx].isspace():
+                    next_idx += 1
+                if next_idx == len(line) or line[next_idx] in _OPENERS:
+                    ret.append(line[start:idx])
+                    start = idx
+        elif depth == 0 and _is_terminal(line, idx):
+            end = idx
+            while end < len(line) and (_is_terminal(line, end) or line[end] == "."):
+                end += 1
+            # stray closing quotes stay with the sentence
+            while end < len(line) and line[end] in _CLOSERS:
+                end += 1
+            ellipsis_only = all(ch in _ELLIPSES or ch == "." or ch in _CLOSERS for ch in line[idx:end])
+            if not ellipsis_only or end == len(line) or line[end].isspace() or line[end] in _OPENERS:
+                ret.append(line[start:end])
+                start = end
+            idx = end
+        else:
+            idx += 1
+    ret.append(line[start:])
+    return ret
@@ -1,17 +1,22 @@
 import unicodedata
+from bisect import bisect_right
 from typing import *
 
-import torch.cuda
-from trankit import Pipeline
+if TYPE_CHECKING:
+    from trankit import Pipeline
 
-__all__ = ["get_default_pipeline", "split_sentences"]
+__all__ = ["get_default_pipeline", "split_sentences", "split_sentences_batch"]
 
 
-def get_default_pipeline(cpu_only=False) -> Pipeline:
+def get_default_pipeline(cpu_only=False) -> "Pipeline":
+    # trankit (and torch) are only needed by this engine, so they are imported here
+    import torch.cuda
+    from trankit import Pipeline
+
     return Pipeline("auto", gpu=not cpu_only and torch.cuda.is_available())
 
 
-def split_sentences(pipeline: Pipeline, text: str) -> List[str]:
+def split_sentences(pipeline: "Pipeline", text: str) -> List[str]:
     """
     Split text into sentences.
 
@@ -38,7 +43,43 @@ def split_sentences(pipeline: Pipeline, text: str) -> List[str]:
     :return:
     """
     results = pipeline.ssplit(text)
-    texts = (sentence["text"] for sentence in results["sentences"])
+    return _clean_sentences(sentence["text"] for sentence in results["sentences"])
+
+
+def split_sentences_batch(pipeline: "Pipeline", texts: List[str], separator="\n\n") -> List[List[str]]:
+    """
+    Split many texts into sentences with a single `ssplit` call over the texts joined by `separator`.
+    Sentences are mapped back to the texts by their `dspan`.
+
+    The texts should be in the same language, since the language of the pipeline is detected on the joined text.
+
+    :param pipeline: trankit pipeline
+    :param texts: texts to be split
+    :param separator: separator of the texts, a paragraph break for trankit
+    :return: sentences of each text
+    """
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + len(separator)
+    joined = separator.join(texts)
+    results = pipeline.ssplit(joined)
+    ret = [[] for _ in texts]
+    for sentence in results["sentences"]:
+        begin, end = sentence["dspan"]
+        idx = bisect_right(starts, begin) - 1
+        if end <= starts[idx] + len(texts[idx]):
+            ret[idx].append(sentence["text"])
+            continue
+        # a sentence across texts is split at their ends, each text keeps its part
+        while idx < len(texts) and starts[idx] < end:
+            ret[idx].append(joined[max(begin, starts[idx]) : min(end, starts[idx] + len(texts[idx]))])
+            idx += 1
+    return [_clean_sentences(sentences) for sentences in ret]
+
+
+def _clean_sentences(texts: Iterable[str]) -> List[str]:
     # replace some spaces with single space
     texts = (text.replace("\n", " ") for text in texts)
     texts = (text.replace("\t", " ") for text in texts)
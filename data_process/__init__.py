@@ -1,2 +1,24 @@
+import importlib
+
 from .defs import *
-from .process import *
+
+# `process` imports bertalign (and thus torch), only load it on first access
+_PROCESS_NAMES = [
+    "Alignment",
+    "generate_alignments",
+    "generate_multi_alignments",
+    "generate_text_pairs",
+    "generate_sweep_text_pairs",
+    "iter_text_pairs",
+    "iter_sweep_text_pairs",
+    "mine_text_pairs",
+]
+
+__all__ = defs.__all__ + _PROCESS_NAMES
+
+
+def __getattr__(name):
+    if name == "process" or name in _PROCESS_NAMES:
+        process = importlib.import_module(f"{__name__}.process")
+        return process if name == "process" else getattr(process, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# bertalign lives in the `aligner` submodule
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..", "aligner")))
+from bertalign import Encoder, Bertalign
+from bertalign.utils import yield_overlaps
+
+__all__ = ["Bertalign", "Encoder", "yield_overlaps"]
@@ -0,0 +1,170 @@
+"""
+Split the alignment of a very long pair of files into independent chunks, at anchors: pairs of sentences that are
+confidently translations of each other. The sentences before an anchor can then only be aligned with the sentences
+before it, on both sides.
+
+Anchors are mutual nearest neighbours of the sentence embeddings, within a band around the diagonal as in the first
+pass of bertalign, which stand out from the runner-up on both sides. The longest monotonic subsequence of them
+is kept, so that no anchor crosses another one.
+"""
+from bisect import bisect_left
+from typing import *
+
+import numpy as np
+
+__all__ = ["find_anchors", "monotonic_anchors", "plan_chunks"]
+
+Chunk = Tuple[int, int, int, int]
+
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+def find_anchors(
+    src_vecs: np.ndarray,
+    tgt_vecs: np.ndarray,
+    band: Optional[int] = None,
+    min_score=0.0,
+    min_margin=0.05,
+    block_size=1024,
+) -> np.ndarray:
+    """
+    :param src_vecs: sentence embeddings of the source, of shape (num_src, dim)
+    :param tgt_vecs: sentence embeddings of the target, of shape (num_tgt, dim)
+    :param band: number of target sentences on both sides of the diagonal that are searched.
+        Default: `max(250, 6%)` of the longest side, like the first pass of bertalign.
+    :param min_score: minimum cosine similarity of an anchor
+    :param min_margin: minimum difference between the similarity of an anchor and of the runner-up on both sides,
+        so that repeated sentences are not anchors
+    :param block_size: number of source sentences compared at once, which bounds the memory
+    :return: anchors sorted by source index, of shape (num_anchors, 2)
+    """
+    num_src, num_tgt = len(src_vecs), len(tgt_vecs)
+    if num_src == 0 or num_tgt == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    if band is None:
+        band = max(250, int(max(num_src, num_tgt) * 0.06))
+    src_vecs = _normalize(np.asarray(src_vecs, dtype=np.float32))
+    tgt_vecs = _normalize(np.asarray(tgt_vecs, dtype=np.float32))
+    centers = (np.arange(num_src) * (num_tgt / num_src)).astype(np.int64)
+    starts = np.maximum(centers - band, 0)
+    ends = np.minimum(centers + band + 1, num_tgt)
+
+    row_best = np.full(num_src, -1, dtype=np.int64)
+    row_margin = np.zeros(num_src, dtype=np.float32)
+    row_score = np.full(num_src, -np.inf, dtype=np.float32)
+    col_best = np.full(num_tgt, -1, dtype=np.int64)
+    col_score = np.full(num_tgt, -np.inf, dtype=np.float32)
+    col_second = np.full(num_tgt, -np.inf, dtype=np.float32)
+    for row_start in range(0, num_src, block_size):
+        row_end = min(row_start + block_size, num_src)
+        window_start, window_end = starts[row_start], ends[row_end - 1]
+        sims = src_vecs[row_start:row_end] @ tgt_vecs[window_start:window_end].T
+        # cells outside of the band of their row
+        cols = np.arange(window_start, window_end)
+        outside = (cols[None, :] < starts[row_start:row_end, None]) | (cols[None, :] >= ends[row_start:row_end, None])
+        sims[outside] = -np.inf
+        rows = np.arange(row_end - row_start)
+
+        best = sims.argmax(axis=1)
+        row_best[row_start:row_end] = best + window_start
+        row_score[row_start:row_end] = sims[rows, best]
+        col_arg = sims.argmax(axis=0)
+        block_col_score = sims[col_arg, np.arange(sims.shape[1])]
+        sims[rows, best] = -np.inf
+        row_margin[row_start:row_end] = row_score[row_start:row_end] - sims.max(axis=1)
+        sims[rows, best] = row_score[row_start:row_end]
+        sims[col_arg, np.arange(sims.shape[1])] = -np.inf
+        block_col_second = sims.max(axis=0)
+
+        # merge the two best rows of the block into the two best rows so far of each column
+        window = slice(window_start, window_end)
+        better = block_col_score > col_score[window]
+        col_second[window] = np.where(
+            better,
+            np.maximum(col_score[window], block_col_second),
+            np.maximum(col_second[window], block_col_score),
+        )
+        col_best[window] = np.where(better, col_arg + row_start, col_best[window])
+        col_score[window] = np.where(better, block_col_score, col_score[window])
+
+    src_idxs = np.arange(num_src)
+    mutual = col_best[row_best] == src_idxs
+    confident = (
+        (row_score >= min_score)
+        & (row_margin >= min_margin)
+        & (col_score[row_best] - col_second[row_best] >= min_margin)
+    )
+    keep = mutual & confident
+    return np.stack([src_idxs[keep], row_best[keep]], axis=1)
+
+
+def monotonic_anchors(anchors: np.ndarray) -> np.ndarray:
+    """
+    Longest subsequence of the anchors (sorted by source index) whose target indices strictly increase.
+    """
+    # patience sorting: tails[k] is the anchor ending the best subsequence of length k + 1 found so far
+    tails: List[int] = []
+    tail_values: List[int] = []
+    previous = np.full(len(anchors), -1, dtype=np.int64)
+    for idx, tgt_idx in enumerate(anchors[:, 1].tolist()):
+        pos = bisect_left(tail_values, tgt_idx)
+        if pos > 0:
+            previous[idx] = tails[pos - 1]
+        if pos == len(tails):
+            tails.append(idx)
+            tail_values.append(tgt_idx)
+        else:
+            tails[pos] = idx
+            tail_values[pos] = tgt_idx
+    ret = []
+    idx = tails[-1] if len(tails) > 0 else -1
+    while idx >= 0:
+        ret.append(idx)
+        idx = previous[idx]
+    return anchors[ret[::-1]].reshape(-1, 2)
+
+
+def plan_chunks(
+    src_vecs: np.ndarray, tgt_vecs: np.ndarray, chunk_size=2000, **kwargs
+) -> Tuple[List[Chunk], np.ndarray]:
+    """
+    Split a pair of files at anchors into chunks of at most about `chunk_size` sentences on each side.
+    A chunk may be longer if no anchor is found in it, and the last one up to a tenth longer.
+
+    :param src_vecs: see `find_anchors`
+    :param tgt_vecs: see `find_anchors`
+    :param kwargs: see `find_anchors`
+    :return: (chunks as (src start, src end, tgt start, tgt end), monotonic anchors)
+    """
+    num_src, num_tgt = len(src_vecs), len(tgt_vecs)
+    anchors = monotonic_anchors(find_anchors(src_vecs, tgt_vecs, **kwargs))
+
+    def too_far(point: Tuple[int, int]) -> bool:
+        return max(point[0] - cuts[-1][0], point[1] - cuts[-1][1]) > chunk_size
+
+    # an anchor starts a new chunk: its source and target sentences are the first ones of the chunk.
+    # Each chunk ends at the last anchor within `chunk_size` sentences of its start.
+    cuts = [(0, 0)]
+    candidate = None
+    for anchor in map(tuple, anchors.tolist()):
+        if too_far(anchor) and candidate is not None:
+            cuts.append(candidate)
+            candidate = None
+        if anchor[0] <= cuts[-1][0] or anchor[1] <= cuts[-1][1]:
+            continue
+        if not too_far(anchor):
+            candidate = anchor
+        elif candidate is None:
+            # no anchor in the last `chunk_size` sentences, the chunk is longer
+            cuts.append(anchor)
+    if too_far((num_src, num_tgt)) and candidate is not None:
+        cuts.append(candidate)
+    # the remainder after the last cut joins the previous chunk if together they are at most a tenth longer than
+    # `chunk_size`, rather than being aligned on its own, e.g. when it is a single sentence
+    if len(cuts) > 1 and max(num_src - cuts[-2][0], num_tgt - cuts[-2][1]) <= chunk_size + chunk_size // 10:
+        cuts.pop()
+    cuts.append((num_src, num_tgt))
+    chunks = [(start[0], end[0], start[1], end[1]) for start, end in zip(cuts, cuts[1:])]
+    return chunks, anchors
@@ -1,10 +1,18 @@
+import os
 import json
+import logging
 import argparse
+from typing import *
 from pathlib import Path
+from itertools import product
+from collections import Counter
 
-import numpy as np
+from .mining import INDEX_METHODS
+from .formats import FORMATS, read_blocks, write_blocks
+from .encoders import BACKENDS
 
-from . import process
+# parameters of the outputs of a directory, see `OutputParams`. A dotfile, so that `*.json` globs skip it
+PARAMS_FILENAME = ".process_params.json"
 
 
 def register_subparser(parser: argparse.ArgumentParser):
@@ -33,15 +41,16 @@ def register_subparser(parser: argparse.ArgumentParser):
         metavar="DIR",
         required=True,
         help="Path to output file. Should be a directory. "
-        "The output files will be named as source file name + '_' + target file name + '.json'.",
+        "The output files will be named as source file name + '_' + target file name + the suffix of `--format`.",
     )
     parser.add_argument(
         "-m",
         "--max-align-size",
         dest="max_align_size",
         type=int,
+        nargs="+",
         metavar="INT",
-        default=8,
+        default=[8],
         help="Maximum alignment size. Default: 8. "
         "If sentence segmentation is applied, this should be larger than default value.",
     )
@@ -49,8 +58,9 @@ def register_subparser(parser: argparse.ArgumentParser):
         "-w",
         "--windows",
         type=int,
+        nargs="+",
         metavar="INT",
-        default=5,
+        default=[5],
         help="Window size for second pass. Default: 5.",
     )
     parser.add_argument(
@@ -58,46 +68,447 @@ def register_subparser(parser: argparse.ArgumentParser):
         "--top-k",
         dest="top_k",
         type=int,
+        nargs="+",
         metavar="INT",
-        default=5,
+        default=[5],
         help="Top-k for second pass. Default: 5.",
     )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        default=False,
+        help="Align with every combination of the values given to `-m`, `-w` and `-k`, encoding each pair once. "
+        "The results of each combination are written into their own subdirectory, "
+        "along with a summary of the alignment types. Default: False.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=list(FORMATS),
+        default="json",
+        help="Format of the output files. `json` is indented JSON. `jsonl` has one alignment block per line. "
+        "`npz` stores the sentence numbers and texts in columns, and is the most compact. "
+        "`parquet` requires pyarrow. Default: json.",
+    )
+    parser.add_argument(
+        "--score",
+        action="store_true",
+        default=False,
+        help="Add confidence features to each block: `score`, the cosine similarity of the source and target "
+        "embeddings, and `len_ratio`, the ratio of the shorter side to the longer one in characters. "
+        "They are computed from the embeddings of the alignment, and can filter the reports. Default: False.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Skip the pairs of files whose output already exists, is newer than both files, and was computed with "
+        "the same parameters, as recorded for each output in `.process_params.json` of the output directory. "
+        "Default: False.",
+    )
     parser.add_argument(
         "--cpu",
         action="store_true",
         default=False,
         help="Use CPU instead of GPU. Default: False.",
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=BACKENDS,
+        default="torch",
+        help="Encoder backend. `torch` is the full-precision model. On CPU, `int8` quantizes its linear layers "
+        "with torch, `onnx` runs it with ONNX Runtime and `onnx-int8` runs a quantized ONNX graph, "
+        "which are faster with slightly different embeddings. The ONNX backends require `--model-dir` "
+        "and optimum[onnxruntime]. Default: torch.",
+    )
+    parser.add_argument(
+        "--model-dir",
+        type=str,
+        metavar="DIR",
+        default=None,
+        help="Local directory of the sentence-transformers model. ONNX graphs are exported into it on first use. "
+        "Default: LaBSE, downloaded by sentence-transformers.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Number of intra-op threads of the encoder. Default: the default of torch or ONNX Runtime.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="Number of processes of the alignment search, which run on CPU while the next pairs are encoded. "
+        "Default: 1, i.e. pairs are encoded then aligned one group after another.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        metavar="DIR",
+        default=None,
+        help="Directory of the persistent sentence embedding cache. If not specified, no cache is used.",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        metavar="INT",
+        default=1_000_000,
+        help="Maximum number of embeddings in the cache. Least recently used ones are evicted. Default: 1000000.",
+    )
+    parser.add_argument(
+        "--embedding-store",
+        type=str,
+        metavar="DIR",
+        default=None,
+        help="Directory of a memory-mapped store of the embeddings of each chapter, written by the encoding and "
+        "read without copy by the alignment workers. Pairs already in it are not encoded again. "
+        "If not specified, the embeddings are sent to the workers.",
+    )
+    parser.add_argument(
+        "--store-dtype",
+        type=str,
+        choices=["float32", "float16"],
+        default="float32",
+        help="dtype of the embeddings of a new store. float16 halves its size, with slightly different alignments. "
+        "Default: float32.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        metavar="INT",
+        default=256,
+        help="Maximum number of sentences (and overlap windows) in an encoder batch. Default: 256.",
+    )
+    parser.add_argument(
+        "--max-batch-tokens",
+        type=int,
+        metavar="INT",
+        default=32768,
+        help="Maximum number of padded tokens in an encoder batch. Lower it if the encoder runs out of memory. "
+        "Default: 32768.",
+    )
+    parser.add_argument(
+        "--max-group-windows",
+        type=int,
+        metavar="INT",
+        default=200_000,
+        help="Consecutive pairs of files are encoded together, in batches of sentences of similar length, "
+        "until they reach this number of overlap windows. Default: 200000.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Split the pairs of files with more sentences than this on one side into chunks of about this size, "
+        "at sentences that are confidently translations of each other, and align the chunks independently. "
+        "This bounds the memory and time of very long chapters. Default: no chunking.",
+    )
+    parser.add_argument(
+        "--mine",
+        action="store_true",
+        default=False,
+        help="Mine the parallel sentences of a whole volume, whose source and target files need not be split into "
+        "the same chapters or be in the same number: every source sentence is searched among the sentences of all "
+        "the target files, and the best candidates by margin are kept. "
+        "The pairs are written for each source and target file they come from, as 1-1 blocks with their "
+        "`score`, `len_ratio` and `margin`.",
+    )
+    parser.add_argument(
+        "--mine-k",
+        type=int,
+        metavar="INT",
+        default=4,
+        help="Number of nearest neighbours of each sentence when mining, which the margin is computed over. "
+        "Default: 4.",
+    )
+    parser.add_argument(
+        "--mine-index",
+        type=str,
+        choices=INDEX_METHODS,
+        default="auto",
+        help="Nearest neighbour search when mining: `exact` (brute force), `faiss` (inverted file index of "
+        "faiss-cpu), `ivf` (the same index in numpy). `auto` searches by brute force in small volumes, "
+        "with faiss if it is installed, with `ivf` otherwise. Default: auto.",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        metavar="INT",
+        default=16,
+        help="Number of clusters of the `faiss` and `ivf` indexes searched by each sentence. Higher is slower "
+        "and finds more of the exact neighbours. Default: 16.",
+    )
+    parser.add_argument(
+        "--min-margin",
+        type=float,
+        metavar="FLOAT",
+        default=1.06,
+        help="Minimum margin of the mined pairs, i.e. the ratio of their cosine similarity to the mean similarity "
+        "of both sentences to their nearest neighbours. Default: 1.06.",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        metavar="URL",
+        default=None,
+        help="Align with the encoder of a running `serve` server at this URL, e.g. http://127.0.0.1:8765, "
+        "instead of loading it. The encoder, cache and batching options are then the server's.",
+    )
 
     parser.set_defaults(func=main)
 
 
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NpEncoder, self).default(obj)
+def output_path(output_dir: Path, src_path: str, tgt_path: str, fmt="json") -> Path:
+    return output_dir / (Path(src_path).stem + "_" + Path(tgt_path).stem + FORMATS[fmt])
 
 
-def main(args):
-    pairs = process.generate_text_pairs(
+def is_up_to_date(output: Path, inputs: List[str]) -> bool:
+    """
+    Whether the output exists and is newer than all the inputs.
+    """
+    if not output.exists():
+        return False
+    mtime = output.stat().st_mtime
+    return all(Path(path).stat().st_mtime <= mtime for path in inputs)
+
+
+def write_text_pair(output: Path, pair: List[Dict[str, Any]], fmt="json") -> None:
+    """
+    Write the text pairs of a pair of files. The file is replaced atomically, so that an interrupted run
+    never leaves a truncated output behind for `--resume`.
+    """
+    tmp_path = output.with_name(output.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        write_blocks(f, pair, fmt=fmt)
+    os.replace(tmp_path, output)
+
+
+def make_output_dir(output_dir: Path) -> None:
+    assert not output_dir.exists() or output_dir.is_dir(), f"Output path is not a directory: {output_dir}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+
+def alignment_type_counts(pairs: List[List[Dict[str, Any]]]) -> Dict[str, int]:
+    """
+    Count the alignment types, e.g. `1-1` or `2-1`, over the text pairs of many files.
+    """
+    counter = Counter(f"{len(block['src_numbers'])}-{len(block['tgt_numbers'])}" for pair in pairs for block in pair)
+    return dict(counter.most_common())
+
+
+def output_params(args, config: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Parameters that change the outputs of a configuration of the grid.
+    """
+    return {
+        **config,
+        "score": args.score,
+        "chunk_size": args.chunk_size,
+        "backend": args.backend,
+        "model_dir": args.model_dir,
+        "store_dtype": args.store_dtype,
+        "server": args.server,
+    }
+
+
+def mine_params(args) -> Dict[str, Any]:
+    """
+    Parameters that change the outputs of `--mine`.
+    """
+    return {
+        "mine": True,
+        "mine_k": args.mine_k,
+        "mine_index": args.mine_index,
+        "nprobe": args.nprobe,
+        "min_margin": args.min_margin,
+        "backend": args.backend,
+        "model_dir": args.model_dir,
+    }
+
+
+class OutputParams:
+    """
+    Parameters each output of a directory was computed with, by file name, recorded in its `PARAMS_FILENAME`,
+    so that `--resume` only keeps the outputs of the current parameters.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.path = output_dir / PARAMS_FILENAME
+        self.recorded: Dict[str, Dict[str, Any]] = (
+            json.loads(self.path.read_text("utf-8")) if self.path.exists() else {}
+        )
+
+    def matches(self, output: Path, params: Dict[str, Any]) -> bool:
+        return self.recorded.get(output.name) == params
+
+    def record(self, output: Path, params: Dict[str, Any]) -> None:
+        """
+        Record the parameters of an output, after it is written: if the run is interrupted in between,
+        the output is only aligned again.
+        """
+        self.recorded[output.name] = params
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.recorded, indent=4, ensure_ascii=False), "utf-8")
+        os.replace(tmp_path, self.path)
+
+
+def write_output(
+    recorded: OutputParams, output: Path, pair: List[Dict[str, Any]], params: Dict[str, Any], fmt="json"
+) -> None:
+    write_text_pair(output, pair, fmt)
+    recorded.record(output, params)
+
+
+def select_pairs(args, output_dirs: List[Path], grid: List[Dict[str, int]]) -> Tuple[List[int], List[OutputParams]]:
+    """
+    Indices of the pairs of files to align: all of them, or with `--resume`, those with an outdated output
+    in any of the output directories. Outputs computed with other parameters are outdated, see `OutputParams`.
+
+    :param grid: configuration of each output directory
+    :return: (indices of the pairs, recorded parameters of each output directory)
+    """
+    assert len(args.source) == len(args.target), "src and tgt filepaths must have the same length"
+    multi_output_params = [OutputParams(output_dir) for output_dir in output_dirs]
+    multi_params = [output_params(args, config) for config in grid]
+    ret = []
+    for idx, (src_path, tgt_path) in enumerate(zip(args.source, args.target)):
+        outputs = [output_path(output_dir, src_path, tgt_path, args.format) for output_dir in output_dirs]
+        if args.resume and all(
+            is_up_to_date(output, [src_path, tgt_path]) and recorded.matches(output, params)
+            for output, recorded, params in zip(outputs, multi_output_params, multi_params)
+        ):
+            continue
+        ret.append(idx)
+    if args.resume:
+        logging.info(f"Resuming: {len(args.source) - len(ret)} pairs of files are up to date, {len(ret)} to align.")
+    return ret, multi_output_params
+
+
+def process_kwargs(args) -> Dict[str, Any]:
+    return {
+        "cpu_only": args.cpu,
+        "cache_dir": args.cache_dir,
+        "cache_max_entries": args.cache_max_entries,
+        "backend": args.backend,
+        "model_dir": args.model_dir,
+        "num_threads": args.threads,
+        "num_workers": args.jobs,
+        "batch_size": args.batch_size,
+        "max_batch_tokens": args.max_batch_tokens,
+        "max_group_windows": args.max_group_windows,
+        "chunk_size": args.chunk_size,
+        "score": args.score,
+        "embedding_store": args.embedding_store,
+        "store_dtype": args.store_dtype,
+    }
+
+
+def iter_sweep_text_pairs(args, src_paths: List[str], tgt_paths: List[str], grid: List[Dict[str, int]]):
+    """
+    `process.iter_sweep_text_pairs`, or its equivalent on the server of `--server`.
+    """
+    if args.server is not None:
+        from data_server import ServerClient
+
+        return ServerClient(args.server).align(src_paths, tgt_paths, grid, score=args.score, chunk_size=args.chunk_size)
+    from . import process
+
+    return process.iter_sweep_text_pairs(src_paths, tgt_paths, grid, **process_kwargs(args))
+
+
+def sweep_main(args):
+    grid = [
+        {"max_alignment_size": max_align_size, "top_k": top_k, "win": win}
+        for max_align_size, top_k, win in product(args.max_align_size, args.top_k, args.windows)
+    ]
+    output_dir = Path(args.output)
+    config_names = [f"m{config['max_alignment_size']}_k{config['top_k']}_w{config['win']}" for config in grid]
+    config_dirs = [output_dir / config_name for config_name in config_names]
+    for config_dir in config_dirs:
+        make_output_dir(config_dir)
+    selected, multi_output_params = select_pairs(args, config_dirs, grid)
+    multi_pairs = iter_sweep_text_pairs(
+        args, [args.source[idx] for idx in selected], [args.target[idx] for idx in selected], grid
+    )
+    selected_set = set(selected)
+    blocks = [0] * len(grid)
+    type_counts = [Counter() for _ in grid]
+    for idx in range(len(args.source)):
+        src_path, tgt_path = args.source[idx], args.target[idx]
+        if idx in selected_set:
+            pairs = next(multi_pairs)
+            for config_dir, config, recorded, pair in zip(config_dirs, grid, multi_output_params, pairs):
+                output = output_path(config_dir, src_path, tgt_path, args.format)
+                write_output(recorded, output, pair, output_params(args, config), args.format)
+        else:
+            # up to date, counted from its output
+            pairs = [
+                read_blocks(output_path(config_dir, src_path, tgt_path, args.format)) for config_dir in config_dirs
+            ]
+        for config_idx, pair in enumerate(pairs):
+            blocks[config_idx] += len(pair)
+            type_counts[config_idx].update(alignment_type_counts([pair]))
+    summary = [
+        {
+            "name": config_name,
+            **config,
+            "blocks": num_blocks,
+            "alignment_types": dict(counter.most_common()),
+        }
+        for config_name, config, num_blocks, counter in zip(config_names, grid, blocks, type_counts)
+    ]
+    with (output_dir / "sweep_summary.json").open("w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+
+
+def mine_main(args):
+    assert args.server is None, "--mine is not supported with --server."
+    from .process import mine_text_pairs
+
+    output_dir = Path(args.output)
+    make_output_dir(output_dir)
+    kwargs = process_kwargs(args)
+    for name in ["num_workers", "max_group_windows", "chunk_size", "score", "embedding_store", "store_dtype"]:
+        kwargs.pop(name)
+    mined = mine_text_pairs(
         args.source,
         args.target,
-        max_alignment_size=args.max_align_size,
-        top_k=args.top_k,
-        win=args.windows,
-        cpu_only=args.cpu,
+        k=args.mine_k,
+        index=args.mine_index,
+        nprobe=args.nprobe,
+        min_margin=args.min_margin,
+        **kwargs,
     )
+    recorded = OutputParams(output_dir)
+    for (src_idx, tgt_idx), pair in sorted(mined.items()):
+        output = output_path(output_dir, args.source[src_idx], args.target[tgt_idx], args.format)
+        write_output(recorded, output, pair, mine_params(args), args.format)
+    logging.info(f"Mined pairs written for {len(mined)} pairs of files.")
+
+
+def main(args):
+    if args.mine:
+        mine_main(args)
+        return
+    if args.sweep:
+        sweep_main(args)
+        return
+    for name in ["max_align_size", "top_k", "windows"]:
+        assert len(getattr(args, name)) == 1, f"Multiple values of `{name}` are only allowed with --sweep."
     output_dir = Path(args.output)
-    assert not output_dir.exists() or output_dir.is_dir(), f"Output path is not a directory: {output_dir}"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    for _src_path, _tgt_path, pair in zip(args.source, args.target, pairs):
-        src_path = Path(_src_path)
-        tgt_path = Path(_tgt_path)
-        new_output_path = output_dir / (src_path.stem + "_" + tgt_path.stem + ".json")
-        with new_output_path.open("w", encoding="utf-8") as f:
-            json.dump(pair, f, indent=4, ensure_ascii=False, cls=NpEncoder)
+    make_output_dir(output_dir)
+    grid = [{"max_alignment_size": args.max_align_size[0], "top_k": args.top_k[0], "win": args.windows[0]}]
+    selected, (recorded,) = select_pairs(args, [output_dir], grid)
+    src_paths = [args.source[idx] for idx in selected]
+    tgt_paths = [args.target[idx] for idx in selected]
+    params = output_params(args, grid[0])
+    multi_pairs = iter_sweep_text_pairs(args, src_paths, tgt_paths, grid)
+    for src_path, tgt_path, (pair,) in zip(src_paths, tgt_paths, multi_pairs):
+        write_output(recorded, output_path(output_dir, src_path, tgt_path, args.format), pair, params, args.format)
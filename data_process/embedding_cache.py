@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["EmbeddingCache"]
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of sentence embeddings, keyed by (model name, max sequence length, text).
+
+    The cache is a directory of numpy arrays:
+        * `keys.<generation>.npy`: 16-byte digests of the keys, of shape (N, 16) in uint8
+        * `vectors.<generation>.npy`: embeddings, of shape (N, dim), in `dtype`
+        * `last_used.<generation>.npy`: logical time of the last use of each entry, of shape (N,)
+        * `meta.json`: dtype, the logical clock and the current generation
+    Beyond `max_entries`, the least recently used entries are evicted when the cache is saved.
+
+    Each save writes a new generation of the arrays, then switches to it by replacing `meta.json` atomically,
+    so that an interrupted save leaves the previous generation whole, never keys of one generation with vectors
+    of another. The vectors are memory-mapped, and only the rows that are looked up are read.
+    """
+
+    __KEY_SIZE__ = 16
+
+    def __init__(self, cache_dir: Union[str, os.PathLike], max_entries=1_000_000, dtype="float32"):
+        assert max_entries > 0
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._clock = 0
+        # None for the arrays of caches saved before generations, without a suffix
+        self._generation: Optional[int] = 0
+        self._keys = np.empty((0, self.__KEY_SIZE__), dtype=np.uint8)
+        self._vectors: Optional[np.ndarray] = None
+        self._last_used = np.empty(0, dtype=np.int64)
+        # entries added since loading, merged when saving
+        self._new_keys: List[bytes] = []
+        self._new_vectors: List[np.ndarray] = []
+        self._new_last_used: List[int] = []
+        self._index: Dict[bytes, int] = {}
+        if (self.cache_dir / "meta.json").exists():
+            self._load()
+        self._clock += 1
+
+    def __len__(self):
+        return len(self._index)
+
+    @classmethod
+    def make_key(cls, model_name: str, max_seq_length: int, text: str) -> bytes:
+        return hashlib.blake2b(
+            f"{model_name}\0{max_seq_length}\0{text}".encode("utf-8"), digest_size=cls.__KEY_SIZE__
+        ).digest()
+
+    @property
+    def dim(self) -> Optional[int]:
+        if self._vectors is not None:
+            return self._vectors.shape[1]
+        if len(self._new_vectors) > 0:
+            return self._new_vectors[0].shape[0]
+        return None
+
+    def lookup(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (embeddings of the keys found, of shape (n_found, dim) in float32; bool mask of the keys found)
+        """
+        rows = np.array([self._index.get(key, -1) for key in keys], dtype=np.int64)
+        found = rows >= 0
+        self.hits += int(found.sum())
+        self.misses += len(keys) - int(found.sum())
+        ret = np.empty((int(found.sum()), self.dim or 0), dtype=np.float32)
+        for out_idx, row in enumerate(rows[found].tolist()):
+            if row < len(self._keys):
+                ret[out_idx] = self._vectors[row]
+                self._last_used[row] = self._clock
+            else:
+                ret[out_idx] = self._new_vectors[row - len(self._keys)]
+                self._new_last_used[row - len(self._keys)] = self._clock
+        return ret, found
+
+    def add(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        for key, vector in zip(keys, vectors):
+            if key in self._index:
+                continue
+            self._index[key] = len(self._keys) + len(self._new_keys)
+            self._new_keys.append(key)
+            self._new_vectors.append(np.asarray(vector, dtype=self.dtype))
+            self._new_last_used.append(self._clock)
+
+    def save(self) -> None:
+        if self.dim is None:
+            return
+        new_keys = np.frombuffer(b"".join(self._new_keys), dtype=np.uint8).reshape(-1, self.__KEY_SIZE__)
+        keys = np.concatenate([self._keys, new_keys])
+        vectors = [self._vectors] if self._vectors is not None else []
+        if len(self._new_vectors) > 0:
+            vectors.append(np.stack(self._new_vectors))
+        vectors = np.concatenate(vectors)
+        last_used = np.concatenate([self._last_used, np.array(self._new_last_used, dtype=np.int64)])
+        if len(keys) > self.max_entries:
+            # keep the most recently used entries, in their original order
+            keep = np.sort(np.argsort(-last_used, kind="stable")[: self.max_entries])
+            keys, vectors, last_used = keys[keep], vectors[keep], last_used[keep]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        generation = (self._generation or 0) + 1
+        for name, array in [("keys", keys), ("vectors", vectors), ("last_used", last_used)]:
+            np.save(self._path(name, generation), array)
+        meta = {"dtype": self.dtype.name, "clock": self._clock, "entries": len(keys), "generation": generation}
+        tmp_path = self.cache_dir / "meta.json.tmp"
+        tmp_path.write_text(json.dumps(meta), "utf-8")
+        os.replace(tmp_path, self.cache_dir / "meta.json")
+        self._generation = generation
+        self._keys, self._vectors, self._last_used = keys, vectors, last_used
+        self._new_keys, self._new_vectors, self._new_last_used = [], [], []
+        self._index = self._build_index(keys)
+        self._remove_previous_generations()
+
+    def _path(self, name: str, generation: Optional[int]) -> Path:
+        return self.cache_dir / (f"{name}.npy" if generation is None else f"{name}.{generation}.npy")
+
+    def _remove_previous_generations(self) -> None:
+        current = {self._path(name, self._generation) for name in ["keys", "vectors", "last_used"]}
+        for name in ["keys", "vectors", "last_used"]:
+            for path in [self._path(name, None)] + list(self.cache_dir.glob(f"{name}.*.npy")):
+                if path not in current and path.exists():
+                    path.unlink()
+
+    def _load(self) -> None:
+        with (self.cache_dir / "meta.json").open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        assert np.dtype(meta["dtype"]) == self.dtype, f"Cache dtype is {meta['dtype']}, not {self.dtype.name}"
+        self._clock = meta["clock"]
+        self._generation = meta.get("generation")
+        self._keys = np.load(self._path("keys", self._generation))
+        self._vectors = np.load(self._path("vectors", self._generation), mmap_mode="r")
+        self._last_used = np.load(self._path("last_used", self._generation))
+        self._index = self._build_index(self._keys)
+
+    @staticmethod
+    def _build_index(keys: np.ndarray) -> Dict[bytes, int]:
+        return {key.tobytes(): idx for idx, key in enumerate(keys)}
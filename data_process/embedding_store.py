@@ -0,0 +1,272 @@
+import os
+import json
+import hashlib
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["EmbeddingStore", "StoredEncoder"]
+
+
+class EmbeddingStore:
+    """
+    Corpus-level store of the embeddings of chapters: their sentences and overlap windows, as computed by
+    `EncodingScheduler.transform_many`, keyed by `make_key`.
+
+    The store is a directory:
+        * `vectors.<generation>.bin`: embeddings of all the entries, as a raw (rows, dim) matrix in `dtype`
+        * `lengths.<generation>.bin`: byte lengths of the sentences and windows, as raw (rows,) int32
+        * `index.json`: dtype, dim, generation, number of rows, and each entry: key -> [first row, sentences, overlaps]
+    An entry of n sentences with k overlaps spans k * n rows, which are read as a (k, n, dim) view of the memory map,
+    without copy.
+
+    A single process appends to the store, while any number of processes read it: rows are written before the index
+    that refers to them is replaced atomically, and compacting writes a new generation of the files. Readers map the
+    files when they load the index, and the files of previous generations are only deleted when a writer opens the
+    store again. A store sent to another process (e.g. to a worker of a process pool) is only its path, and is opened
+    read-only there, once per process: later tasks reuse the same reader, which only loads the index again when
+    an entry they need was added since.
+    """
+
+    # compacting on `close` when more than this share of the rows is not referred to anymore
+    __MAX_DEAD_RATIO__ = 0.5
+
+    def __init__(self, store_dir: Union[str, os.PathLike], dtype="float32", readonly=False):
+        """
+        :param dtype: `float32`, or `float16` to halve the size of the store. Ignored if the store exists.
+        :param readonly: open an existing store, without writing to it
+        """
+        self.store_dir = Path(store_dir)
+        self.readonly = readonly
+        self.dtype = np.dtype(dtype)
+        assert self.dtype in [np.float16, np.float32], f"Unsupported dtype: {self.dtype}"
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self.generation = 0
+        self._entries: Dict[str, Tuple[int, int, int]] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._lengths: Optional[np.ndarray] = None
+        # whether rows were added (or entries removed) since the index was written
+        self._dirty = False
+        # whether rows past `rows`, from an interrupted writer, were truncated
+        self._truncated = False
+        if (self.store_dir / "index.json").exists():
+            self._load_index()
+            if not readonly:
+                self._remove_previous_generations()
+        else:
+            assert not readonly, f"No embedding store in {self.store_dir}"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    def __reduce__(self):
+        # the pool may pickle a store after more entries were added, the receiver reads the flushed index,
+        # which has the entries that were flushed before the store was sent
+        return _open_reader, (self.store_dir,)
+
+    @staticmethod
+    def make_key(model_name: str, sents: List[str]) -> str:
+        return hashlib.blake2b("\0".join([model_name] + sents).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _path(self, name: str, generation: Optional[int] = None) -> Path:
+        return self.store_dir / f"{name}.{self.generation if generation is None else generation}.bin"
+
+    def _load_index(self) -> None:
+        index = json.loads((self.store_dir / "index.json").read_text("utf-8"))
+        self.dtype = np.dtype(index["dtype"])
+        self.dim = index["dim"]
+        self.rows = index["rows"]
+        self.generation = index["generation"]
+        self._entries = {key: tuple(entry) for key, entry in index["entries"].items()}
+        self._vectors = self._lengths = None
+        if self.readonly and self.rows > 0:
+            # mapped now, so that a writer compacting the store later does not pull the files from under the reader
+            self._maps()
+
+    def _remove_previous_generations(self) -> None:
+        for path in list(self.store_dir.glob("vectors.*.bin")) + list(self.store_dir.glob("lengths.*.bin")):
+            if path.name.split(".")[1] != str(self.generation):
+                path.unlink()
+
+    def refresh(self) -> None:
+        """
+        Load the latest index, to read the entries added by the writer since the store was opened.
+        """
+        if (self.store_dir / "index.json").exists():
+            self._load_index()
+
+    def flush(self) -> None:
+        """
+        Write the index, so that other processes see the entries added so far.
+        """
+        if not self._dirty:
+            return
+        index = {
+            "dtype": self.dtype.name,
+            "dim": self.dim,
+            "rows": self.rows,
+            "generation": self.generation,
+            "entries": self._entries,
+        }
+        tmp_path = self.store_dir / "index.json.tmp"
+        tmp_path.write_text(json.dumps(index), "utf-8")
+        os.replace(tmp_path, self.store_dir / "index.json")
+        self._dirty = False
+
+    def _maps(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._vectors is None or len(self._vectors) < self.rows:
+            self._vectors = np.memmap(self._path("vectors"), dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+            self._lengths = np.memmap(self._path("lengths"), dtype=np.int32, mode="r", shape=(self.rows,))
+        return self._vectors, self._lengths
+
+    def add(self, key: str, sent_vecs: np.ndarray, len_vecs: np.ndarray) -> None:
+        """
+        Append an entry, which replaces the one with the same key, if any. See `flush`.
+
+        :param sent_vecs: embeddings of shape (overlaps, sentences, dim)
+        :param len_vecs: byte lengths of shape (overlaps, sentences)
+        """
+        assert not self.readonly, "The store is read-only."
+        num_overlaps, num_sents, dim = sent_vecs.shape
+        if self.dim is None:
+            self.dim = dim
+        assert dim == self.dim, f"Embeddings of dim {dim} added to a store of dim {self.dim}"
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        if not self._truncated:
+            for name, row_size in [("vectors", self.dim * self.dtype.itemsize), ("lengths", 4)]:
+                with self._path(name).open("ab") as f:
+                    f.truncate(self.rows * row_size)
+            self._truncated = True
+        with self._path("vectors").open("ab") as f:
+            f.write(np.ascontiguousarray(sent_vecs.reshape(-1, dim), dtype=self.dtype).tobytes())
+        with self._path("lengths").open("ab") as f:
+            f.write(np.ascontiguousarray(len_vecs.reshape(-1), dtype=np.int32).tobytes())
+        self._entries[key] = (self.rows, num_sents, num_overlaps)
+        self.rows += num_overlaps * num_sents
+        self._dirty = True
+
+    def _entry(self, key: str, num_overlaps=0) -> Optional[Tuple[int, int, int]]:
+        entry = self._entries.get(key)
+        if self.readonly and (entry is None or entry[2] < num_overlaps):
+            # the writer may have added (or replaced) the entry since the index was loaded
+            self.refresh()
+            entry = self._entries.get(key)
+        return entry
+
+    def overlaps(self, key: str) -> int:
+        """
+        :return: number of overlaps of the entry, 0 if there is none
+        """
+        return self._entries[key][2] if key in self._entries else 0
+
+    def get(self, key: str, num_overlaps=0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param num_overlaps: number of overlaps needed. A reader whose entry has fewer loads the index again.
+        :return: (embeddings of shape (overlaps, sentences, dim), byte lengths of shape (overlaps, sentences)),
+            read-only views of the memory maps
+        """
+        entry = self._entry(key, num_overlaps)
+        if entry is None:
+            raise KeyError(key)
+        first, num_sents, num_overlaps = entry
+        if num_sents == 0:
+            return np.empty((num_overlaps, 0, self.dim or 0), dtype=self.dtype), np.empty((num_overlaps, 0), np.int32)
+        vectors, lengths = self._maps()
+        last = first + num_overlaps * num_sents
+        return vectors[first:last].reshape(num_overlaps, num_sents, self.dim), lengths[first:last].reshape(
+            num_overlaps, num_sents
+        )
+
+    def remove(self, key: str) -> None:
+        assert not self.readonly, "The store is read-only."
+        del self._entries[key]
+        self._dirty = True
+
+    @property
+    def live_rows(self) -> int:
+        return sum(num_sents * num_overlaps for _, num_sents, num_overlaps in self._entries.values())
+
+    def compact(self) -> None:
+        """
+        Rewrite the rows of the current entries into a new generation of the files, without the rows of
+        the replaced and removed entries. The files of the previous generation are left to its readers,
+        and deleted by the next writer.
+        """
+        assert not self.readonly, "The store is read-only."
+        generation = self.generation + 1
+        entries = {}
+        rows = 0
+        with self._path("vectors", generation).open("wb") as vectors_f, self._path("lengths", generation).open(
+            "wb"
+        ) as lengths_f:
+            for key in self._entries:
+                sent_vecs, len_vecs = self.get(key)
+                vectors_f.write(np.ascontiguousarray(sent_vecs).tobytes())
+                lengths_f.write(np.ascontiguousarray(len_vecs).tobytes())
+                entries[key] = (rows, *self._entries[key][1:])
+                rows += sent_vecs.shape[0] * sent_vecs.shape[1]
+        self.generation, self.rows, self._entries = generation, rows, entries
+        self._vectors = self._lengths = None
+        self._dirty = True
+        self.flush()
+
+    def close(self) -> None:
+        """
+        Flush the index, and compact the store if most of its rows are not referred to anymore.
+        """
+        if self.readonly:
+            return
+        self.flush()
+        if self.rows > 0 and 1 - self.live_rows / self.rows > self.__MAX_DEAD_RATIO__:
+            self.compact()
+
+
+# readers opened in this process, by store directory, see `EmbeddingStore.__reduce__`
+_READERS: Dict[Path, EmbeddingStore] = {}
+
+
+def _open_reader(store_dir: Path) -> EmbeddingStore:
+    if store_dir not in _READERS:
+        _READERS[store_dir] = EmbeddingStore(store_dir, readonly=True)
+    return _READERS[store_dir]
+
+
+class StoredEncoder:
+    """
+    Serves the embeddings of an `EmbeddingStore` like a `PrecomputedEncoder`, e.g. to bertalign. It is sent to
+    worker processes as the path of the store, whose entries they read from the memory map.
+    """
+
+    def __init__(self, store: EmbeddingStore, model_name: str):
+        """
+        :param model_name: identifies the encoder, so that the embeddings of different encoders have different keys
+        """
+        self.store = store
+        self.model_name = model_name
+
+    def key(self, sents: List[str]) -> str:
+        return self.store.make_key(self.model_name, sents)
+
+    def has(self, sents: List[str], num_overlaps: int) -> bool:
+        return self.store.overlaps(self.key(sents)) >= num_overlaps
+
+    def add(self, sents: List[str], sent_vecs: np.ndarray, len_vecs: np.ndarray) -> None:
+        self.store.add(self.key(sents), sent_vecs, len_vecs)
+
+    def get(self, sents: List[str], num_overlaps=0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (sent_vecs, len_vecs) with all the overlaps that were stored. float16 embeddings are
+            converted to float32, which copies them.
+        """
+        sent_vecs, len_vecs = self.store.get(self.key(sents), num_overlaps)
+        return sent_vecs.astype(np.float32, copy=False), len_vecs
+
+    def transform(self, sents: List[str], num_overlaps: int) -> Tuple[np.ndarray, np.ndarray]:
+        sent_vecs, len_vecs = self.get(sents, num_overlaps)
+        assert len(sent_vecs) >= num_overlaps, f"{len(sent_vecs)} overlaps were stored, {num_overlaps} requested"
+        return sent_vecs[:num_overlaps], len_vecs[:num_overlaps]
@@ -0,0 +1,123 @@
+"""
+Encoder backends, for machines without GPU:
+    * `torch`: the full-precision sentence-transformers model, as bertalign does
+    * `int8`: the same model, with its linear layers dynamically quantized to int8 by torch
+    * `onnx`: the model exported to an ONNX graph, run by ONNX Runtime
+    * `onnx-int8`: the ONNX graph, dynamically quantized to int8
+
+The quantized backends give slightly different embeddings, so they have their own keys in the embedding cache.
+Nothing heavy is imported until an encoder is loaded, so that `BACKENDS` is cheap to import.
+"""
+import os
+import logging
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["BACKENDS", "BackendEncoder", "export_onnx_model", "load_backend_encoder"]
+
+BACKENDS = ["torch", "int8", "onnx", "onnx-int8"]
+
+# default model of bertalign
+DEFAULT_MODEL = "sentence-transformers/LaBSE"
+
+# quantization config of `onnx-int8`: AVX2 runs on any recent x86 CPU, unlike AVX512 VNNI
+ONNX_QUANTIZATION = "avx2"
+
+
+class BackendEncoder:
+    """
+    Same as the bertalign `Encoder`, around a sentence-transformers model loaded by `load_backend_encoder`.
+    """
+
+    def __init__(self, model, model_name: str):
+        self.model = model
+        self.model_name = model_name
+
+    def transform(self, sents: List[str], num_overlaps: int) -> Tuple[np.ndarray, np.ndarray]:
+        from .backend import yield_overlaps
+
+        overlaps = list(yield_overlaps(sents, num_overlaps))
+        sent_vecs = self.model.encode(overlaps).reshape(num_overlaps, len(sents), -1)
+        len_vecs = np.array([len(line.encode("utf-8")) for line in overlaps]).reshape(num_overlaps, len(sents))
+        return sent_vecs, len_vecs
+
+
+def _onnx_file(quantize: bool) -> str:
+    return f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx" if quantize else "onnx/model.onnx"
+
+
+def export_onnx_model(model_dir: Union[str, os.PathLike], quantize=False) -> str:
+    """
+    Export the sentence-transformers model of a local directory to ONNX, into its `onnx` subdirectory.
+    Requires `optimum[onnxruntime]`.
+
+    :param quantize: also export the graph dynamically quantized to int8
+    :return: path of the graph, relative to the model directory
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = Path(model_dir)
+    if not (model_dir / _onnx_file(False)).exists():
+        logging.info(f"Exporting {model_dir} to ONNX...")
+        model = SentenceTransformer(str(model_dir), device="cpu", backend="onnx")
+        model.save_pretrained(str(model_dir))
+    if quantize and not (model_dir / _onnx_file(True)).exists():
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        logging.info(f"Quantizing the ONNX graph of {model_dir}...")
+        model = SentenceTransformer(str(model_dir), device="cpu", backend="onnx")
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, str(model_dir))
+    return _onnx_file(quantize)
+
+
+def load_backend_encoder(
+    backend="torch",
+    model_dir: Optional[Union[str, os.PathLike]] = None,
+    cpu_only=False,
+    num_threads: Optional[int] = None,
+) -> Union["Encoder", BackendEncoder]:
+    """
+    :param backend: one of `BACKENDS`. Backends other than `torch` run on CPU.
+    :param model_dir: local directory of the sentence-transformers model. Default: LaBSE, downloaded by
+        sentence-transformers. Required by the ONNX backends, whose graphs are exported into it on first use.
+    :param cpu_only: use CPU instead of GPU (`torch` only)
+    :param num_threads: number of intra-op threads of torch and ONNX Runtime. Default: their own defaults.
+    """
+    assert backend in BACKENDS, f"Encoder backend {backend} is not supported."
+    if backend.startswith("onnx"):
+        assert model_dir is not None, f"Encoder backend {backend} requires a local model directory."
+    if num_threads is not None:
+        import torch
+
+        torch.set_num_threads(num_threads)
+    if backend == "torch" and model_dir is None:
+        from .backend import Encoder
+
+        return Encoder(cpu_only=cpu_only)
+
+    from sentence_transformers import SentenceTransformer
+
+    model_path = str(model_dir) if model_dir is not None else DEFAULT_MODEL
+    model_name = Path(model_path).name
+    if backend == "torch":
+        return BackendEncoder(SentenceTransformer(model_path, device="cpu" if cpu_only else None), model_name)
+    if backend == "int8":
+        import torch
+
+        model = SentenceTransformer(model_path, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return BackendEncoder(model, f"{model_name}/int8")
+
+    model_kwargs = {
+        "provider": "CPUExecutionProvider",
+        "file_name": export_onnx_model(model_dir, backend == "onnx-int8"),
+    }
+    if num_threads is not None:
+        import onnxruntime
+
+        model_kwargs["session_options"] = onnxruntime.SessionOptions()
+        model_kwargs["session_options"].intra_op_num_threads = num_threads
+    model = SentenceTransformer(model_path, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    return BackendEncoder(model, f"{model_name}/{backend}")
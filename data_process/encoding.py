@@ -0,0 +1,210 @@
+import logging
+from typing import *
+
+import numpy as np
+
+from data_profile import add_counts, profile_stage
+
+from .backend import Encoder, yield_overlaps
+from .embedding_cache import EmbeddingCache
+
+__all__ = ["CachedEncoder", "EncodingScheduler", "PrecomputedEncoder", "bucketed_encode", "encode_distinct"]
+
+
+class CachedEncoder:
+    """
+    Drop-in replacement of the bertalign `Encoder`, which looks the sentences and overlap windows up
+    in an `EmbeddingCache` before encoding them with the model.
+    """
+
+    def __init__(self, encoder: Encoder, cache: EmbeddingCache, model_name: Optional[str] = None):
+        self.encoder = encoder
+        self.cache = cache
+        # LaBSE is the default model of bertalign
+        self.model_name = model_name or getattr(encoder, "model_name", "LaBSE")
+
+    @property
+    def model(self):
+        return self.encoder.model
+
+    def encode(self, texts: List[str], encode_fn: Optional[Callable[[List[str]], np.ndarray]] = None) -> np.ndarray:
+        """
+        :param texts: texts to encode
+        :param encode_fn: encodes the texts missing from the cache. Default: `model.encode`.
+        :return: embeddings of the texts, of shape (len(texts), dim)
+        """
+        keys = [EmbeddingCache.make_key(self.model_name, self.model.max_seq_length, text) for text in texts]
+        cached, found = self.cache.lookup(keys)
+        missing = np.flatnonzero(~found)
+        if len(missing) == 0:
+            return cached
+        encoded = (encode_fn or self.model.encode)([texts[idx] for idx in missing])
+        self.cache.add([keys[idx] for idx in missing], encoded)
+        ret = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        if len(cached) > 0:
+            ret[found] = cached
+        ret[missing] = encoded
+        return ret
+
+    def transform(self, sents: List[str], num_overlaps: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Same as `Encoder.transform`, encoding each distinct overlap window once.
+
+        :return: (embeddings of shape (num_overlaps, len(sents), dim), byte lengths of shape (num_overlaps, len(sents)))
+        """
+        overlaps = list(yield_overlaps(sents, num_overlaps))
+        sent_vecs = encode_distinct(self.encode, overlaps)[0].reshape(num_overlaps, len(sents), -1)
+        len_vecs = np.array([len(line.encode("utf-8")) for line in overlaps]).reshape(num_overlaps, len(sents))
+        return sent_vecs, len_vecs
+
+
+class PrecomputedEncoder:
+    """
+    Encoder for bertalign that serves embeddings computed beforehand, e.g. to align them with many parameters.
+    """
+
+    def __init__(self):
+        self._embeddings: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def add(self, sents: List[str], sent_vecs: np.ndarray, len_vecs: np.ndarray) -> None:
+        """
+        :param sents: sentences
+        :param sent_vecs: see `CachedEncoder.transform`
+        :param len_vecs: see `CachedEncoder.transform`
+        """
+        self._embeddings[tuple(sents)] = (sent_vecs, len_vecs)
+
+    def get(self, sents: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (sent_vecs, len_vecs) with all the overlaps that were computed
+        """
+        return self._embeddings[tuple(sents)]
+
+    def transform(self, sents: List[str], num_overlaps: int) -> Tuple[np.ndarray, np.ndarray]:
+        sent_vecs, len_vecs = self.get(sents)
+        assert num_overlaps <= len(sent_vecs), f"Only {len(sent_vecs)} overlaps were computed, not {num_overlaps}"
+        # windows of fewer sentences are a prefix of the overlaps
+        return sent_vecs[:num_overlaps], len_vecs[:num_overlaps]
+
+
+def encode_distinct(encode: Callable[[List[str]], np.ndarray], texts: List[str]) -> Tuple[np.ndarray, int]:
+    """
+    Encode each distinct text once, and scatter its embedding back to all of its occurrences.
+    Light novels repeat many lines, e.g. `「……」` or `「はい」`, and so do the overlap windows made of them.
+
+    :param encode: encodes a list of texts
+    :return: (embeddings of the texts, of shape (len(texts), dim), number of distinct texts)
+    """
+    positions: Dict[str, int] = {}
+    inverse = np.fromiter(
+        (positions.setdefault(text, len(positions)) for text in texts), dtype=np.int64, count=len(texts)
+    )
+    if len(positions) == len(texts):
+        return encode(texts), len(texts)
+    return encode(list(positions))[inverse], len(positions)
+
+
+def _token_lengths(model, texts: List[str]) -> List[int]:
+    """
+    Number of tokens of each text for the model, or number of characters if the model has no tokenizer.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return [min(len(text), model.max_seq_length) for text in texts]
+    input_ids = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=model.max_seq_length)
+    return [len(ids) for ids in input_ids["input_ids"]]
+
+
+def bucketed_encode(model, texts: List[str], batch_size=256, max_batch_tokens=32768) -> np.ndarray:
+    """
+    Encode the texts in buckets of similar token length, so that batches are full and barely padded.
+
+    :param model: sentence-transformers model
+    :param texts: texts to encode
+    :param batch_size: maximum number of texts in a bucket
+    :param max_batch_tokens: maximum number of (padded) tokens in a bucket, i.e. the memory budget of a batch
+    :return: embeddings of the texts, of shape (len(texts), dim)
+    """
+    if len(texts) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    lengths = _token_lengths(model, texts)
+    order = sorted(range(len(texts)), key=lambda idx: lengths[idx], reverse=True)
+    buckets = []
+    bucket = []
+    for idx in order:
+        # the first text of a bucket is the longest one, and sets its padded length
+        if len(bucket) > 0 and (len(bucket) >= batch_size or (len(bucket) + 1) * lengths[bucket[0]] > max_batch_tokens):
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(idx)
+    buckets.append(bucket)
+    ret = None
+    for bucket in buckets:
+        vecs = model.encode([texts[idx] for idx in bucket], batch_size=len(bucket))
+        if ret is None:
+            ret = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+        ret[bucket] = vecs
+    return ret
+
+
+class EncodingScheduler:
+    """
+    Encode the sentences and overlap windows of many chapters together, in length-sorted buckets,
+    then scatter the embeddings back to each chapter.
+    """
+
+    def __init__(self, encoder: Union[Encoder, CachedEncoder], batch_size=256, max_batch_tokens=32768, dedup=True):
+        """
+        :param encoder: encoder, whose cache (if any) is looked up before encoding
+        :param batch_size: see `bucketed_encode`
+        :param max_batch_tokens: see `bucketed_encode`
+        :param dedup: encode each distinct sentence or overlap window of a `transform_many` call once,
+            see `encode_distinct`
+        """
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.dedup = dedup
+
+    def _encode_uncached(self, texts: List[str]) -> np.ndarray:
+        add_counts(encoded=len(texts))
+        return bucketed_encode(
+            self.encoder.model, texts, batch_size=self.batch_size, max_batch_tokens=self.max_batch_tokens
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if isinstance(self.encoder, CachedEncoder):
+            return self.encoder.encode(texts, encode_fn=self._encode_uncached)
+        return self._encode_uncached(texts)
+
+    def transform_many(self, multi_sents: List[List[str]], num_overlaps: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Same as `CachedEncoder.transform` for each list of sentences, but encoded together.
+
+        :return: (sent_vecs, len_vecs) of each list of sentences
+        """
+        with profile_stage("encode"):
+            multi_overlaps = [list(yield_overlaps(sents, num_overlaps)) for sents in multi_sents]
+            texts = [text for overlaps in multi_overlaps for text in overlaps]
+            if self.dedup:
+                vecs, num_distinct = encode_distinct(self.encode, texts)
+                if len(texts) > 0:
+                    logging.info(
+                        f"Encoding {num_distinct} distinct of {len(texts)} sentences and windows "
+                        f"({1 - num_distinct / len(texts):.1%} duplicates)."
+                    )
+                add_counts(distinct=num_distinct)
+            else:
+                vecs = self.encode(texts)
+            ret = []
+            offset = 0
+            for sents, overlaps in zip(multi_sents, multi_overlaps):
+                sent_vecs = vecs[offset : offset + len(overlaps)].reshape(num_overlaps, len(sents), -1)
+                len_vecs = np.array([len(line.encode("utf-8")) for line in overlaps]).reshape(num_overlaps, len(sents))
+                ret.append((sent_vecs, len_vecs))
+                offset += len(overlaps)
+            add_counts(
+                sentences=sum(len(sents) for sents in multi_sents),
+                windows=sum(len(overlaps) for overlaps in multi_overlaps),
+            )
+        return ret
@@ -0,0 +1,158 @@
+"""
+Output formats of the text pairs of a pair of files, i.e. a list of blocks:
+{"src_numbers": [int], "tgt_numbers": [int], "src_texts": [str], "tgt_texts": [str]},
+and optionally numeric features of the block, such as the scores of `data_process.scoring`.
+
+* `json`: a JSON list of blocks, indented. The historical format.
+* `jsonl`: one compact JSON block per line.
+* `npz`: columnar. For each side, the sentence numbers of all blocks concatenated, the offsets of each block in them,
+  and the texts of the sentences concatenated (UTF-8) with their character offsets. Features are `block_<name>` columns.
+* `parquet`: one row per block, with list columns. Requires pyarrow.
+"""
+import os
+import json
+from typing import *
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["FORMATS", "NpEncoder", "format_of", "iter_blocks", "read_blocks", "write_blocks"]
+
+# format -> file suffix
+FORMATS = {"json": ".json", "jsonl": ".jsonl", "npz": ".npz", "parquet": ".parquet"}
+
+SIDES = ["src", "tgt"]
+
+BLOCK_KEYS = [f"{side}_{name}" for name in ["numbers", "texts"] for side in SIDES]
+
+
+class NpEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super(NpEncoder, self).default(obj)
+
+
+def format_of(file_path: Union[str, os.PathLike]) -> str:
+    suffix = Path(file_path).suffix.lower()
+    for fmt, fmt_suffix in FORMATS.items():
+        if suffix == fmt_suffix:
+            return fmt
+    raise ValueError(f"Unknown text pair format: {file_path}")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The parquet format requires pyarrow: `pip install pyarrow`.") from e
+    return pyarrow
+
+
+def _to_columns(blocks: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    ret = {}
+    for side in SIDES:
+        numbers = [number for block in blocks for number in block[f"{side}_numbers"]]
+        texts = [text for block in blocks for text in block[f"{side}_texts"]]
+        ret[f"{side}_numbers"] = np.array(numbers, dtype=np.int32)
+        ret[f"{side}_offsets"] = np.cumsum([0] + [len(block[f"{side}_numbers"]) for block in blocks], dtype=np.int64)
+        ret[f"{side}_text"] = np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8)
+        ret[f"{side}_text_offsets"] = np.cumsum([0] + [len(text) for text in texts], dtype=np.int64)
+    for key in _feature_keys(blocks):
+        ret[f"block_{key}"] = np.array([block[key] for block in blocks], dtype=np.float64)
+    return ret
+
+
+def _feature_keys(blocks: List[Dict[str, Any]]) -> List[str]:
+    return [key for key in blocks[0] if key not in BLOCK_KEYS] if len(blocks) > 0 else []
+
+
+def write_blocks(f: BinaryIO, blocks: List[Dict[str, Any]], fmt="json") -> None:
+    """
+    :param f: binary file to write into
+    :param blocks: text pairs of a pair of files
+    :param fmt: one of `FORMATS`
+    """
+    if fmt == "json":
+        f.write(json.dumps(blocks, indent=4, ensure_ascii=False, cls=NpEncoder).encode("utf-8"))
+    elif fmt == "jsonl":
+        for block in blocks:
+            f.write(json.dumps(block, ensure_ascii=False, separators=(",", ":"), cls=NpEncoder).encode("utf-8"))
+            f.write(b"\n")
+    elif fmt == "npz":
+        np.savez(f, **_to_columns(blocks))
+    elif fmt == "parquet":
+        pa = _import_pyarrow()
+        columns = {key: [block[key] for block in blocks] for key in BLOCK_KEYS + _feature_keys(blocks)}
+        pa.parquet.write_table(pa.Table.from_pydict(columns), f)
+    else:
+        raise ValueError(f"Unknown text pair format: {fmt}")
+
+
+def _iter_npz_blocks(file_path: Path) -> Iterator[Dict[str, Any]]:
+    with np.load(file_path) as data:
+        columns = {key: data[key] for key in data.files}
+    numbers, texts, offsets = {}, {}, {}
+    for side in SIDES:
+        text = columns[f"{side}_text"].tobytes().decode("utf-8")
+        text_offsets = columns[f"{side}_text_offsets"].tolist()
+        texts[side] = [text[start:end] for start, end in zip(text_offsets[:-1], text_offsets[1:])]
+        numbers[side] = columns[f"{side}_numbers"].tolist()
+        offsets[side] = columns[f"{side}_offsets"].tolist()
+    features = {key[len("block_") :]: columns[key].tolist() for key in columns if key.startswith("block_")}
+    src_offsets, tgt_offsets = offsets["src"], offsets["tgt"]
+    for idx, (src_start, src_end, tgt_start, tgt_end) in enumerate(
+        zip(src_offsets, src_offsets[1:], tgt_offsets, tgt_offsets[1:])
+    ):
+        block = {
+            "src_numbers": numbers["src"][src_start:src_end],
+            "tgt_numbers": numbers["tgt"][tgt_start:tgt_end],
+            "src_texts": texts["src"][src_start:src_end],
+            "tgt_texts": texts["tgt"][tgt_start:tgt_end],
+        }
+        for key, values in features.items():
+            block[key] = values[idx]
+        yield block
+
+
+def iter_blocks(
+    file_path: Union[str, os.PathLike],
+    batch_size=4096,
+    block_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Read the blocks of a text pair file of any format, detected by its suffix. `jsonl` and `parquet` files are
+    streamed. `json` files, which cannot be, are read at once.
+
+    :param batch_size: number of rows read at once from parquet files
+    :param block_filter: if specified, only the blocks for which it returns True are read,
+        see `data_process.scoring.make_block_filter`
+    """
+    if block_filter is not None:
+        yield from filter(block_filter, iter_blocks(file_path, batch_size=batch_size))
+        return
+    file_path = Path(file_path)
+    fmt = format_of(file_path)
+    if fmt == "json":
+        with file_path.open(encoding="utf-8") as f:
+            yield from json.load(f)
+    elif fmt == "jsonl":
+        with file_path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip() != "":
+                    yield json.loads(line)
+    elif fmt == "npz":
+        yield from _iter_npz_blocks(file_path)
+    else:
+        pa = _import_pyarrow()
+        for batch in pa.parquet.ParquetFile(file_path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+
+
+def read_blocks(file_path: Union[str, os.PathLike]) -> List[Dict[str, Any]]:
+    return list(iter_blocks(file_path))
@@ -0,0 +1,260 @@
+"""
+Parallel sentence mining over whole volumes, for chapters that are not split the same way in both languages.
+Every source sentence is searched among all the target sentences, and the candidates are scored with the ratio
+margin of Artetxe and Schwenk (2019): their cosine similarity divided by the mean similarity of both sentences to
+their k nearest neighbours, so that sentences similar to everything, e.g. `「はい」`, do not win.
+
+The nearest neighbours are searched with a FAISS inverted file index if faiss is installed, with the same kind of
+index in numpy otherwise, or by brute force, which is exact and the reference of the others.
+"""
+import logging
+from typing import *
+
+import numpy as np
+
+__all__ = ["INDEX_METHODS", "ExactIndex", "FaissIndex", "IVFIndex", "build_index", "mine", "select_pairs"]
+
+INDEX_METHODS = ["auto", "faiss", "ivf", "exact"]
+
+# below this number of keys, `auto` searches by brute force, which is exact and fast enough
+EXACT_MAX_KEYS = 20_000
+
+
+def normalize(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vecs, dtype=np.float32)
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+def _top_k(sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param sims: values, overwritten
+    :return: (k largest values of each row, their columns), by decreasing value
+    """
+    k = min(k, sims.shape[1])
+    if k > 16:
+        cols = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        vals = np.take_along_axis(sims, cols, axis=1)
+        order = np.argsort(-vals, axis=1, kind="stable")
+        return np.take_along_axis(vals, order, axis=1), np.take_along_axis(cols, order, axis=1)
+    # for the few neighbours of mining, k passes of argmax are faster than a partition of the rows
+    rows = np.arange(len(sims))
+    vals = np.empty((len(sims), k), dtype=sims.dtype)
+    cols = np.empty((len(sims), k), dtype=np.int64)
+    for col in range(k):
+        cols[:, col] = sims.argmax(axis=1)
+        vals[:, col] = sims[rows, cols[:, col]]
+        sims[rows, cols[:, col]] = -np.inf
+    return vals, cols
+
+
+def _empty_results(num_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return np.full((num_queries, k), -np.inf, dtype=np.float32), np.full((num_queries, k), -1, dtype=np.int64)
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search, the reference of the approximate indexes.
+    """
+
+    def __init__(self, keys: np.ndarray, max_block_sims=1 << 25):
+        """
+        :param keys: normalized embeddings, of shape (num_keys, dim)
+        :param max_block_sims: queries are compared with the keys in blocks of about this many similarities,
+            which bounds the memory
+        """
+        self.keys = keys
+        self.block_size = max(1, max_block_sims // max(len(keys), 1))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param queries: normalized embeddings, of shape (num_queries, dim)
+        :return: (similarities, indices of the keys), of shape (num_queries, k), by decreasing similarity.
+            Missing neighbours have an index of -1.
+        """
+        sims_ret, idxs_ret = _empty_results(len(queries), k)
+        if len(self.keys) == 0:
+            return sims_ret, idxs_ret
+        for start in range(0, len(queries), self.block_size):
+            sims, idxs = _top_k(queries[start : start + self.block_size] @ self.keys.T, k)
+            sims_ret[start : start + len(sims), : sims.shape[1]] = sims
+            idxs_ret[start : start + len(idxs), : idxs.shape[1]] = idxs
+        return sims_ret, idxs_ret
+
+
+class IVFIndex:
+    """
+    Inverted file index in numpy, as `faiss.IndexIVFFlat`: the keys are clustered by spherical k-means,
+    and a query is only compared with the keys of its `nprobe` nearest clusters.
+    """
+
+    def __init__(self, keys: np.ndarray, nlist: Optional[int] = None, nprobe=16, iterations=10, seed=0):
+        """
+        :param keys: see `ExactIndex`
+        :param nlist: number of clusters. Default: about `sqrt(num_keys)`.
+        :param nprobe: number of clusters searched by each query
+        :param iterations: number of k-means iterations
+        """
+        self.keys = keys
+        self.nlist = max(1, min(nlist or int(np.sqrt(len(keys))), len(keys)))
+        self.nprobe = min(nprobe, self.nlist)
+        rng = np.random.default_rng(seed)
+        # trained on a sample, like faiss
+        sample = keys[rng.choice(len(keys), min(len(keys), 64 * self.nlist), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assign = self._nearest_centroids(sample, 1)[:, 0]
+            order = np.argsort(assign, kind="stable")
+            # empty clusters keep their centroid
+            filled, starts = np.unique(assign[order], return_index=True)
+            self.centroids[filled] = normalize(np.add.reduceat(sample[order], starts, axis=0))
+        assign = self._nearest_centroids(keys, 1)[:, 0]
+        order = np.argsort(assign, kind="stable")
+        self.lists = np.split(order, np.cumsum(np.bincount(assign, minlength=self.nlist))[:-1])
+
+    def _nearest_centroids(self, vecs: np.ndarray, n: int, block_size=8192) -> np.ndarray:
+        return np.concatenate(
+            [
+                _top_k(vecs[start : start + block_size] @ self.centroids.T, n)[1]
+                for start in range(0, len(vecs), block_size)
+            ]
+        ).reshape(-1, n)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        See `ExactIndex.search`.
+        """
+        sims_ret, idxs_ret = _empty_results(len(queries), k)
+        if len(queries) == 0 or len(self.keys) == 0:
+            return sims_ret, idxs_ret
+        probes = self._nearest_centroids(queries, self.nprobe)
+        # queries probing each cluster
+        order = np.argsort(probes.ravel(), kind="stable")
+        probing = np.split(order // self.nprobe, np.cumsum(np.bincount(probes.ravel(), minlength=self.nlist))[:-1])
+        for key_idxs, query_idxs in zip(self.lists, probing):
+            if len(key_idxs) == 0 or len(query_idxs) == 0:
+                continue
+            sims, cols = _top_k(queries[query_idxs] @ self.keys[key_idxs].T, k)
+            # merge with the best neighbours found in the clusters searched so far
+            merged_sims, merged_cols = _top_k(np.concatenate([sims_ret[query_idxs], sims], axis=1), k)
+            merged_idxs = np.concatenate([idxs_ret[query_idxs], key_idxs[cols]], axis=1)
+            sims_ret[query_idxs] = merged_sims
+            merged_idxs = np.take_along_axis(merged_idxs, merged_cols, axis=1)
+            idxs_ret[query_idxs] = np.where(np.isfinite(merged_sims), merged_idxs, -1)
+        return sims_ret, idxs_ret
+
+
+class FaissIndex:
+    """
+    `faiss.IndexIVFFlat` over the inner product, i.e. the cosine similarity of normalized embeddings.
+    """
+
+    def __init__(self, keys: np.ndarray, nlist: Optional[int] = None, nprobe=16):
+        """
+        See `IVFIndex`.
+        """
+        import faiss
+
+        self.nlist = max(1, min(nlist or int(np.sqrt(len(keys))), len(keys)))
+        quantizer = faiss.IndexFlatIP(keys.shape[1])
+        self.index = faiss.IndexIVFFlat(quantizer, keys.shape[1], self.nlist, faiss.METRIC_INNER_PRODUCT)
+        keys = np.ascontiguousarray(keys, dtype=np.float32)
+        self.index.train(keys)
+        self.index.add(keys)
+        self.index.nprobe = min(nprobe, self.nlist)
+        # the quantizer is referenced by the index, but not owned by it
+        self.quantizer = quantizer
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        See `ExactIndex.search`.
+        """
+        sims, idxs = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        sims[idxs < 0] = -np.inf
+        return sims, idxs.astype(np.int64)
+
+
+def build_index(
+    keys: np.ndarray, method="auto", nlist: Optional[int] = None, nprobe=16
+) -> Union[ExactIndex, IVFIndex, FaissIndex]:
+    """
+    :param keys: see `ExactIndex`
+    :param method: one of `INDEX_METHODS`. `auto` searches by brute force below `EXACT_MAX_KEYS` keys,
+        and with faiss if it is installed, with `IVFIndex` otherwise.
+    :param nlist: see `IVFIndex`
+    :param nprobe: see `IVFIndex`
+    """
+    assert method in INDEX_METHODS, f"Index method {method} is not supported."
+    if method == "auto":
+        if len(keys) <= EXACT_MAX_KEYS:
+            method = "exact"
+        else:
+            try:
+                import faiss  # noqa: F401
+
+                method = "faiss"
+            except ImportError:
+                method = "ivf"
+    if method == "exact" or len(keys) == 0:
+        return ExactIndex(keys)
+    if method == "faiss":
+        return FaissIndex(keys, nlist=nlist, nprobe=nprobe)
+    return IVFIndex(keys, nlist=nlist, nprobe=nprobe)
+
+
+def mine(
+    src_vecs: np.ndarray, tgt_vecs: np.ndarray, k=4, method="auto", nlist: Optional[int] = None, nprobe=16
+) -> Dict[str, np.ndarray]:
+    """
+    Search the k nearest target sentences of every source sentence, and score them with the ratio margin.
+
+    :param src_vecs: sentence embeddings of the source, of shape (num_src, dim)
+    :param tgt_vecs: sentence embeddings of the target, of shape (num_tgt, dim)
+    :param k: number of candidates of each source sentence, and of neighbours in the margin
+    :param method: see `build_index`
+    :param nlist: see `build_index`
+    :param nprobe: see `build_index`
+    :return: {"tgt": indices of the candidates, "cosine": their similarity, "margin": their margin},
+        each of shape (num_src, k), by decreasing margin. Missing candidates have an index of -1.
+    """
+    src_vecs, tgt_vecs = normalize(src_vecs), normalize(tgt_vecs)
+    logging.info(f"Mining {len(src_vecs)} source sentences among {len(tgt_vecs)} target sentences...")
+    if len(src_vecs) == 0 or len(tgt_vecs) == 0:
+        sims, idxs = _empty_results(len(src_vecs), k)
+        return {"tgt": idxs, "cosine": sims, "margin": sims.copy()}
+    fwd_sims, fwd_idxs = build_index(tgt_vecs, method, nlist, nprobe).search(src_vecs, k)
+    bwd_sims, _ = build_index(src_vecs, method, nlist, nprobe).search(tgt_vecs, k)
+
+    def mean_valid(sims):
+        valid = np.isfinite(sims)
+        return np.where(valid, sims, 0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+
+    src_means, tgt_means = mean_valid(fwd_sims), mean_valid(bwd_sims)
+    denominators = (src_means[:, None] + tgt_means[np.maximum(fwd_idxs, 0)]) / 2
+    margins = np.where(fwd_idxs >= 0, fwd_sims / np.maximum(denominators, 1e-6), -np.inf)
+    order = np.argsort(-margins, axis=1, kind="stable")
+    return {
+        "tgt": np.take_along_axis(fwd_idxs, order, axis=1),
+        "cosine": np.take_along_axis(fwd_sims, order, axis=1),
+        "margin": np.take_along_axis(margins, order, axis=1),
+    }
+
+
+def select_pairs(candidates: Dict[str, np.ndarray], min_margin=1.06) -> np.ndarray:
+    """
+    Keep the best candidate of each source sentence if its margin is at least `min_margin`, and each target
+    sentence in only its best pair.
+
+    :param candidates: see `mine`
+    :return: pairs as (source index, target index), sorted by source index
+    """
+    src_idxs = np.arange(len(candidates["tgt"]))
+    if candidates["tgt"].shape[1] == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    tgt_idxs, margins = candidates["tgt"][:, 0], candidates["margin"][:, 0]
+    keep = (tgt_idxs >= 0) & (margins >= min_margin)
+    src_idxs, tgt_idxs, margins = src_idxs[keep], tgt_idxs[keep], margins[keep]
+    # best margin first, then the first pair of each target sentence
+    order = np.argsort(-margins, kind="stable")
+    _, first = np.unique(tgt_idxs[order], return_index=True)
+    kept = np.sort(order[first])
+    return np.stack([src_idxs[kept], tgt_idxs[kept]], axis=1)
@@ -1,13 +1,24 @@
 import io
 import os
-import sys
 import logging
+import multiprocessing
 from typing import *
 from pathlib import Path
 from contextlib import redirect_stdout
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
 
-sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..", "aligner")))
-from bertalign import Encoder, Bertalign
+import numpy as np
+
+from data_profile import add_counts, profile_stage, worker_result, worker_function
+
+from .backend import Encoder, Bertalign
+from .scoring import score_alignments
+from .chunking import plan_chunks
+from .encoders import BackendEncoder, load_backend_encoder
+from .encoding import CachedEncoder, EncodingScheduler, PrecomputedEncoder
+from .embedding_cache import EmbeddingCache
+from .embedding_store import StoredEncoder, EmbeddingStore
 
 Alignment = Dict[str, List[int]]
 
@@ -17,44 +28,438 @@ __all__ = [
     "generate_alignments",
     "generate_multi_alignments",
     "generate_text_pairs",
+    "generate_sweep_text_pairs",
+    "iter_encoded_chunks",
+    "iter_encoded_pairs",
+    "iter_grid_alignments",
+    "iter_sweep_text_pairs",
+    "iter_text_pairs",
+    "mine_text_pairs",
 ]
 
 
+def read_lines(file: Union[str, bytes, os.PathLike]) -> List[str]:
+    """
+    Read the non-empty, stripped lines of a sentence file.
+    """
+    path = Path(file)
+    assert path.exists()
+    lines = path.read_text("utf-8").splitlines()
+    lines = [line.strip() for line in lines]
+    return [line for line in lines if line != ""]
+
+
+def load_encoder(
+    cpu_only=False,
+    cache_dir: Optional[Union[str, os.PathLike]] = None,
+    cache_max_entries=1_000_000,
+    backend="torch",
+    model_dir: Optional[Union[str, os.PathLike]] = None,
+    num_threads: Optional[int] = None,
+) -> Union[Encoder, BackendEncoder, CachedEncoder]:
+    """
+    :param cache_dir: if specified, embeddings are looked up in (and added to) the embedding cache in this directory
+    :param cache_max_entries: maximum number of embeddings kept in the cache
+    :param backend: see `load_backend_encoder`
+    :param model_dir: see `load_backend_encoder`
+    :param num_threads: see `load_backend_encoder`
+    """
+    model = load_backend_encoder(backend, model_dir=model_dir, cpu_only=cpu_only, num_threads=num_threads)
+    model.model.max_seq_length = 500
+    if cache_dir is not None:
+        model = CachedEncoder(model, EmbeddingCache(cache_dir, max_entries=cache_max_entries))
+    return model
+
+
+def close_encoder(model: Union[Encoder, CachedEncoder]) -> None:
+    """
+    Save the embedding cache of the encoder, if any.
+    """
+    if isinstance(model, CachedEncoder):
+        model.cache.save()
+        logging.info(
+            f"Embedding cache: {model.cache.hits} hits, {model.cache.misses} misses, {len(model.cache)} entries."
+        )
+
+
+def _dp_cells(num_src: int, num_tgt: int, win=5) -> int:
+    """
+    Estimated number of cells of the two dynamic programming passes of bertalign: the first one runs over a band of
+    `max(250, 6%)` target sentences on both sides of the diagonal, the second one over `win` sentences on both sides
+    of the first path.
+    """
+    first_half_width = max(250, int(max(num_src, num_tgt) * 0.06))
+    rows = num_src + 1
+    return rows * min(num_tgt + 1, 2 * first_half_width + 1) + rows * min(num_tgt + 1, 2 * win + 1)
+
+
+def align_lines(
+    model: Union[Encoder, CachedEncoder, PrecomputedEncoder],
+    src_lines: List[str],
+    tgt_lines: List[str],
+    max_alignment_size=8,
+    top_k=5,
+    win=5,
+    cpu_only=False,
+) -> List[Alignment]:
+    # bertalign prints its progress, which is logged at the debug level instead
+    with io.StringIO() as buf:
+        with redirect_stdout(buf):
+            aligner = Bertalign(
+                model,
+                "\n".join(src_lines),
+                "\n".join(tgt_lines),
+                max_align=max_alignment_size,
+                top_k=top_k,
+                win=win,
+                is_split=True,
+            )
+            aligner.align_sents(cpu_only=cpu_only)
+            results = aligner.result
+        for line in buf.getvalue().splitlines():
+            if line.strip() != "":
+                logging.debug(f"bertalign: {line.strip()}")
+    add_counts(cells=_dp_cells(len(src_lines), len(tgt_lines), win=win))
+    return [{"src": result[0], "tgt": result[1]} for result in results]
+
+
+def alignments_to_text_pairs(
+    aligns: List[Alignment],
+    src_lines: List[str],
+    tgt_lines: List[str],
+    scores: Optional[Dict[str, np.ndarray]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    :param scores: if specified, features of each block added to it, see `score_alignments`
+    """
+    ret = []
+    for align in aligns:
+        ret.append(
+            {
+                "src_numbers": align["src"],
+                "tgt_numbers": align["tgt"],
+                "src_texts": [src_lines[i] for i in align["src"]],
+                "tgt_texts": [tgt_lines[i] for i in align["tgt"]],
+            }
+        )
+    if scores is not None:
+        for name, values in scores.items():
+            for block, value in zip(ret, values.tolist()):
+                block[name] = value
+    return ret
+
+
 def generate_alignments(
-    model: Encoder,
+    model: Union[Encoder, CachedEncoder],
     src_file: Union[str, bytes, os.PathLike],
     tgt_file: Union[str, bytes, os.PathLike],
     max_alignment_size=8,
     top_k=5,
     win=5,
 ) -> List[Alignment]:
-    src_path = Path(src_file)
-    tgt_path = Path(tgt_file)
-    assert src_path.exists()
-    assert tgt_path.exists()
-
-    # load text
-    src_lines = src_path.read_text("utf-8").splitlines()
-    src_lines = [line.strip() for line in src_lines]
-    src_lines = [line for line in src_lines if line != ""]
-    tgt_lines = tgt_path.read_text("utf-8").splitlines()
-    tgt_lines = [line.strip() for line in tgt_lines]
-    tgt_lines = [line for line in tgt_lines if line != ""]
-
-    # align
-    with io.StringIO() as buf, redirect_stdout(buf):
-        aligner = Bertalign(
-            model,
-            "\n".join(src_lines),
-            "\n".join(tgt_lines),
-            max_align=max_alignment_size,
-            top_k=top_k,
-            win=win,
-            is_split=True,
-        )
-        aligner.align_sents(cpu_only=(str(model.model.device) == "cpu"))
-        results = aligner.result
-    return [{"src": result[0], "tgt": result[1]} for result in results]
+    return align_lines(
+        model,
+        read_lines(src_file),
+        read_lines(tgt_file),
+        max_alignment_size=max_alignment_size,
+        top_k=top_k,
+        win=win,
+        cpu_only=(str(model.model.device) == "cpu"),
+    )
+
+
+def iter_encoded_pairs(
+    model: Union[Encoder, CachedEncoder],
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    num_overlaps: int,
+    batch_size=256,
+    max_batch_tokens=32768,
+    max_group_windows=200_000,
+    max_pair_lines: Optional[int] = None,
+    store: Optional[EmbeddingStore] = None,
+) -> Iterator[Tuple[List[str], List[str], Optional[Union[PrecomputedEncoder, StoredEncoder]]]]:
+    """
+    Encode consecutive pairs of files together, so that the encoder batches are filled with windows of similar
+    length across chapters, instead of encoding each chapter with its own partial batches.
+
+    :param num_overlaps: number of overlap windows to encode, i.e. `max_alignment_size - 1`
+    :param batch_size: maximum number of windows in an encoder batch
+    :param max_batch_tokens: maximum number of padded tokens in an encoder batch
+    :param max_group_windows: pairs are encoded together until they reach this number of windows,
+        which bounds the memory held by their embeddings
+    :param max_pair_lines: if specified, pairs with more lines than this on one side are not encoded,
+        and come with None instead of their encoder
+    :param store: if specified, the embeddings are written into this store, and served from it.
+        Pairs whose embeddings are already in it are not encoded again.
+    :return: iterator of (src_lines, tgt_lines, encoder serving the embeddings of both), in input order
+    """
+    scheduler = EncodingScheduler(model, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    stored = None
+    if store is not None:
+        stored = StoredEncoder(store, f"{getattr(model, 'model_name', 'LaBSE')}/{model.model.max_seq_length}")
+
+    def flush(group):
+        logging.info(f"Encoding {len(group)} pairs of files...")
+        embeddings = scheduler.transform_many([lines for pair in group for lines in pair], num_overlaps)
+        if stored is not None:
+            for lines, (sent_vecs, len_vecs) in zip([lines for pair in group for lines in pair], embeddings):
+                stored.add(lines, sent_vecs, len_vecs)
+            store.flush()
+            del embeddings
+            for src_lines, tgt_lines in group:
+                yield src_lines, tgt_lines, stored
+            return
+        for pair_idx, (src_lines, tgt_lines) in enumerate(group):
+            precomputed = PrecomputedEncoder()
+            precomputed.add(src_lines, *embeddings[2 * pair_idx])
+            precomputed.add(tgt_lines, *embeddings[2 * pair_idx + 1])
+            yield src_lines, tgt_lines, precomputed
+
+    group = []
+    group_windows = 0
+    for src_file, tgt_file in zip(src_filepaths, tgt_filepaths):
+        src_lines = read_lines(src_file)
+        tgt_lines = read_lines(tgt_file)
+        too_long = max_pair_lines is not None and max(len(src_lines), len(tgt_lines)) > max_pair_lines
+        is_stored = stored is not None and stored.has(src_lines, num_overlaps) and stored.has(tgt_lines, num_overlaps)
+        if too_long or is_stored:
+            if len(group) > 0:
+                yield from flush(group)
+                group = []
+                group_windows = 0
+            yield src_lines, tgt_lines, None if too_long else stored
+            continue
+        group.append((src_lines, tgt_lines))
+        group_windows += (len(src_lines) + len(tgt_lines)) * num_overlaps
+        if group_windows >= max_group_windows:
+            yield from flush(group)
+            group = []
+            group_windows = 0
+    if len(group) > 0:
+        yield from flush(group)
+
+
+def iter_encoded_chunks(
+    scheduler: EncodingScheduler,
+    src_lines: List[str],
+    tgt_lines: List[str],
+    num_overlaps: int,
+    chunk_size=2000,
+    name: Optional[str] = None,
+) -> Iterator[Tuple[int, int, List[str], List[str], PrecomputedEncoder]]:
+    """
+    Split a long pair of files into chunks at anchors (see `data_process.chunking`), and encode the chunks one at a
+    time, so that the overlap windows of only one chunk are held at once. Only the sentences of the whole pair are
+    encoded up front, to find the anchors.
+
+    :param num_overlaps: see `iter_encoded_pairs`
+    :param chunk_size: see `plan_chunks`
+    :param name: name of the pair of files, for logging
+    :return: iterator of (index of the first source line, index of the first target line,
+        src_lines, tgt_lines, encoder serving the embeddings of both) of each chunk
+    """
+    (src_vecs, _), (tgt_vecs, _) = scheduler.transform_many([src_lines, tgt_lines], 1)
+    chunks, anchors = plan_chunks(src_vecs[0], tgt_vecs[0], chunk_size=chunk_size)
+    del src_vecs, tgt_vecs
+    logging.info(f"Split {name or 'pair'} into {len(chunks)} chunks at {len(anchors)} anchors.")
+    for src_start, src_end, tgt_start, tgt_end in chunks:
+        chunk_src, chunk_tgt = src_lines[src_start:src_end], tgt_lines[tgt_start:tgt_end]
+        src_embeddings, tgt_embeddings = scheduler.transform_many([chunk_src, chunk_tgt], num_overlaps)
+        precomputed = PrecomputedEncoder()
+        precomputed.add(chunk_src, *src_embeddings)
+        precomputed.add(chunk_tgt, *tgt_embeddings)
+        yield src_start, tgt_start, chunk_src, chunk_tgt, precomputed
+
+
+def align_grid(
+    model: Union[PrecomputedEncoder, StoredEncoder],
+    src_lines: List[str],
+    tgt_lines: List[str],
+    grid: List[Dict[str, int]],
+    cpu_only=False,
+    name: Optional[str] = None,
+) -> List[List[Alignment]]:
+    """
+    Align the lines with every configuration of the grid, from their precomputed embeddings.
+
+    :param grid: list of dict: {"max_alignment_size": int, "top_k": int, "win": int}
+    :param name: name of the pair of files, for profiling
+    :return: alignments of each configuration
+    """
+    with profile_stage("align", item=name):
+        add_counts(sentences=(len(src_lines) + len(tgt_lines)) * len(grid))
+        return [align_lines(model, src_lines, tgt_lines, cpu_only=cpu_only, **config) for config in grid]
+
+
+def _align_and_score(
+    model: Union[PrecomputedEncoder, StoredEncoder],
+    src_lines: List[str],
+    tgt_lines: List[str],
+    grid: List[Dict[str, int]],
+    cpu_only=False,
+    name: Optional[str] = None,
+    score=False,
+) -> Tuple[List[List[Alignment]], Optional[List[Dict[str, np.ndarray]]]]:
+    """
+    Same as `align_grid`, and with `score`, the features of `score_alignments` of each configuration.
+    """
+    multi_aligns = align_grid(model, src_lines, tgt_lines, grid, cpu_only=cpu_only, name=name)
+    if not score:
+        return multi_aligns, None
+    src_vecs, _ = model.get(src_lines)
+    tgt_vecs, _ = model.get(tgt_lines)
+    return multi_aligns, [score_alignments(aligns, src_lines, tgt_lines, src_vecs, tgt_vecs) for aligns in multi_aligns]
+
+
+def _stitch_chunks(
+    parts: List[Tuple[int, int, List[List[Alignment]], Optional[List[Dict[str, np.ndarray]]]]]
+) -> Tuple[List[List[Alignment]], Optional[List[Dict[str, np.ndarray]]]]:
+    """
+    Concatenate the alignments (and scores) of the chunks of a pair of files, with the indices of the whole pair.
+
+    :param parts: (index of the first source line, index of the first target line, alignments, scores) of each chunk
+    """
+    if len(parts) == 1 and parts[0][:2] == (0, 0):
+        return parts[0][2:]
+    multi_aligns = [[] for _ in parts[0][2]]
+    for src_start, tgt_start, part_aligns, _ in parts:
+        for aligns, chunk_aligns in zip(multi_aligns, part_aligns):
+            aligns.extend(
+                {"src": [src_start + i for i in align["src"]], "tgt": [tgt_start + i for i in align["tgt"]]}
+                for align in chunk_aligns
+            )
+    if parts[0][3] is None:
+        return multi_aligns, None
+    multi_scores = [
+        {name: np.concatenate([part[3][config_idx][name] for part in parts]) for name in scores}
+        for config_idx, scores in enumerate(parts[0][3])
+    ]
+    return multi_aligns, multi_scores
+
+
+def iter_grid_alignments(
+    model: Union[Encoder, CachedEncoder],
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    grid: List[Dict[str, int]],
+    cpu_only=False,
+    num_workers=1,
+    batch_size=256,
+    max_batch_tokens=32768,
+    max_group_windows=200_000,
+    chunk_size: Optional[int] = None,
+    score=False,
+    store: Optional[EmbeddingStore] = None,
+) -> Iterator[Tuple[List[str], List[str], List[List[Alignment]], Optional[List[Dict[str, np.ndarray]]]]]:
+    """
+    Encode the pairs of files and align them with every configuration of the grid.
+
+    With `num_workers` > 1, the alignment search runs in a process pool on CPU, while the current process encodes
+    the next pairs. Pairs and chunks whose alignments are pending hold at most about twice `max_group_windows`
+    windows.
+
+    :param grid: see `align_grid`
+    :param cpu_only: search the alignments on CPU. They are also searched on CPU when the encoder is on CPU,
+        e.g. without a GPU or with the CPU backends of `load_backend_encoder`.
+    :param num_workers: number of processes of the alignment search. If <= 1, pairs are aligned in this process.
+    :param batch_size: see `iter_encoded_pairs`
+    :param max_batch_tokens: see `iter_encoded_pairs`
+    :param max_group_windows: see `iter_encoded_pairs`
+    :param chunk_size: if specified, pairs with more lines than this on one side are split into chunks of about
+        this size (see `iter_encoded_chunks`), which are aligned independently, like pairs of their own
+    :param score: also compute the features of `score_alignments`, from the embeddings of the alignment
+    :param store: see `iter_encoded_pairs`. The workers of the alignment search then read the embeddings from it,
+        instead of receiving a copy.
+    :return: iterator of (src_lines, tgt_lines, alignments of each configuration, their scores or None),
+        in input order
+    """
+    assert len(grid) > 0 and all(config["max_alignment_size"] >= 2 for config in grid)
+    cpu_only = cpu_only or str(model.model.device) == "cpu"
+    num_overlaps = max(config["max_alignment_size"] for config in grid) - 1
+    encoded_pairs = iter_encoded_pairs(
+        model,
+        src_filepaths,
+        tgt_filepaths,
+        num_overlaps,
+        batch_size=batch_size,
+        max_batch_tokens=max_batch_tokens,
+        max_group_windows=max_group_windows,
+        max_pair_lines=chunk_size,
+        store=store,
+    )
+    scheduler = EncodingScheduler(model, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+
+    def iter_chunks(src_lines, tgt_lines, precomputed, name):
+        if precomputed is not None:
+            yield 0, 0, src_lines, tgt_lines, precomputed, name
+            return
+        for src_start, tgt_start, chunk_src, chunk_tgt, chunk_precomputed in iter_encoded_chunks(
+            scheduler, src_lines, tgt_lines, num_overlaps, chunk_size=chunk_size, name=name
+        ):
+            chunk_name = f"{name} [{src_start}:{src_start + len(chunk_src)}]"
+            yield src_start, tgt_start, chunk_src, chunk_tgt, chunk_precomputed, chunk_name
+
+    names = zip(src_filepaths, tgt_filepaths)
+    if num_workers <= 1:
+        for src_lines, tgt_lines, precomputed in encoded_pairs:
+            name = "{} and {}".format(*next(names))
+            logging.info(f"Aligning {name}...")
+            parts = [
+                (src_start, tgt_start)
+                + _align_and_score(chunk_precomputed, chunk_src, chunk_tgt, grid, cpu_only, chunk_name, score)
+                for src_start, tgt_start, chunk_src, chunk_tgt, chunk_precomputed, chunk_name in iter_chunks(
+                    src_lines, tgt_lines, precomputed, name
+                )
+            ]
+            yield (src_lines, tgt_lines) + _stitch_chunks(parts)
+        return
+
+    # spawn, since torch does not survive fork well
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # (src_lines, tgt_lines, name, [(src_start, tgt_start, future) of each chunk])
+        pending = deque()
+        # (future, windows) of the chunks whose embeddings are held by the pool
+        in_flight = deque()
+        in_flight_windows = 0
+
+        def pop():
+            src_lines, tgt_lines, name, futures = pending.popleft()
+            logging.info(f"Aligned {name}.")
+            parts = [
+                (src_start, tgt_start) + worker_result(future.result()) for src_start, tgt_start, future in futures
+            ]
+            return (src_lines, tgt_lines) + _stitch_chunks(parts)
+
+        for src_lines, tgt_lines, precomputed in encoded_pairs:
+            name = "{} and {}".format(*next(names))
+            futures = []
+            pending.append((src_lines, tgt_lines, name, futures))
+            for src_start, tgt_start, chunk_src, chunk_tgt, chunk_precomputed, chunk_name in iter_chunks(
+                src_lines, tgt_lines, precomputed, name
+            ):
+                # the GPU, if any, is left to the encoder
+                future = executor.submit(
+                    worker_function(_align_and_score),
+                    chunk_precomputed,
+                    chunk_src,
+                    chunk_tgt,
+                    grid,
+                    cpu_only=True,
+                    name=chunk_name,
+                    score=score,
+                )
+                futures.append((src_start, tgt_start, future))
+                in_flight.append((future, (len(chunk_src) + len(chunk_tgt)) * num_overlaps))
+                in_flight_windows += in_flight[-1][1]
+                while len(in_flight) > 0 and (in_flight[0][0].done() or in_flight_windows > 2 * max_group_windows):
+                    future, windows = in_flight.popleft()
+                    wait([future])
+                    in_flight_windows -= windows
+            while len(pending) > 0 and all(future.done() for _, _, future in pending[0][3]):
+                yield pop()
+        while len(pending) > 0:
+            yield pop()
 
 
 def generate_multi_alignments(
@@ -64,52 +469,279 @@ def generate_multi_alignments(
     top_k=5,
     win=5,
     cpu_only=False,
+    cache_dir: Optional[Union[str, os.PathLike]] = None,
+    cache_max_entries=1_000_000,
+    backend="torch",
+    model_dir: Optional[Union[str, os.PathLike]] = None,
+    num_threads: Optional[int] = None,
+    num_workers=1,
+    batch_size=256,
+    max_batch_tokens=32768,
+    max_group_windows=200_000,
+    chunk_size: Optional[int] = None,
 ) -> List[List[Alignment]]:
+    """
+    :param cache_dir: see `load_encoder`
+    :param cache_max_entries: see `load_encoder`
+    :param backend: see `load_encoder`
+    :param model_dir: see `load_encoder`
+    :param num_threads: see `load_encoder`
+    :param num_workers: see `iter_grid_alignments`
+    :param batch_size: see `iter_encoded_pairs`
+    :param max_batch_tokens: see `iter_encoded_pairs`
+    :param max_group_windows: see `iter_encoded_pairs`
+    :param chunk_size: see `iter_grid_alignments`
+    """
     assert len(src_filepaths) == len(tgt_filepaths), "src and tgt filepaths must have the same length"
-    model = Encoder(cpu_only=cpu_only)
-    model.model.max_seq_length = 500
-    ret = []
+    model = load_encoder(
+        cpu_only=cpu_only,
+        cache_dir=cache_dir,
+        cache_max_entries=cache_max_entries,
+        backend=backend,
+        model_dir=model_dir,
+        num_threads=num_threads,
+    )
     logging.info("Generating alignments...")
-    for src_file, tgt_file in zip(src_filepaths, tgt_filepaths):
-        logging.info(f"Aligning {src_file} and {tgt_file}...")
-        ret.append(
-            generate_alignments(model, src_file, tgt_file, max_alignment_size=max_alignment_size, top_k=top_k, win=win)
+    grid = [{"max_alignment_size": max_alignment_size, "top_k": top_k, "win": win}]
+    ret = [
+        aligns
+        for _, _, (aligns,), _ in iter_grid_alignments(
+            model,
+            src_filepaths,
+            tgt_filepaths,
+            grid,
+            cpu_only=cpu_only,
+            num_workers=num_workers,
+            batch_size=batch_size,
+            max_batch_tokens=max_batch_tokens,
+            max_group_windows=max_group_windows,
+            chunk_size=chunk_size,
         )
+    ]
+    close_encoder(model)
     return ret
 
 
+def iter_sweep_text_pairs(
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    grid: List[Dict[str, int]],
+    cpu_only=False,
+    cache_dir: Optional[Union[str, os.PathLike]] = None,
+    cache_max_entries=1_000_000,
+    backend="torch",
+    model_dir: Optional[Union[str, os.PathLike]] = None,
+    num_threads: Optional[int] = None,
+    num_workers=1,
+    batch_size=256,
+    max_batch_tokens=32768,
+    max_group_windows=200_000,
+    chunk_size: Optional[int] = None,
+    score=False,
+    encoder: Optional[Union[Encoder, CachedEncoder]] = None,
+    embedding_store: Optional[Union[str, os.PathLike]] = None,
+    store_dtype="float32",
+) -> Iterator[List[List[Dict[str, Any]]]]:
+    """
+    Align every pair of files with every configuration of the grid, and yield the text pairs of each pair of files
+    as soon as it is aligned. Each file is read once, and each pair is only encoded once, with enough overlap windows
+    for the largest `max_alignment_size` of the grid.
+
+    :param grid: see `align_grid`
+    :param cache_dir: see `load_encoder`
+    :param cache_max_entries: see `load_encoder`
+    :param backend: see `load_encoder`
+    :param model_dir: see `load_encoder`
+    :param num_threads: see `load_encoder`
+    :param num_workers: see `iter_grid_alignments`
+    :param batch_size: see `iter_encoded_pairs`
+    :param max_batch_tokens: see `iter_encoded_pairs`
+    :param max_group_windows: see `iter_encoded_pairs`
+    :param chunk_size: see `iter_grid_alignments`
+    :param score: add the confidence features of `data_process.scoring` to each block, from the embeddings
+        the alignment was computed with
+    :param encoder: if specified, encoder used instead of the one of `load_encoder`, e.g. a stub for benchmarks.
+        It is left open, and the parameters of `load_encoder` do not apply to it.
+    :param embedding_store: if specified, directory of an `EmbeddingStore` which the embeddings are written into,
+        and read from by the alignment workers. Pairs already in it are not encoded again.
+    :param store_dtype: dtype of the embeddings of a new store, `float32` or `float16`
+    :return: iterator of the text pairs of each configuration, in the order of the pairs of files
+    """
+    assert len(src_filepaths) == len(tgt_filepaths), "src and tgt filepaths must have the same length"
+    if len(src_filepaths) == 0:
+        return
+    model = encoder or load_encoder(
+        cpu_only=cpu_only,
+        cache_dir=cache_dir,
+        cache_max_entries=cache_max_entries,
+        backend=backend,
+        model_dir=model_dir,
+        num_threads=num_threads,
+    )
+    store = EmbeddingStore(embedding_store, dtype=store_dtype) if embedding_store is not None else None
+    try:
+        for src_lines, tgt_lines, multi_aligns, multi_scores in iter_grid_alignments(
+            model,
+            src_filepaths,
+            tgt_filepaths,
+            grid,
+            cpu_only=cpu_only,
+            num_workers=num_workers,
+            batch_size=batch_size,
+            max_batch_tokens=max_batch_tokens,
+            max_group_windows=max_group_windows,
+            chunk_size=chunk_size,
+            score=score,
+            store=store,
+        ):
+            if multi_scores is None:
+                multi_scores = [None] * len(multi_aligns)
+            yield [
+                alignments_to_text_pairs(aligns, src_lines, tgt_lines, scores)
+                for aligns, scores in zip(multi_aligns, multi_scores)
+            ]
+    finally:
+        if encoder is None:
+            close_encoder(model)
+        if store is not None:
+            store.close()
+
+
+def iter_text_pairs(
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    max_alignment_size=8,
+    top_k=5,
+    win=5,
+    **kwargs,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Same as `iter_sweep_text_pairs`, with a single configuration.
+
+    :param kwargs: see `iter_sweep_text_pairs`
+    :return: iterator of the text pairs of each pair of files
+    """
+    grid = [{"max_alignment_size": max_alignment_size, "top_k": top_k, "win": win}]
+    for (pairs,) in iter_sweep_text_pairs(src_filepaths, tgt_filepaths, grid, **kwargs):
+        yield pairs
+
+
 def generate_text_pairs(
     src_filepaths: List[Union[str, bytes, os.PathLike]],
     tgt_filepaths: List[Union[str, bytes, os.PathLike]],
     max_alignment_size=8,
     top_k=5,
     win=5,
-    cpu_only=False,
+    **kwargs,
 ) -> List[List[Dict[str, Any]]]:
-    assert len(src_filepaths) == len(tgt_filepaths), "src and tgt filepaths must have the same length"
-    multi_aligns = generate_multi_alignments(
-        src_filepaths, tgt_filepaths, max_alignment_size=max_alignment_size, top_k=top_k, win=win, cpu_only=cpu_only
-    )
-    ret = []
+    """
+    :param kwargs: see `iter_sweep_text_pairs`
+    """
     logging.info("Generating text pairs...")
-    for src_path, tgt_path, aligns in zip(src_filepaths, tgt_filepaths, multi_aligns):
-        src_path = Path(src_path)
-        tgt_path = Path(tgt_path)
-        assert src_path.exists()
-        assert tgt_path.exists()
-        src_lines = src_path.read_text("utf-8").splitlines()
-        tgt_lines = tgt_path.read_text("utf-8").splitlines()
-        tmp = []
-        for align in aligns:
-            src_line = [src_lines[i] for i in align["src"]]
-            tgt_line = [tgt_lines[i] for i in align["tgt"]]
-            tmp.append(
-                {
-                    "src_numbers": align["src"],
-                    "tgt_numbers": align["tgt"],
-                    "src_texts": src_line,
-                    "tgt_texts": tgt_line,
-                }
-            )
-        ret.append(tmp)
+    return list(
+        iter_text_pairs(
+            src_filepaths, tgt_filepaths, max_alignment_size=max_alignment_size, top_k=top_k, win=win, **kwargs
+        )
+    )
+
+
+def generate_sweep_text_pairs(
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    grid: List[Dict[str, int]],
+    **kwargs,
+) -> List[List[List[Dict[str, Any]]]]:
+    """
+    :param kwargs: see `iter_sweep_text_pairs`
+    :return: text pairs of each configuration, of each pair of files
+    """
+    logging.info(f"Generating alignments for {len(grid)} configurations...")
+    ret = [[] for _ in grid]
+    for multi_pairs in iter_sweep_text_pairs(src_filepaths, tgt_filepaths, grid, **kwargs):
+        for config_idx, pairs in enumerate(multi_pairs):
+            ret[config_idx].append(pairs)
+    return ret
+
+
+def mine_text_pairs(
+    src_filepaths: List[Union[str, bytes, os.PathLike]],
+    tgt_filepaths: List[Union[str, bytes, os.PathLike]],
+    k=4,
+    index="auto",
+    nprobe=16,
+    min_margin=1.06,
+    cpu_only=False,
+    cache_dir: Optional[Union[str, os.PathLike]] = None,
+    cache_max_entries=1_000_000,
+    backend="torch",
+    model_dir: Optional[Union[str, os.PathLike]] = None,
+    num_threads: Optional[int] = None,
+    batch_size=256,
+    max_batch_tokens=32768,
+    encoder: Optional[Union[Encoder, CachedEncoder]] = None,
+) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+    """
+    Mine the pairs of parallel sentences of a whole volume, whose source and target files need not be split into
+    the same chapters: every source sentence is searched among the sentences of all the target files,
+    see `data_process.mining`.
+
+    :param src_filepaths: source files of the volume, in any number
+    :param tgt_filepaths: target files of the volume, in any number
+    :param k: see `mining.mine`
+    :param index: see `mining.build_index`
+    :param nprobe: see `mining.build_index`
+    :param min_margin: see `mining.select_pairs`
+    :param encoder: see `iter_sweep_text_pairs`. The other parameters are those of `load_encoder`
+        and `iter_encoded_pairs`.
+    :return: (source file index, target file index) -> the mined pairs of sentences between these files,
+        as 1-1 blocks of text pairs with their `score` and `len_ratio` (see `data_process.scoring`)
+        and their `margin`, by source sentence number
+    """
+    from .mining import mine, select_pairs
+
+    model = encoder or load_encoder(
+        cpu_only=cpu_only,
+        cache_dir=cache_dir,
+        cache_max_entries=cache_max_entries,
+        backend=backend,
+        model_dir=model_dir,
+        num_threads=num_threads,
+    )
+    try:
+        src_files = [read_lines(file) for file in src_filepaths]
+        tgt_files = [read_lines(file) for file in tgt_filepaths]
+        scheduler = EncodingScheduler(model, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+        embeddings = scheduler.transform_many(src_files + tgt_files, 1)
+    finally:
+        if encoder is None:
+            close_encoder(model)
+    dim = embeddings[0][0].shape[-1] if len(embeddings) > 0 else 0
+    src_vecs = np.concatenate([sent_vecs[0] for sent_vecs, _ in embeddings[: len(src_files)]] or [np.empty((0, dim))])
+    tgt_vecs = np.concatenate([sent_vecs[0] for sent_vecs, _ in embeddings[len(src_files) :]] or [np.empty((0, dim))])
+    candidates = mine(src_vecs, tgt_vecs, k=k, method=index, nprobe=nprobe)
+    pairs = select_pairs(candidates, min_margin=min_margin)
+    logging.info(f"Mined {len(pairs)} pairs of sentences among {len(src_vecs)} source sentences.")
+
+    # file index and sentence number of each sentence of the volume
+    src_file_idxs = np.repeat(np.arange(len(src_files)), [len(lines) for lines in src_files])
+    tgt_file_idxs = np.repeat(np.arange(len(tgt_files)), [len(lines) for lines in tgt_files])
+    src_firsts = np.cumsum([0] + [len(lines) for lines in src_files])
+    tgt_firsts = np.cumsum([0] + [len(lines) for lines in tgt_files])
+    margins = dict(zip(pairs[:, 0].tolist(), candidates["margin"][pairs[:, 0], 0].round(4).tolist()))
+    aligns = {}
+    for src_idx, tgt_idx in pairs.tolist():
+        src_file, tgt_file = int(src_file_idxs[src_idx]), int(tgt_file_idxs[tgt_idx])
+        aligns.setdefault((src_file, tgt_file), []).append(
+            {"src": [src_idx - int(src_firsts[src_file])], "tgt": [tgt_idx - int(tgt_firsts[tgt_file])]}
+        )
+    ret = {}
+    for (src_file, tgt_file), file_aligns in aligns.items():
+        src_lines, tgt_lines = src_files[src_file], tgt_files[tgt_file]
+        scores = score_alignments(
+            file_aligns, src_lines, tgt_lines, embeddings[src_file][0], embeddings[len(src_files) + tgt_file][0]
+        )
+        scores["margin"] = np.array(
+            [margins[int(src_firsts[src_file]) + align["src"][0]] for align in file_aligns], dtype=np.float64
+        )
+        ret[(src_file, tgt_file)] = alignments_to_text_pairs(file_aligns, src_lines, tgt_lines, scores)
     return ret
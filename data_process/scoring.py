@@ -0,0 +1,113 @@
+"""
+Confidence features of alignment blocks, computed with numpy over all the blocks of a pair of files at once:
+
+* `score`: cosine similarity of the source and target embeddings of the block. 0 for blocks with a blank side.
+* `len_ratio`: ratio of the shorter to the longer side, in characters. 0 for blocks with a blank side.
+
+The embeddings of the blocks are the overlap windows bertalign already encoded for its first pass,
+so scoring does not encode anything.
+"""
+from typing import *
+
+import numpy as np
+
+__all__ = ["FEATURES", "block_embeddings", "make_block_filter", "score_alignments"]
+
+FEATURES = ["score", "len_ratio"]
+
+
+def _block_bounds(numbers: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param numbers: sentence numbers of each block, which are runs of consecutive sentences
+    :return: (first sentence, number of sentences) of each block
+    """
+    counts = np.fromiter(map(len, numbers), dtype=np.int64, count=len(numbers))
+    firsts = np.fromiter((block[0] if len(block) > 0 else 0 for block in numbers), dtype=np.int64, count=len(numbers))
+    return firsts, counts
+
+
+def block_embeddings(vecs: np.ndarray, firsts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    :param vecs: overlap embeddings of a file, of shape (num_overlaps, num_sentences, dim), where layer `k` at
+        index `i` is the window of `k + 1` sentences ending at sentence `i`
+    :param firsts: first sentence of each block
+    :param counts: number of sentences of each block
+    :return: normalized embedding of each block, of shape (num_blocks, dim). Zero for empty blocks.
+    """
+    num_overlaps, _, dim = vecs.shape
+    ret = np.zeros((len(counts), dim), dtype=np.float32)
+    lasts = firsts + counts - 1
+    in_window = (counts >= 1) & (counts <= num_overlaps)
+    ret[in_window] = vecs[counts[in_window] - 1, lasts[in_window]]
+    too_long = counts > num_overlaps
+    if too_long.any():
+        # mean of the sentence embeddings, summed over the sentences of these blocks only
+        long_firsts, long_counts = firsts[too_long], counts[too_long]
+        starts = np.cumsum(long_counts) - long_counts
+        sentences = np.arange(long_counts.sum()) - np.repeat(starts - long_firsts, long_counts)
+        ret[too_long] = np.add.reduceat(vecs[0][sentences], starts, axis=0)
+    norms = np.linalg.norm(ret, axis=1, keepdims=True)
+    return ret / np.maximum(norms, 1e-12)
+
+
+def _block_chars(lines: List[str], firsts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    cumsum = np.concatenate([[0], np.cumsum(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)))])
+    return np.where(counts > 0, cumsum[np.minimum(firsts + counts, len(lines))] - cumsum[firsts], 0)
+
+
+def score_alignments(
+    aligns: List[Dict[str, List[int]]],
+    src_lines: List[str],
+    tgt_lines: List[str],
+    src_vecs: np.ndarray,
+    tgt_vecs: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    :param aligns: alignments of a pair of files
+    :param src_vecs: overlap embeddings of the source lines, see `block_embeddings`
+    :param tgt_vecs: overlap embeddings of the target lines, see `block_embeddings`
+    :return: each of `FEATURES`, as an array over the blocks
+    """
+    src_firsts, src_counts = _block_bounds([align["src"] for align in aligns])
+    tgt_firsts, tgt_counts = _block_bounds([align["tgt"] for align in aligns])
+    full = (src_counts > 0) & (tgt_counts > 0)
+    src_embs = block_embeddings(src_vecs, src_firsts, src_counts)
+    tgt_embs = block_embeddings(tgt_vecs, tgt_firsts, tgt_counts)
+    scores = np.where(full, np.einsum("ij,ij->i", src_embs, tgt_embs), 0.0)
+    src_chars = _block_chars(src_lines, src_firsts, src_counts)
+    tgt_chars = _block_chars(tgt_lines, tgt_firsts, tgt_counts)
+    len_ratios = np.where(full, np.minimum(src_chars, tgt_chars) / np.maximum(np.maximum(src_chars, tgt_chars), 1), 0.0)
+    return {"score": scores.round(4), "len_ratio": len_ratios.round(4)}
+
+
+def make_block_filter(
+    min_score: Optional[float] = None,
+    min_len_ratio: Optional[float] = None,
+    drop_blank=False,
+    max_block_size: Optional[int] = None,
+) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """
+    :param min_score: keep blocks whose `score` is at least this value
+    :param min_len_ratio: keep blocks whose `len_ratio` is at least this value
+    :param drop_blank: drop the blocks with a blank side, e.g. `1-0`
+    :param max_block_size: keep blocks with at most this many sentences on each side
+    :return: predicate telling whether to keep a block, or None if nothing is filtered
+    """
+    thresholds = {"score": min_score, "len_ratio": min_len_ratio}
+    thresholds = {key: value for key, value in thresholds.items() if value is not None}
+    if len(thresholds) == 0 and not drop_blank and max_block_size is None:
+        return None
+
+    def keep(block: Dict[str, Any]) -> bool:
+        for key, value in thresholds.items():
+            assert key in block, f"Blocks have no `{key}`, align them with `process --score` first."
+            if block[key] < value:
+                return False
+        num_src, num_tgt = len(block["src_numbers"]), len(block["tgt_numbers"])
+        if drop_blank and (num_src == 0 or num_tgt == 0):
+            return False
+        if max_block_size is not None and max(num_src, num_tgt) > max_block_size:
+            return False
+        return True
+
+    return keep
@@ -0,0 +1,2 @@
+from .report import *
+from .profiler import *
@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import functools
+from typing import *
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+__all__ = [
+    "Profiler",
+    "active_profiler",
+    "add_counts",
+    "disable_profiling",
+    "enable_profiling",
+    "profile_stage",
+    "worker_function",
+    "worker_result",
+]
+
+# profiler of the current process, if profiling is enabled
+_profiler: Optional["Profiler"] = None
+
+
+def _peak_rss() -> int:
+    """
+    Peak resident set size of the current process in bytes, since the last `_reset_peak_rss`.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _reset_peak_rss() -> None:
+    # only Linux can reset the peak, elsewhere it is the peak since the process started
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _children_cpu_time() -> float:
+    """
+    CPU time of the terminated child processes, e.g. of a worker pool once it is shut down.
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, peak RSS and counters of each stage, and of each file within a stage.
+
+    Stages nest: counters go to the innermost open stage, and the peak RSS of a stage covers its inner stages.
+    """
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        # records of the open stages, outermost first
+        self._open: List[Dict[str, Any]] = []
+
+    def _update_peaks(self) -> None:
+        peak = _peak_rss()
+        for record in self._open:
+            record["peak_rss"] = max(record["peak_rss"], peak)
+
+    @contextmanager
+    def stage(self, name: str, item: Optional[Union[str, os.PathLike]] = None):
+        # the peak so far belongs to the outer stages, before it is reset for this one
+        self._update_peaks()
+        _reset_peak_rss()
+        record = {
+            "stage": name,
+            "item": None if item is None else str(item),
+            "pid": os.getpid(),
+            "wall": 0.0,
+            "cpu": 0.0,
+            "children_cpu": 0.0,
+            "peak_rss": 0,
+            "counters": {},
+        }
+        self._open.append(record)
+        start_wall, start_cpu, start_children_cpu = time.perf_counter(), time.process_time(), _children_cpu_time()
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - start_wall
+            record["cpu"] = time.process_time() - start_cpu
+            record["children_cpu"] = _children_cpu_time() - start_children_cpu
+            self._update_peaks()
+            self._open.pop()
+            self.records.append(record)
+
+    def add_counts(self, **counters: Union[int, float]) -> None:
+        if len(self._open) == 0:
+            return
+        record_counters = self._open[-1]["counters"]
+        for name, value in counters.items():
+            record_counters[name] = record_counters.get(name, 0) + value
+
+    def merge(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Add the records of another process, e.g. of a worker.
+        """
+        self.records.extend(records)
+
+
+def enable_profiling() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable_profiling() -> Optional[Profiler]:
+    """
+    :return: the profiler that was active, if any
+    """
+    global _profiler
+    ret, _profiler = _profiler, None
+    return ret
+
+
+def active_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+@contextmanager
+def profile_stage(name: str, item: Optional[Union[str, os.PathLike]] = None):
+    """
+    Record a stage, or a file of a stage, if profiling is enabled. Otherwise, does nothing.
+
+    :param name: name of the stage, e.g. `extract`
+    :param item: file the stage runs on, if any
+    """
+    if _profiler is None:
+        yield None
+    else:
+        with _profiler.stage(name, item=item) as record:
+            yield record
+
+
+def add_counts(**counters: Union[int, float]) -> None:
+    """
+    Add to the throughput counters of the innermost stage, e.g. `add_counts(chapters=12)`, if profiling is enabled.
+    """
+    if _profiler is not None:
+        _profiler.add_counts(**counters)
+
+
+def _call_profiled(func: Callable, *args, **kwargs) -> Tuple[Any, List[Dict[str, Any]]]:
+    profiler = _profiler if _profiler is not None else enable_profiling()
+    num_records = len(profiler.records)
+    ret = func(*args, **kwargs)
+    # records are handed to the parent process once, a reused worker must not send them again
+    records = profiler.records[num_records:]
+    del profiler.records[num_records:]
+    return ret, records
+
+
+def worker_function(func: Callable) -> Callable:
+    """
+    Wrap a function to run in worker processes, so that the stages it records reach the profiler of the current
+    process through `worker_result`. Returns `func` itself when profiling is disabled.
+    """
+    if _profiler is None:
+        return func
+    return functools.partial(_call_profiled, func)
+
+
+def worker_result(result: Any) -> Any:
+    """
+    Unwrap the result of a function wrapped by `worker_function`, and merge its records.
+    """
+    if _profiler is None:
+        return result
+    ret, records = result
+    _profiler.merge(records)
+    return ret
@@ -0,0 +1,115 @@
+import os
+import csv
+import sys
+import json
+import time
+import logging
+from typing import *
+from pathlib import Path
+
+from .profiler import Profiler, profile_stage, enable_profiling, disable_profiling
+
+__all__ = ["profile_command", "summarize", "write_profile"]
+
+RECORD_COLUMNS = ["stage", "item", "pid", "wall", "cpu", "children_cpu", "peak_rss"]
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Totals of each stage over its records, and the throughput of each counter.
+
+    Times come from the stage-level record of a stage (without item) when there is one, e.g. in the pipeline,
+    so that the time between files is accounted for. Otherwise they add up over its per-file records,
+    and with parallel workers, throughputs are per worker.
+
+    :return: {stage: {"records", "wall", "cpu", "children_cpu", "peak_rss", "counters", "throughput"}}
+    """
+    ret = {}
+    for name in dict.fromkeys(record["stage"] for record in records):
+        stage_records = [record for record in records if record["stage"] == name]
+        timed = [record for record in stage_records if record["item"] is None] or stage_records
+        counters = {}
+        for record in stage_records:
+            for key, value in record["counters"].items():
+                counters[key] = counters.get(key, 0) + value
+        wall = sum(record["wall"] for record in timed)
+        ret[name] = {
+            "records": len(stage_records),
+            "wall": wall,
+            "cpu": sum(record["cpu"] for record in timed),
+            "children_cpu": sum(record["children_cpu"] for record in timed),
+            "peak_rss": max(record["peak_rss"] for record in stage_records),
+            "counters": counters,
+            "throughput": {f"{key}/s": value / wall for key, value in counters.items() if wall > 0},
+        }
+    return ret
+
+
+def write_profile(profiler: Profiler, file_path: Union[str, os.PathLike], command: Optional[List[str]] = None) -> None:
+    """
+    Write the records of the profiler and their summary. CSV if the file ends with `.csv`, one row per record
+    then one per stage (with `*` as item), JSON otherwise.
+
+    :param command: command line that was profiled
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    stages = summarize(profiler.records)
+    if file_path.suffix.lower() != ".csv":
+        report = {"command": command, "stages": stages, "records": profiler.records}
+        file_path.write_text(json.dumps(report, indent=4, ensure_ascii=False), "utf-8")
+        return
+    counter_names = list(dict.fromkeys(key for record in profiler.records for key in record["counters"]))
+    with file_path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(RECORD_COLUMNS + counter_names)
+        for record in profiler.records:
+            writer.writerow(
+                [record[key] for key in RECORD_COLUMNS] + [record["counters"].get(key, "") for key in counter_names]
+            )
+        for name, stage in stages.items():
+            writer.writerow(
+                [name, "*", ""]
+                + [stage[key] for key in RECORD_COLUMNS[3:]]
+                + [stage["counters"].get(key, "") for key in counter_names]
+            )
+
+
+def profile_command(
+    func: Callable,
+    args,
+    report_file: Optional[Union[str, os.PathLike]] = None,
+    cprofile_file: Optional[Union[str, os.PathLike]] = None,
+) -> None:
+    """
+    Run a subcommand with profiling enabled, as a `total` stage, and write its report even if it fails.
+
+    :param func: `main` of the subcommand
+    :param args: its arguments
+    :param report_file: see `write_profile`
+    :param cprofile_file: if specified, cProfile stats of the current process are dumped into this file,
+        e.g. for `python -m pstats`. The worker processes are not covered.
+    """
+    profiler = enable_profiling()
+    cprofiler = None
+    if cprofile_file is not None:
+        import cProfile
+
+        cprofiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        with profile_stage("total"):
+            if cprofiler is not None:
+                cprofiler.runcall(func, args)
+            else:
+                func(args)
+    finally:
+        disable_profiling()
+        if cprofiler is not None:
+            cprofiler.dump_stats(cprofile_file)
+        if report_file is not None:
+            write_profile(profiler, report_file, command=sys.argv)
+        logging.info(
+            f"Profiled {len(profiler.records)} stages in {time.perf_counter() - start:.1f}s"
+            + (f", report written to {report_file}" if report_file is not None else "")
+        )
@@ -0,0 +1,134 @@
+// Viewer of the paged HTML reports, without dependencies so that reports open offline.
+// The alignment blocks are split into chunk scripts, which call `loadReportChunk` when loaded.
+// A chunk is only loaded and rendered when it gets near the viewport, and its rows are removed again
+// (keeping its measured height) when it gets far from it, so that long chapters stay light.
+(function () {
+    "use strict";
+
+    const config = window.REPORT_CONFIG;
+    const container = document.getElementById("rows");
+    const jump = document.getElementById("jump");
+
+    // same colors as the single-file report: darker for larger blocks, and another one for blank sides
+    function sentenceColor(count) {
+        if (count <= 1) {
+            return "";
+        }
+        return "hsl(60, 100%, " + Math.max(0, 90 - (count - 2) * 8) + "%)";
+    }
+    const blankColor = "#ccffff";
+
+    function renderSide(numbers, texts, lang) {
+        const side = document.createElement("div");
+        side.className = "side";
+        side.lang = lang;
+        if (texts.length === 0) {
+            const line = document.createElement("div");
+            line.className = "line";
+            line.style.backgroundColor = blankColor;
+            line.appendChild(document.createElement("span")).className = "number";
+            line.appendChild(document.createElement("span")).textContent = "(Blank)";
+            side.appendChild(line);
+            return side;
+        }
+        const color = sentenceColor(texts.length);
+        texts.forEach(function (text, idx) {
+            const line = document.createElement("div");
+            line.className = "line";
+            line.style.backgroundColor = color;
+            const number = line.appendChild(document.createElement("span"));
+            number.className = "number";
+            number.textContent = numbers[idx];
+            line.appendChild(document.createElement("span")).textContent = text;
+            side.appendChild(line);
+        });
+        return side;
+    }
+
+    function renderBlock(block) {
+        const row = document.createElement("div");
+        row.className = "row";
+        row.appendChild(renderSide(block.src_numbers, block.src_texts, config.src_lang));
+        row.appendChild(document.createElement("div")).className = "gap";
+        row.appendChild(renderSide(block.tgt_numbers, block.tgt_texts, config.tgt_lang));
+        return row;
+    }
+
+    const chunks = config.chunks.map(function (chunk, idx) {
+        const el = document.createElement("div");
+        el.className = "chunk";
+        el.dataset.idx = idx;
+        el.style.height = chunk.height_hint + "px";
+        container.appendChild(el);
+        const option = document.createElement("option");
+        option.value = idx;
+        option.textContent = "#" + chunk.start + " - #" + (chunk.start + chunk.count - 1);
+        jump.appendChild(option);
+        return { el: el, chunk: chunk, data: null, loading: false, rendered: false, visible: false };
+    });
+
+    function render(state) {
+        if (state.rendered || state.data === null) {
+            return;
+        }
+        const fragment = document.createDocumentFragment();
+        state.data.forEach(function (block) {
+            fragment.appendChild(renderBlock(block));
+        });
+        state.el.appendChild(fragment);
+        state.el.style.height = "";
+        state.rendered = true;
+    }
+
+    function unrender(state) {
+        if (!state.rendered) {
+            return;
+        }
+        state.el.style.height = state.el.offsetHeight + "px";
+        state.el.textContent = "";
+        state.rendered = false;
+    }
+
+    function load(state) {
+        if (state.data !== null || state.loading) {
+            return;
+        }
+        state.loading = true;
+        // a script element, unlike fetch, also works for reports opened from the file system
+        const script = document.createElement("script");
+        script.src = state.chunk.file;
+        document.head.appendChild(script);
+    }
+
+    window.loadReportChunk = function (idx, blocks) {
+        const state = chunks[idx];
+        state.data = blocks;
+        state.loading = false;
+        if (state.visible) {
+            render(state);
+        }
+    };
+
+    const observer = new IntersectionObserver(
+        function (entries) {
+            entries.forEach(function (entry) {
+                const state = chunks[Number(entry.target.dataset.idx)];
+                state.visible = entry.isIntersecting;
+                if (state.visible) {
+                    load(state);
+                    render(state);
+                } else {
+                    unrender(state);
+                }
+            });
+        },
+        { rootMargin: "2000px 0px" }
+    );
+    chunks.forEach(function (state) {
+        observer.observe(state.el);
+    });
+
+    jump.addEventListener("change", function () {
+        chunks[Number(jump.value)].el.scrollIntoView();
+    });
+})();
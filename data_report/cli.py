@@ -3,23 +3,24 @@ from glob import glob
 from typing import List, Optional
 from pathlib import Path
 
-from . import tmx, html
-
 
 def register_subparser(parser: argparse.ArgumentParser):
     parser.add_argument(
         "-t",
         "--type",
         type=str,
-        choices=["html", "tmx"],
-        help="Type of visualization to perform. `html` means HTML report. `tmx` means TMX file.",
+        choices=["html", "html-paged", "tmx"],
+        help="Type of visualization to perform. `html` means HTML report. `html-paged` means HTML report whose "
+        "alignments are loaded and rendered chunk by chunk while scrolling, for long chapters, and which opens offline. "
+        "`tmx` means TMX file.",
     )
     parser.add_argument(
         "input",
         type=str,
         nargs="*",
         metavar="FILE",
-        help="Make a report from this file. Glob patterns are supported.",
+        help="Make a report from this file of text pairs, in any output format of `process`. "
+        "Glob patterns are supported.",
     )
     parser.add_argument(
         "-o",
@@ -30,6 +31,54 @@ def register_subparser(parser: argparse.ArgumentParser):
         "If not specified, the output file will be the same as the input file, but with corresponding extension.",
     )
 
+    group_filter = parser.add_argument_group(
+        "filter", "Filter the alignment blocks of every type of report. Scores require `process --score`."
+    )
+    group_filter.add_argument(
+        "--min-score",
+        type=float,
+        metavar="FLOAT",
+        default=None,
+        help="Only keep the blocks whose embedding cosine similarity is at least this value.",
+    )
+    group_filter.add_argument(
+        "--min-len-ratio",
+        type=float,
+        metavar="FLOAT",
+        default=None,
+        help="Only keep the blocks whose ratio of the shorter side to the longer one, in characters, "
+        "is at least this value.",
+    )
+    group_filter.add_argument(
+        "--drop-blank",
+        action="store_true",
+        default=False,
+        help="Drop the blocks with no sentence on one side, e.g. `1-0`. Default: False.",
+    )
+    group_filter.add_argument(
+        "--max-block-size",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Only keep the blocks with at most this many sentences on each side.",
+    )
+
+    group_paged = parser.add_argument_group("html-paged", "Additional arguments for paged HTML reports.")
+    group_paged.add_argument(
+        "--chunk-size",
+        type=int,
+        metavar="INT",
+        default=200,
+        help="Number of alignment blocks per chunk. Default: 200.",
+    )
+    group_paged.add_argument(
+        "--index",
+        type=str,
+        metavar="FILE",
+        default=None,
+        help="Also write an index page of the reports, with their summary stats, to this path.",
+    )
+
     group_tmx = parser.add_argument_group("tmx", "Additional arguments for tmx transformations.")
     group_tmx.add_argument(
         "--src-lang",
@@ -45,6 +94,27 @@ def register_subparser(parser: argparse.ArgumentParser):
         default=None,
         help="The language of the target language. Default: None.",
     )
+    group_tmx.add_argument(
+        "--merge",
+        action="store_true",
+        default=False,
+        help="Merge all the inputs into the single TMX file given by `-o`, in one pass. Default: False.",
+    )
+    group_tmx.add_argument(
+        "--max-units",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="With `--merge`, split the output into shards of at most this many units, "
+        "named `name.00000.tmx`, `name.00001.tmx`, ...",
+    )
+    group_tmx.add_argument(
+        "--max-bytes",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="With `--merge`, split the output into shards of about this many bytes.",
+    )
     group_tmx.add_argument(
         "--list-langs",
         action="store_true",
@@ -60,7 +130,7 @@ def gen_input_path_and_output_path(in_paths: List[Path], out_path: Optional[Path
             yield in_paths[0], in_paths[0].with_suffix(suffix)
         else:
             if out_path.is_dir():
-                yield in_paths[0], out_path / f"{in_paths[0].stem}.{suffix}"
+                yield in_paths[0], out_path / f"{in_paths[0].stem}{suffix}"
             else:
                 yield in_paths[0], out_path
     else:
@@ -71,10 +141,14 @@ def gen_input_path_and_output_path(in_paths: List[Path], out_path: Optional[Path
                 yield in_path, in_path.with_suffix(suffix)
         else:
             for in_path in in_paths:
-                yield in_path, out_path / f"{in_path.stem}.{suffix}"
+                yield in_path, out_path / f"{in_path.stem}{suffix}"
 
 
 def main(args):
+    from data_process.scoring import make_block_filter
+
+    from . import tmx, html, paged_html
+
     if args.list_langs:
         print(tmx.list_langs())
         return
@@ -89,9 +163,38 @@ def main(args):
         in_paths.extend(glob(path))
     in_paths: List[Path] = [Path(path) for path in in_paths]
     out_path = Path(args.output) if args.output else None
+    block_filter = make_block_filter(
+        min_score=args.min_score,
+        min_len_ratio=args.min_len_ratio,
+        drop_blank=args.drop_blank,
+        max_block_size=args.max_block_size,
+    )
     if args.type == "html":
         for in_path, out_path in gen_input_path_and_output_path(in_paths, out_path, suffix=".html"):
-            html.make_html_report(in_path, out_path)
+            html.make_html_report(in_path, out_path, block_filter=block_filter)
+    elif args.type == "html-paged":
+        reports = []
+        for in_path, out_path in gen_input_path_and_output_path(in_paths, out_path, suffix=".html"):
+            stats = paged_html.make_paged_html_report(
+                in_path, out_path, chunk_size=args.chunk_size, index_file=args.index, block_filter=block_filter
+            )
+            reports.append((out_path, stats))
+        if args.index is not None:
+            paged_html.make_index(reports, args.index)
+    elif args.type == "tmx" and args.merge:
+        assert out_path is not None and not out_path.is_dir(), "`--merge` requires `-o` to be a file path."
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmx.merge_tmx_files(
+            in_paths,
+            out_path,
+            src_lang=args.src_lang,
+            tgt_lang=args.tgt_lang,
+            max_units=args.max_units,
+            max_bytes=args.max_bytes,
+            block_filter=block_filter,
+        )
     elif args.type == "tmx":
         for in_path, out_path in gen_input_path_and_output_path(in_paths, out_path, suffix=".tmx"):
-            tmx.make_tmx_file(in_path, out_path, src_lang=args.src_lang, tgt_lang=args.tgt_lang)
+            tmx.make_tmx_file(
+                in_path, out_path, src_lang=args.src_lang, tgt_lang=args.tgt_lang, block_filter=block_filter
+            )
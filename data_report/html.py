@@ -1,15 +1,40 @@
 import os
+import json
 from string import Template
 from typing import *
 from pathlib import Path
 
+from data_profile import add_counts, profile_stage
+from data_process.formats import iter_blocks
+
 template = Template((Path(__file__).parent / "template.html").read_text("utf-8"))
 
 
-def make_html_report(input_file: Union[str, bytes, os.PathLike], output_file: Union[str, bytes, os.PathLike]) -> None:
+def _dump_block(block: Dict[str, Any]) -> str:
+    # `</script>` in a text must not close the script element holding the data
+    return json.dumps(block, ensure_ascii=False).replace("</", "<\\/")
+
+
+def make_html_report(
+    input_file: Union[str, bytes, os.PathLike],
+    output_file: Union[str, bytes, os.PathLike],
+    block_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> None:
+    """
+    :param input_file: text pairs, in any format of `data_process.formats`
+    :param block_filter: if specified, only the blocks for which it returns True are reported
+    """
     input_path = Path(input_file)
     output_path = Path(output_file)
     assert input_path.exists()
     filename = input_path.stem
-    html_output = template.substitute(filename=filename, data=input_path.read_text("utf-8"))
-    output_path.write_text(html_output, "utf-8")
+    # the blocks are streamed into the data placeholder of the template
+    head, tail = template.substitute(filename=filename, data="\0").split("\0")
+    with profile_stage("report", item=input_path), output_path.open("w", encoding="utf-8") as f:
+        f.write(head + "[")
+        num_blocks = 0
+        for block in iter_blocks(input_path, block_filter=block_filter):
+            f.write((",\n" if num_blocks > 0 else "\n") + _dump_block(block))
+            num_blocks += 1
+        f.write("\n]" + tail)
+        add_counts(blocks=num_blocks)
@@ -0,0 +1,154 @@
+import os
+import html
+import json
+import shutil
+from string import Template
+from typing import *
+from pathlib import Path
+from collections import Counter
+
+from data_profile import add_counts, profile_stage
+from data_process.formats import iter_blocks
+
+page_template = Template((Path(__file__).parent / "paged_template.html").read_text("utf-8"))
+index_template = Template((Path(__file__).parent / "index_template.html").read_text("utf-8"))
+
+SCRIPT_PATH = Path(__file__).parent / "assets" / "report.js"
+
+# 1.5em of 16px, to estimate the height of the chunks that are not rendered yet
+LINE_HEIGHT = 24
+
+INDEX_COLUMNS = [
+    ("blocks", "Blocks"),
+    ("src_sentences", "Src sentences"),
+    ("tgt_sentences", "Tgt sentences"),
+    ("src_chars", "Src chars"),
+    ("tgt_chars", "Tgt chars"),
+]
+
+
+def _write_chunk(file_path: Path, idx: int, blocks: List[Dict[str, Any]]) -> None:
+    with file_path.open("w", encoding="utf-8") as f:
+        f.write(f"window.loadReportChunk({idx}, {json.dumps(blocks, ensure_ascii=False)});\n")
+
+
+def make_paged_html_report(
+    input_file: Union[str, bytes, os.PathLike],
+    output_file: Union[str, bytes, os.PathLike],
+    chunk_size=200,
+    src_lang="ja",
+    tgt_lang="zh",
+    index_file: Optional[Union[str, os.PathLike]] = None,
+    block_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Write a report that opens fast whatever the length of the chapter: its blocks are split into chunk scripts
+    in `<output name>_chunks/`, which are only loaded and rendered when they get near the viewport.
+    The viewer script is copied next to the report, so that it opens offline.
+
+    :param input_file: text pairs, in any format of `data_process.formats`
+    :param chunk_size: number of blocks per chunk
+    :param index_file: if specified, the report links to this index page
+    :param block_filter: if specified, only the blocks for which it returns True are reported
+    :return: summary stats of the text pairs, for `make_index`
+    """
+    input_path = Path(input_file)
+    output_path = Path(output_file)
+    assert input_path.exists()
+    chunks_dir = output_path.with_name(output_path.stem + "_chunks")
+    # chunks of a previous, longer report must not be left behind
+    shutil.rmtree(chunks_dir, ignore_errors=True)
+    chunks_dir.mkdir(parents=True)
+    shutil.copyfile(SCRIPT_PATH, output_path.parent / SCRIPT_PATH.name)
+
+    stats = Counter()
+    alignment_types = Counter()
+    chunks = []
+    blocks = []
+
+    def flush():
+        idx = len(chunks)
+        _write_chunk(chunks_dir / f"{idx:05d}.js", idx, blocks)
+        lines = sum(max(len(block["src_texts"]), len(block["tgt_texts"]), 1) for block in blocks)
+        chunks.append(
+            {
+                "file": f"{chunks_dir.name}/{idx:05d}.js",
+                "start": stats["blocks"] - len(blocks),
+                "count": len(blocks),
+                "height_hint": lines * LINE_HEIGHT,
+            }
+        )
+        blocks.clear()
+
+    with profile_stage("report", item=input_path):
+        for block in iter_blocks(input_path, block_filter=block_filter):
+            blocks.append(block)
+            stats["blocks"] += 1
+            for side in ["src", "tgt"]:
+                stats[f"{side}_sentences"] += len(block[f"{side}_texts"])
+                stats[f"{side}_chars"] += sum(len(text) for text in block[f"{side}_texts"])
+            alignment_types[f"{len(block['src_numbers'])}-{len(block['tgt_numbers'])}"] += 1
+            if len(blocks) >= chunk_size:
+                flush()
+        if len(blocks) > 0:
+            flush()
+
+        config = {"chunks": chunks, "src_lang": src_lang, "tgt_lang": tgt_lang}
+        index_link = ""
+        if index_file is not None:
+            index_href = Path(os.path.relpath(index_file, output_path.parent)).as_posix()
+            index_link = f'<a href="{html.escape(index_href)}">Index</a>'
+        output_path.write_text(
+            page_template.substitute(
+                filename=html.escape(input_path.stem),
+                summary=f"{stats['blocks']} blocks, {stats['src_sentences']} / {stats['tgt_sentences']} sentences",
+                index_link=index_link,
+                config=json.dumps(config, ensure_ascii=False).replace("</", "<\\/"),
+                script=SCRIPT_PATH.name,
+            ),
+            "utf-8",
+        )
+        add_counts(blocks=stats["blocks"])
+    return {**{key: stats[key] for key, _ in INDEX_COLUMNS}, "alignment_types": dict(alignment_types.most_common())}
+
+
+def make_index(
+    reports: List[Tuple[Union[str, os.PathLike], Dict[str, Any]]],
+    output_file: Union[str, os.PathLike],
+    title="Corpus report",
+) -> None:
+    """
+    Write an index page of reports, with their summary stats, so that it does not load any of them.
+
+    :param reports: list of (report path, stats returned by `make_paged_html_report`)
+    """
+    output_path = Path(output_file)
+
+    def cells(name: str, stats: Dict[str, Any]) -> str:
+        types = stats["alignment_types"]
+        num_blocks = max(stats["blocks"], 1)
+        one_to_one = types.get("1-1", 0) / num_blocks
+        blank = sum(count for type_name, count in types.items() if "0" in type_name.split("-")) / num_blocks
+        values = [f"{stats[key]:,}" for key, _ in INDEX_COLUMNS] + [f"{one_to_one:.1%}", f"{blank:.1%}"]
+        return f"<td>{name}</td>" + "".join(f"<td>{value}</td>" for value in values)
+
+    rows = []
+    total = {key: 0 for key, _ in INDEX_COLUMNS}
+    total["alignment_types"] = Counter()
+    for report_path, stats in reports:
+        href = Path(os.path.relpath(report_path, output_path.parent)).as_posix()
+        link = f'<a href="{html.escape(href)}">{html.escape(Path(report_path).stem)}</a>'
+        rows.append(f"            <tr>{cells(link, stats)}</tr>")
+        for key, _ in INDEX_COLUMNS:
+            total[key] += stats[key]
+        total["alignment_types"].update(stats["alignment_types"])
+    header = ["Chapter"] + [name for _, name in INDEX_COLUMNS] + ["1-1", "Blank"]
+    output_path.write_text(
+        index_template.substitute(
+            title=html.escape(title),
+            header="".join(f"<th>{name}</th>" for name in header),
+            rows="\n".join(rows),
+            total=cells(f"Total ({len(reports)} chapters)", total),
+        ),
+        "utf-8",
+    )
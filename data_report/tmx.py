@@ -1,17 +1,22 @@
 import os
-import json
+import re
 from typing import *
 from pathlib import Path
+from contextlib import ExitStack
 
+from lxml import etree
 from translate.lang import team
 from translate.storage import tmx
 
+from data_profile import add_counts, profile_stage
+from data_process.formats import iter_blocks
+
 
 def list_langs() -> List[str]:
     return list(team.LANG_TEAM_LANGUAGE_SNIPPETS.keys())
 
 
-def json2tmx(json_obj: List[Dict[str, Any]], src_lang="en", tgt_lang: Optional[str] = None) -> tmx.tmxfile:
+def json2tmx(json_obj: Iterable[Dict[str, Any]], src_lang="en", tgt_lang: Optional[str] = None) -> tmx.tmxfile:
     ret = tmx.tmxfile()
     for block in json_obj:
         src_text = " ".join(block["src_texts"])
@@ -24,14 +29,143 @@ def json2tmx(json_obj: List[Dict[str, Any]], src_lang="en", tgt_lang: Optional[s
     return ret
 
 
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# characters that XML 1.0 does not allow, dropped like translate-toolkit does
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+class TmxWriter:
+    """
+    Write a TMX file incrementally, one `<tu>` per alignment block, instead of building the whole document
+    in memory like `json2tmx`.
+    """
+
+    def __init__(self, output_file: Union[str, os.PathLike], src_lang="en", tgt_lang: Optional[str] = None):
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang or "xx"
+        self.num_units = 0
+        self._stack = ExitStack()
+        self._file = self._stack.enter_context(Path(output_file).open("wb"))
+        self._xf = self._stack.enter_context(etree.xmlfile(self._file, encoding="UTF-8"))
+        self._xf.write_declaration()
+        self._xf.write_doctype('<!DOCTYPE tmx SYSTEM "tmx14.dtd">')
+        self._stack.enter_context(self._xf.element("tmx", version="1.4"))
+        header = etree.Element(
+            "header",
+            creationtool="acg_corpus_ja_zh",
+            creationtoolversion="1",
+            segtype="sentence",
+            adminlang="en",
+            srclang=src_lang,
+            datatype="PlainText",
+        )
+        header.set("o-tmf", "UTF-8")
+        self._xf.write("\n", header, "\n")
+        self._stack.enter_context(self._xf.element("body"))
+        self._xf.write("\n")
+
+    def write_block(self, block: Dict[str, Any], origin: Optional[str] = None) -> None:
+        """
+        :param block: alignment block, whose texts are joined with spaces like `json2tmx`
+        :param origin: if specified, recorded as the `x-file` property of the unit, e.g. when merging files
+        """
+        tu = etree.Element("tu")
+        if origin is not None:
+            etree.SubElement(tu, "prop", type="x-file").text = _INVALID_XML_CHARS.sub("", origin)
+        for side, lang in [("src", self.src_lang), ("tgt", self.tgt_lang)]:
+            tuv = etree.SubElement(tu, "tuv", {XML_LANG: lang})
+            etree.SubElement(tuv, "seg").text = _INVALID_XML_CHARS.sub("", " ".join(block[f"{side}_texts"]))
+        self._xf.write(tu, "\n")
+        self.num_units += 1
+
+    def tell(self) -> int:
+        """
+        Number of bytes written so far.
+        """
+        self._xf.flush()
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def merge_tmx_files(
+    input_files: List[Union[str, os.PathLike]],
+    output_file: Union[str, os.PathLike],
+    src_lang="en",
+    tgt_lang: Optional[str] = None,
+    max_units: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    block_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> List[Path]:
+    """
+    Write the blocks of many text pair files into a single TMX file, or into shards of it, in a single pass.
+    Each unit records the file it comes from in its `x-file` property.
+
+    :param input_files: text pairs, in any format of `data_process.formats`
+    :param output_file: TMX file. With shards, they are named after it: `name.00000.tmx`, `name.00001.tmx`, ...
+    :param max_units: if specified, a new shard is started after this number of units
+    :param max_bytes: if specified, a new shard is started once a shard reaches this size (checked every 100 units)
+    :param block_filter: if specified, only the blocks for which it returns True are written
+    :return: paths of the written files
+    """
+    output_path = Path(output_file)
+    sharded = max_units is not None or max_bytes is not None
+    ret = []
+    writer = None
+
+    def open_next() -> TmxWriter:
+        path = (
+            output_path.with_name(f"{output_path.stem}.{len(ret):05d}{output_path.suffix}") if sharded else output_path
+        )
+        ret.append(path)
+        return TmxWriter(path, src_lang=src_lang, tgt_lang=tgt_lang)
+
+    try:
+        writer = open_next()
+        for input_file in input_files:
+            input_path = Path(input_file)
+            with profile_stage("report", item=input_path):
+                num_blocks = 0
+                for block in iter_blocks(input_path, block_filter=block_filter):
+                    if writer.num_units > 0 and (
+                        (max_units is not None and writer.num_units >= max_units)
+                        or (max_bytes is not None and writer.num_units % 100 == 0 and writer.tell() >= max_bytes)
+                    ):
+                        writer.close()
+                        writer = open_next()
+                    writer.write_block(block, origin=input_path.stem)
+                    num_blocks += 1
+                add_counts(blocks=num_blocks)
+    finally:
+        if writer is not None:
+            writer.close()
+    return ret
+
+
 def make_tmx_file(
     input_file: Union[str, bytes, os.PathLike],
     output_file: Union[str, bytes, os.PathLike],
     src_lang="en",
     tgt_lang: Optional[str] = None,
+    block_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
 ) -> None:
+    """
+    :param input_file: text pairs, in any format of `data_process.formats`
+    :param block_filter: if specified, only the blocks for which it returns True are written
+    """
     input_path = Path(input_file)
     assert input_path.exists()
-    with input_path.open("r", encoding="utf-8") as f:
-        t = json2tmx(json.load(f), src_lang=src_lang, tgt_lang=tgt_lang)
-        t.savefile(str(output_file))
+    with profile_stage("report", item=input_path), TmxWriter(
+        output_file, src_lang=src_lang, tgt_lang=tgt_lang
+    ) as writer:
+        for block in iter_blocks(input_path, block_filter=block_filter):
+            writer.write_block(block)
+        add_counts(blocks=writer.num_units)
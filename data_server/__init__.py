@@ -0,0 +1,3 @@
+from .client import ServerClient
+
+__all__ = ["ServerClient"]
@@ -0,0 +1,75 @@
+import argparse
+
+from data_process.encoders import BACKENDS
+
+
+def register_subparser(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on. The server has no authentication, keep it local. Default: 127.0.0.1.",
+    )
+    parser.add_argument("--port", type=int, metavar="INT", default=8765, help="Port to listen on. Default: 8765.")
+    parser.add_argument(
+        "--preload",
+        type=str,
+        nargs="+",
+        choices=["trankit", "encoder"],
+        default=[],
+        help="Models to load before serving. The others are loaded by the first job that needs them.",
+    )
+    parser.add_argument(
+        "--max-batch-items",
+        type=int,
+        metavar="INT",
+        default=256,
+        help="Waiting jobs with the same parameters are run together, up to about this many texts or pairs of "
+        "files. Default: 256.",
+    )
+    parser.add_argument(
+        "--cpu",
+        action="store_true",
+        default=False,
+        help="Use CPU instead of GPU. Default: False.",
+    )
+    parser.add_argument(
+        "--backend", type=str, choices=BACKENDS, default="torch", help="Encoder backend, see `process`."
+    )
+    parser.add_argument("--model-dir", type=str, metavar="DIR", default=None, help="See `process`.")
+    parser.add_argument("--threads", type=int, metavar="INT", default=None, help="See `process`.")
+    parser.add_argument("--cache-dir", type=str, metavar="DIR", default=None, help="See `process`.")
+    parser.add_argument("--cache-max-entries", type=int, metavar="INT", default=1_000_000, help="See `process`.")
+    parser.add_argument(
+        "-j", "--jobs", type=int, metavar="INT", default=1, help="Alignment processes of a batch, see `process`."
+    )
+    parser.add_argument("--batch-size", type=int, metavar="INT", default=256, help="See `process`.")
+    parser.add_argument("--max-batch-tokens", type=int, metavar="INT", default=32768, help="See `process`.")
+    parser.add_argument("--max-group-windows", type=int, metavar="INT", default=200_000, help="See `process`.")
+
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    from .server import serve
+
+    serve(
+        host=args.host,
+        port=args.port,
+        preload=args.preload,
+        cpu_only=args.cpu,
+        max_batch_items=args.max_batch_items,
+        encoder_kwargs={
+            "cache_dir": args.cache_dir,
+            "cache_max_entries": args.cache_max_entries,
+            "backend": args.backend,
+            "model_dir": args.model_dir,
+            "num_threads": args.threads,
+        },
+        grid_kwargs={
+            "num_workers": args.jobs,
+            "batch_size": args.batch_size,
+            "max_batch_tokens": args.max_batch_tokens,
+            "max_group_windows": args.max_group_windows,
+        },
+    )
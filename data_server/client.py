@@ -0,0 +1,80 @@
+import os
+import json
+import urllib.error
+import urllib.request
+from typing import *
+
+__all__ = ["ServerClient"]
+
+
+class ServerClient:
+    """
+    Client of the server of `data_server.server`, which streams the results of a job as they come.
+    """
+
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        """
+        :param url: base URL of the server, e.g. `http://127.0.0.1:8765`
+        :param timeout: timeout of the socket operations, in seconds. Default: none, since a job may wait
+            for the jobs queued before it.
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def status(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.url}/status", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _stream(self, path: str, body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        request = urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Server rejected the job: {e.read().decode('utf-8', errors='replace')}") from e
+        with response:
+            for line in response:
+                result = json.loads(line)
+                if "error" in result:
+                    raise RuntimeError(f"Server failed the job: {result['error']}")
+                if result.get("done"):
+                    return
+                yield result
+        raise RuntimeError("Server closed the connection before the end of the job.")
+
+    def segment(self, texts: List[str], engine="rule", batch_bytes=0) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Split texts into sentences, see `data_preprocess.batch_segmentation`.
+
+        :return: iterator of (index of the text, its sentences), in any order
+        """
+        body = {"texts": texts, "engine": engine, "batch_bytes": batch_bytes}
+        for result in self._stream("/segment", body):
+            yield result["index"], result["sentences"]
+
+    def align(
+        self,
+        src_filepaths: List[Union[str, os.PathLike]],
+        tgt_filepaths: List[Union[str, os.PathLike]],
+        grid: List[Dict[str, int]],
+        score=False,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[List[List[Dict[str, Any]]]]:
+        """
+        Same as `iter_sweep_text_pairs`, with the encoder of the server.
+        """
+        assert len(src_filepaths) == len(tgt_filepaths), "src and tgt filepaths must have the same length"
+        body = {
+            "pairs": [
+                [os.path.abspath(src_file), os.path.abspath(tgt_file)]
+                for src_file, tgt_file in zip(src_filepaths, tgt_filepaths)
+            ],
+            "grid": grid,
+            "score": score,
+            "chunk_size": chunk_size,
+        }
+        for result in self._stream("/align", body):
+            yield result["text_pairs"]
@@ -0,0 +1,285 @@
+"""
+Local HTTP server which keeps the segmentation pipeline and the encoder loaded between jobs.
+
+Jobs are posted as JSON, queued, and run one batch at a time by a single worker thread that owns the models.
+Jobs of the same kind and parameters that are waiting together are run as one batch, e.g. the pairs of files
+of many `align` jobs are encoded together. Results are streamed back as JSON lines as soon as they are ready, one per text or pair of files
+with its index in the job, followed by a last line `{"done": true}` or `{"error": message}`.
+
+Endpoints:
+    * `GET /status`: queued jobs and loaded models
+    * `POST /segment`: `{"texts": [str], "engine": "rule" | "trankit", "batch_bytes": int}`,
+      streams `{"index": int, "sentences": [str]}`
+    * `POST /align`: `{"pairs": [[src path, tgt path]], "grid": [config], "score": bool, "chunk_size": int | null}`,
+      streams `{"index": int, "text_pairs": [text pairs of each configuration]}`.
+      Paths are read by the server, so they should be absolute.
+"""
+import os
+import json
+import queue
+import signal
+import logging
+import threading
+from typing import *
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+__all__ = ["Job", "JobQueue", "ModelWorker", "serve"]
+
+
+class Job:
+    def __init__(self, kind: str, params: Dict[str, Any], items: List[Any]):
+        """
+        :param kind: `segment` or `align`
+        :param params: parameters shared by the items, which must be equal for jobs to be batched together
+        :param items: texts to segment, or pairs of files to align
+        """
+        self.kind = kind
+        self.params = params
+        self.items = items
+        # lines of the response, None once the job is over
+        self.results: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+    @property
+    def batch_key(self) -> str:
+        return json.dumps([self.kind, self.params], sort_keys=True)
+
+
+class JobQueue:
+    """
+    Queue of jobs, whose consumer takes the oldest job along with the waiting jobs that can be batched with it.
+    """
+
+    def __init__(self):
+        self._jobs: List[Job] = []
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def put(self, job: Job) -> None:
+        with self._cond:
+            self._jobs.append(job)
+            self._cond.notify()
+
+    def take_batch(self, max_items: int) -> List[Job]:
+        """
+        Wait for a job, then take it and the next jobs with the same batch key, up to about `max_items` items.
+        """
+        with self._cond:
+            while len(self._jobs) == 0:
+                self._cond.wait()
+            batch = [self._jobs.pop(0)]
+            num_items = len(batch[0].items)
+            for job in list(self._jobs):
+                if num_items >= max_items:
+                    break
+                if job.batch_key == batch[0].batch_key:
+                    self._jobs.remove(job)
+                    batch.append(job)
+                    num_items += len(job.items)
+            return batch
+
+
+class ModelWorker:
+    """
+    Runs the batches of jobs, with models loaded on first use and kept for the next jobs.
+    """
+
+    def __init__(
+        self,
+        cpu_only=False,
+        max_batch_items=256,
+        encoder_kwargs: Optional[Dict[str, Any]] = None,
+        grid_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        :param cpu_only: use CPU instead of GPU
+        :param max_batch_items: see `JobQueue.take_batch`
+        :param encoder_kwargs: parameters of `load_encoder`, e.g. `backend` or `cache_dir`
+        :param grid_kwargs: parameters of `iter_grid_alignments`, e.g. `num_workers`, except for the grid,
+            `chunk_size` and `score`, which come with the jobs
+        """
+        self.cpu_only = cpu_only
+        self.max_batch_items = max_batch_items
+        self.encoder_kwargs = encoder_kwargs or {}
+        self.grid_kwargs = grid_kwargs or {}
+        self.jobs = JobQueue()
+        self._pipeline = None
+        self._encoder = None
+
+    @property
+    def loaded_models(self) -> List[str]:
+        return [name for name, model in [("trankit", self._pipeline), ("encoder", self._encoder)] if model is not None]
+
+    @property
+    def pipeline(self):
+        if self._pipeline is None:
+            from data_preprocess import sentence_segmentation as ss
+
+            logging.info("Loading the trankit pipeline...")
+            self._pipeline = ss.get_default_pipeline(cpu_only=self.cpu_only)
+        return self._pipeline
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            from data_process.process import load_encoder
+
+            logging.info("Loading the encoder...")
+            self._encoder = load_encoder(cpu_only=self.cpu_only, **self.encoder_kwargs)
+        return self._encoder
+
+    def close(self) -> None:
+        if self._encoder is not None:
+            from data_process.process import close_encoder
+
+            close_encoder(self._encoder)
+
+    def _segment(self, jobs: List[Job]) -> None:
+        from data_preprocess.batch_segmentation import plan_batches, segment_texts
+
+        engine, batch_bytes = jobs[0].params["engine"], jobs[0].params["batch_bytes"]
+        pipeline = None if engine == "rule" else self.pipeline
+        for job in jobs:
+            # texts are only packed within a job, since the language of a packed call is detected once
+            sizes = [len(text.encode("utf-8")) for text in job.items]
+            for batch in plan_batches(sizes, batch_bytes):
+                multi_sents = segment_texts(engine, pipeline, [job.items[idx] for idx in batch])
+                for idx, sents in zip(batch, multi_sents):
+                    job.results.put({"index": idx, "sentences": sents})
+
+    def _align(self, jobs: List[Job]) -> None:
+        from data_process.process import iter_grid_alignments, alignments_to_text_pairs
+
+        params = jobs[0].params
+        owners = [(job, idx) for job in jobs for idx in range(len(job.items))]
+        results = iter_grid_alignments(
+            self.encoder,
+            [job.items[idx][0] for job, idx in owners],
+            [job.items[idx][1] for job, idx in owners],
+            params["grid"],
+            cpu_only=self.cpu_only,
+            chunk_size=params["chunk_size"],
+            score=params["score"],
+            **self.grid_kwargs,
+        )
+        for (job, idx), (src_lines, tgt_lines, multi_aligns, multi_scores) in zip(owners, results):
+            if multi_scores is None:
+                multi_scores = [None] * len(multi_aligns)
+            text_pairs = [
+                alignments_to_text_pairs(aligns, src_lines, tgt_lines, scores)
+                for aligns, scores in zip(multi_aligns, multi_scores)
+            ]
+            job.results.put({"index": idx, "text_pairs": text_pairs})
+
+    def run_forever(self) -> None:
+        while True:
+            jobs = self.jobs.take_batch(self.max_batch_items)
+            num_items = sum(len(job.items) for job in jobs)
+            logging.info(f"Running {len(jobs)} {jobs[0].kind} jobs of {num_items} items...")
+            try:
+                if jobs[0].kind == "segment":
+                    self._segment(jobs)
+                else:
+                    self._align(jobs)
+                final = {"done": True}
+            except Exception as e:
+                logging.exception(f"Failed {jobs[0].kind} jobs")
+                final = {"error": f"{type(e).__name__}: {e}"}
+            for job in jobs:
+                job.results.put(final)
+                job.results.put(None)
+
+
+def _parse_job(kind: str, body: Dict[str, Any]) -> Job:
+    if kind == "segment":
+        engine = body.get("engine", "rule")
+        assert engine in ["rule", "trankit"], f"Engine {engine} is not supported."
+        texts = body["texts"]
+        assert all(isinstance(text, str) for text in texts), "`texts` must be a list of strings"
+        return Job(kind, {"engine": engine, "batch_bytes": int(body.get("batch_bytes", 0))}, texts)
+    pairs = [tuple(pair) for pair in body["pairs"]]
+    assert all(len(pair) == 2 for pair in pairs), "`pairs` must be a list of [src path, tgt path]"
+    missing = [path for pair in pairs for path in pair if not os.path.isfile(path)]
+    assert len(missing) == 0, f"Files not found by the server: {missing[:5]}"
+    grid = [
+        {key: int(config[key]) for key in ["max_alignment_size", "top_k", "win"]}
+        for config in body.get("grid", [{"max_alignment_size": 8, "top_k": 5, "win": 5}])
+    ]
+    params = {"grid": grid, "score": bool(body.get("score", False)), "chunk_size": body.get("chunk_size")}
+    return Job(kind, params, pairs)
+
+
+def make_handler(worker: ModelWorker) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+        def _send_json(self, code: int, obj: Dict[str, Any]) -> None:
+            data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/status":
+                self._send_json(404, {"error": f"Unknown path: {self.path}"})
+                return
+            self._send_json(200, {"queued_jobs": len(worker.jobs), "models": worker.loaded_models})
+
+        def do_POST(self):
+            kind = self.path.strip("/")
+            if kind not in ["segment", "align"]:
+                self._send_json(404, {"error": f"Unknown path: {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                job = _parse_job(kind, body)
+            except (ValueError, KeyError, TypeError, AssertionError) as e:
+                self._send_json(400, {"error": f"Invalid {kind} job: {type(e).__name__}: {e}"})
+                return
+            worker.jobs.put(job)
+            # no Content-Length: the response is streamed until the connection is closed
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            while True:
+                line = job.results.get()
+                if line is None:
+                    break
+                self.wfile.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, preload: Optional[List[str]] = None, **worker_kwargs) -> None:
+    """
+    Serve jobs until interrupted (Ctrl+C or SIGTERM), then save the embedding cache, if any.
+
+    :param preload: models to load before serving: `trankit` and/or `encoder`. Others are loaded on first use.
+    :param worker_kwargs: see `ModelWorker`
+    """
+    worker = ModelWorker(**worker_kwargs)
+    for name in preload or []:
+        assert name in ["trankit", "encoder"], f"Unknown model: {name}"
+        getattr(worker, "pipeline" if name == "trankit" else "encoder")
+    threading.Thread(target=worker.run_forever, name="model-worker", daemon=True).start()
+    httpd = ThreadingHTTPServer((host, port), make_handler(worker))
+    httpd.daemon_threads = True
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    logging.info(f"Serving on http://{host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the server...")
+    finally:
+        httpd.server_close()
+        worker.close()